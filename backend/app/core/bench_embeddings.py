@@ -0,0 +1,88 @@
+"""
+bench_embeddings.py
+
+Measures document-encoding throughput (docs/sec) of the index-build encoder
+at different worker counts and batch sizes.
+
+Usage (from backend/):
+    python -m app.core.bench_embeddings --input pubmed_results.csv --workers 0,2,4,8 --batch-sizes 32,64,128
+    python -m app.core.bench_embeddings --synthetic 20000 --workers 0,4,16,32 --output bench_embeddings.json
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+
+import pandas as pd
+from langchain.embeddings import HuggingFaceEmbeddings
+
+from app.core.embedding_pool import EmbeddingPool
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+WORDS = (
+    "amyloid tau microglia neuroinflammation cytokine synapse neuron plaque apoptosis kinase "
+    "receptor mitochondria oxidative stress biomarker cohort trial dementia cognition pathway"
+).split()
+
+
+def load_texts(input_csv, synthetic, limit):
+    if synthetic:
+        rng = random.Random(0)
+        return [
+            f"Title: {' '.join(rng.choices(WORDS, k=10))}\n\nAbstract: {' '.join(rng.choices(WORDS, k=200))}"
+            for _ in range(synthetic)
+        ]
+    df = pd.read_csv(input_csv, dtype=str, keep_default_na=False)
+    texts = [f"Title: {r['Title']}\n\nAbstract: {r['Abstract']}" for _, r in df.iterrows()]
+    return texts[:limit] if limit else texts
+
+
+def main(input_csv, synthetic, limit, workers_list, batch_sizes, output):
+    texts = load_texts(input_csv, synthetic, limit)
+    print(f"Encoding {len(texts)} documents with {MODEL_NAME} ({os.cpu_count()} CPUs)")
+    embeddings = HuggingFaceEmbeddings(model_name=MODEL_NAME)
+
+    results = []
+    for batch_size in batch_sizes:
+        for workers in workers_list:
+            with EmbeddingPool(embeddings, workers=workers, batch_size=batch_size) as encoder:
+                encoder.encode(texts[:batch_size])  # warm-up (also amortizes pool start)
+                start = time.perf_counter()
+                encoder.encode(texts)
+                elapsed = time.perf_counter() - start
+            row = {
+                "workers": workers,
+                "batch_size": batch_size,
+                "docs": len(texts),
+                "seconds": round(elapsed, 3),
+                "docs_per_sec": round(len(texts) / elapsed, 1),
+            }
+            results.append(row)
+            print(f"workers={workers:<3} batch_size={batch_size:<4} {row['docs_per_sec']:>9.1f} docs/sec ({row['seconds']}s)")
+
+    if output:
+        with open(output, "w", encoding="utf-8") as fh:
+            json.dump({"model": MODEL_NAME, "cpus": os.cpu_count(), "results": results}, fh, indent=2)
+        print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark index-build embedding throughput")
+    parser.add_argument("--input", default="pubmed_results.csv", help="CSV with Title/Abstract columns")
+    parser.add_argument("--synthetic", type=int, default=0, help="Use N synthetic documents instead of the CSV")
+    parser.add_argument("--limit", type=int, default=0, help="Only encode the first N CSV rows")
+    parser.add_argument("--workers", default="0,2,4", help="Comma-separated encode process counts (0 = in-process)")
+    parser.add_argument("--batch-sizes", default="64", help="Comma-separated encode batch sizes")
+    parser.add_argument("--output", default=None, help="Optional JSON report path")
+    args = parser.parse_args()
+    main(
+        args.input,
+        args.synthetic,
+        args.limit,
+        [int(w) for w in args.workers.split(",")],
+        [int(b) for b in args.batch_sizes.split(",")],
+        args.output,
+    )
@@ -0,0 +1,250 @@
+"""
+bench_hnsw.py
+
+Recall/latency benchmark for the vector index settings used by RAGPipeline.
+The corpus (pubmed_results.csv or synthetic abstracts) is embedded once; exact
+brute-force neighbours of every query are the ground truth. Each grid point
+(space x M x construction_ef x search_ef) is built into its own Chroma
+collection and reports recall@k, p50/p95/p99 single-query latency, build time
+and index size on disk. --flat adds the mmap backend (FlatVectorStore) as a
+reference row.
+
+The report (JSON and/or CSV) holds no timestamps, so two runs can be diffed.
+
+Usage (from backend/):
+    python -m app.core.bench_hnsw --input pubmed_results.csv --M 8,16,32 --search-ef 10,50,100 --json bench_hnsw.json
+    python -m app.core.bench_hnsw --synthetic 50000 --vectors-cache synthetic50k.npy --space l2,cosine --flat --csv bench_hnsw.csv
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.core.bench_embeddings import load_texts
+from app.core.bench_query_encoder import make_queries
+from app.core.rag_pipeline import HNSW_SPACES
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+# Vectors per Chroma add() call (below Chroma's max batch size)
+ADD_BATCH = 2000
+# Queries per block when computing the exact neighbours
+TRUTH_BLOCK = 256
+
+REPORT_FIELDS = [
+    "backend", "space", "M", "construction_ef", "search_ef",
+    "recall_at_k", "p50_ms", "p95_ms", "p99_ms", "build_seconds", "index_bytes",
+]
+
+
+def embed(texts, batch_size, cache):
+    """Embed texts with the index model, reusing a .npy cache of the same row count if given."""
+    if cache and Path(cache).exists():
+        vectors = np.load(cache)
+        if len(vectors) == len(texts):
+            return vectors
+        print(f"Ignoring {cache}: {len(vectors)} rows, expected {len(texts)}")
+    from langchain.embeddings import HuggingFaceEmbeddings
+
+    embeddings = HuggingFaceEmbeddings(model_name=MODEL_NAME, encode_kwargs={"batch_size": batch_size})
+    start = time.perf_counter()
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    print(f"Embedded {len(texts)} texts in {time.perf_counter() - start:.1f}s")
+    if cache:
+        np.save(cache, vectors)
+    return vectors
+
+
+def exact_neighbours(corpus, queries, k, space):
+    """Brute-force top-k row indices per query under the given HNSW distance."""
+    if space == "cosine":
+        corpus = corpus / np.maximum(np.linalg.norm(corpus, axis=1, keepdims=True), 1e-12)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    norms = (corpus * corpus).sum(axis=1)
+    truth = []
+    for start in range(0, len(queries), TRUTH_BLOCK):
+        block = queries[start:start + TRUTH_BLOCK]
+        scores = block @ corpus.T
+        if space == "l2":
+            # Ranking by -||q - x||^2 only needs 2 q.x - ||x||^2
+            scores = 2 * scores - norms
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        truth.extend(set(row.tolist()) for row in top)
+    return truth
+
+
+def dir_size(path):
+    return sum(p.stat().st_size for p in Path(path).rglob("*") if p.is_file())
+
+
+def measure(query_fn, queries, truth, k):
+    """recall@k and latency percentiles for query_fn(vector, k) -> row indices."""
+    query_fn(queries[0], k)  # warm-up
+    latencies, recalls = [], []
+    for vector, expected in zip(queries, truth):
+        start = time.perf_counter()
+        found = query_fn(vector, k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        recalls.append(len(expected.intersection(found)) / k)
+    return {
+        "recall_at_k": round(statistics.mean(recalls), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+    }
+
+
+def bench_chroma(corpus, queries, truth, k, space, m, construction_ef, search_ef, workdir):
+    import chromadb
+
+    path = Path(workdir) / f"chroma-{space}-{m}-{construction_ef}-{search_ef}"
+    client = chromadb.PersistentClient(path=str(path))
+    # Same metadata RAGPipeline.hnsw_metadata() passes to LangChain's Chroma
+    collection = client.create_collection(
+        "bench",
+        metadata={"hnsw:space": space, "hnsw:M": m, "hnsw:construction_ef": construction_ef, "hnsw:search_ef": search_ef},
+    )
+    start = time.perf_counter()
+    for offset in range(0, len(corpus), ADD_BATCH):
+        block = corpus[offset:offset + ADD_BATCH]
+        collection.add(ids=[str(i) for i in range(offset, offset + len(block))], embeddings=block.tolist())
+    build_seconds = time.perf_counter() - start
+
+    def query_fn(vector, n):
+        result = collection.query(query_embeddings=[vector.tolist()], n_results=n, include=["distances"])
+        return [int(i) for i in result["ids"][0]]
+
+    row = {"build_seconds": round(build_seconds, 3), **measure(query_fn, queries, truth, k)}
+    del collection, client
+    row["index_bytes"] = dir_size(path)
+    shutil.rmtree(path, ignore_errors=True)
+    return row
+
+
+def bench_flat(corpus, queries, truth, k, quantization, rescore, workdir):
+    from app.core.flat_store import FlatVectorStore
+
+    path = Path(workdir) / f"flat-{quantization}-{int(rescore)}"
+    store = FlatVectorStore(path, quantization=quantization, rescore=rescore)
+    start = time.perf_counter()
+    for offset in range(0, len(corpus), ADD_BATCH):
+        block = corpus[offset:offset + ADD_BATCH]
+        store.upsert(ids=[str(i) for i in range(offset, offset + len(block))], embeddings=block)
+    store.persist()
+    build_seconds = time.perf_counter() - start
+
+    def query_fn(vector, n):
+        return [int(i) for i in store.query([vector], n_results=n, include=["distances"])["ids"][0]]
+
+    row = {"build_seconds": round(build_seconds, 3), **measure(query_fn, queries, truth, k)}
+    row["index_bytes"] = dir_size(path)
+    del store
+    shutil.rmtree(path, ignore_errors=True)
+    return row
+
+
+def write_reports(report, json_path, csv_path):
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"Wrote {json_path}")
+    if csv_path:
+        with open(csv_path, "w", encoding="utf-8", newline="") as fh:
+            writer = csv.DictWriter(fh, fieldnames=REPORT_FIELDS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(report["results"])
+        print(f"Wrote {csv_path}")
+
+
+def main(args):
+    texts = load_texts(args.input, args.synthetic, args.limit)
+    query_texts = make_queries(args.queries)
+    rng = random.Random(0)
+    # Titles of indexed papers as well, so some queries have a clear nearest neighbour
+    if not args.synthetic:
+        titles = [t.split("\n\n", 1)[0].replace("Title: ", "") for t in rng.sample(texts, min(len(texts), len(query_texts) // 2))]
+        query_texts[:len(titles)] = titles
+    corpus = embed(texts, args.batch_size, args.vectors_cache)
+    queries = embed(query_texts, args.batch_size, None)
+    k = min(args.k, len(corpus))
+    print(f"{len(corpus)} documents (dim {corpus.shape[1]}), {len(queries)} queries, k={k} ({os.cpu_count()} CPUs)")
+
+    results = []
+    workdir = tempfile.mkdtemp(prefix="bench_hnsw-", dir=args.workdir)
+    try:
+        for space in args.space:
+            start = time.perf_counter()
+            truth = exact_neighbours(corpus, queries, k, space)
+            print(f"Exact neighbours ({space}) in {time.perf_counter() - start:.2f}s")
+            for m, construction_ef, search_ef in itertools.product(args.M, args.construction_ef, args.search_ef):
+                row = {"backend": "chroma", "space": space, "M": m, "construction_ef": construction_ef, "search_ef": search_ef}
+                row.update(bench_chroma(corpus, queries, truth, k, space, m, construction_ef, search_ef, workdir))
+                results.append(row)
+                print(
+                    f"{space:<6} M={m:<3} construction_ef={construction_ef:<4} search_ef={search_ef:<4} "
+                    f"recall@{k}={row['recall_at_k']:.4f} p50={row['p50_ms']:.2f}ms p95={row['p95_ms']:.2f}ms "
+                    f"p99={row['p99_ms']:.2f}ms build={row['build_seconds']:.1f}s size={row['index_bytes'] / 1e6:.1f}MB"
+                )
+
+        if args.flat:
+            # The flat store ranks by cosine similarity
+            truth = exact_neighbours(corpus, queries, k, "cosine")
+            for quantization, rescore in (("int8", True), ("int8", False), ("float16", False)):
+                row = {"backend": f"mmap-{quantization}{'-rescore' if rescore else ''}", "space": "cosine"}
+                row.update(bench_flat(corpus, queries, truth, k, quantization, rescore, workdir))
+                results.append(row)
+                print(
+                    f"{row['backend']:<18} recall@{k}={row['recall_at_k']:.4f} p50={row['p50_ms']:.2f}ms "
+                    f"p95={row['p95_ms']:.2f}ms p99={row['p99_ms']:.2f}ms size={row['index_bytes'] / 1e6:.1f}MB"
+                )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "model": MODEL_NAME,
+        "corpus": f"synthetic:{args.synthetic}" if args.synthetic else str(args.input),
+        "documents": len(corpus),
+        "dim": int(corpus.shape[1]),
+        "queries": len(queries),
+        "k": k,
+        "cpus": os.cpu_count(),
+        "results": results,
+    }
+    write_reports(report, args.json, args.csv)
+
+
+def int_list(value):
+    return [int(v) for v in value.split(",")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark HNSW recall/latency for the vector index")
+    parser.add_argument("--input", default="pubmed_results.csv", help="CSV with Title/Abstract columns")
+    parser.add_argument("--synthetic", type=int, default=0, help="Use N synthetic documents instead of the CSV")
+    parser.add_argument("--limit", type=int, default=0, help="Only index the first N CSV rows")
+    parser.add_argument("--vectors-cache", default=None, help="Save/reuse corpus embeddings in this .npy file")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--space", type=lambda v: v.split(","), default=["l2"], help=f"Comma-separated, from {HNSW_SPACES}")
+    parser.add_argument("--M", type=int_list, default=[16])
+    parser.add_argument("--construction-ef", type=int_list, default=[100])
+    parser.add_argument("--search-ef", type=int_list, default=[10, 50, 100])
+    parser.add_argument("--flat", action="store_true", help="Also benchmark the mmap backend (exact search)")
+    parser.add_argument("--batch-size", type=int, default=64, help="Embedding batch size")
+    parser.add_argument("--workdir", default=None, help="Where temporary indexes are built (default: system temp dir)")
+    parser.add_argument("--json", default=None, help="JSON report path")
+    parser.add_argument("--csv", default=None, help="CSV report path")
+    args = parser.parse_args()
+    unknown = set(args.space) - set(HNSW_SPACES)
+    if unknown:
+        parser.error(f"unknown space(s) {sorted(unknown)}; expected {HNSW_SPACES}")
+    main(args)
@@ -0,0 +1,97 @@
+"""
+bench_query_encoder.py
+
+Compares query-encoder backends (torch / quantized / onnx): single-query latency
+(p50/p95), batch throughput (queries/sec) and agreement with the torch vectors.
+
+Usage (from backend/):
+    python -m app.core.bench_query_encoder --backends torch,quantized,onnx
+    python -m app.core.bench_query_encoder --queries 2000 --batch-size 64 --output bench_query_encoder.json
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+from pathlib import Path
+
+import numpy as np
+from langchain.embeddings import HuggingFaceEmbeddings
+
+from app.core.query_encoder import DEFAULT_ONNX_DIR, build_query_encoder
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+WORDS = (
+    "amyloid tau microglia APOE4 NLRP3 cytokine synapse neuron plaque apoptosis kinase "
+    "receptor mitochondria oxidative stress biomarker cohort trial dementia cognition pathway"
+).split()
+
+
+def make_queries(n):
+    rng = random.Random(0)
+    return [" ".join(rng.choices(WORDS, k=rng.randint(2, 12))) for _ in range(n)]
+
+
+def main(backends, num_queries, single_runs, batch_size, onnx_dir, output):
+    queries = make_queries(num_queries)
+    print(f"{len(queries)} queries, batch size {batch_size} ({os.cpu_count()} CPUs)")
+    embeddings = HuggingFaceEmbeddings(model_name=MODEL_NAME, encode_kwargs={"batch_size": batch_size})
+    reference = np.asarray(embeddings.embed_documents(queries[:200]), dtype=np.float32)
+    reference /= np.linalg.norm(reference, axis=1, keepdims=True)
+
+    results = []
+    for backend in backends:
+        try:
+            encoder = build_query_encoder(backend, embeddings, onnx_dir=Path(onnx_dir), batch_size=batch_size)
+        except Exception as e:
+            print(f"{backend:<10} unavailable: {e}")
+            continue
+        encoder.embed_query("warm-up")
+
+        latencies = []
+        for query in queries[:single_runs]:
+            start = time.perf_counter()
+            encoder.embed_query(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        encoder.embed_documents(queries)
+        elapsed = time.perf_counter() - start
+
+        vectors = np.asarray(encoder.embed_documents(queries[:200]), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        cosine = (reference * vectors).sum(axis=1)
+
+        row = {
+            "backend": backend,
+            "p50_ms": round(statistics.median(latencies), 2),
+            "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+            "batch_queries_per_sec": round(len(queries) / elapsed, 1),
+            "min_cosine_to_torch": round(float(cosine.min()), 5),
+            "mean_cosine_to_torch": round(float(cosine.mean()), 5),
+        }
+        results.append(row)
+        print(
+            f"{backend:<10} p50={row['p50_ms']:>7.2f}ms p95={row['p95_ms']:>7.2f}ms "
+            f"batch={row['batch_queries_per_sec']:>9.1f} q/s min_cos={row['min_cosine_to_torch']}"
+        )
+
+    if output:
+        with open(output, "w", encoding="utf-8") as fh:
+            json.dump({"model": MODEL_NAME, "cpus": os.cpu_count(), "results": results}, fh, indent=2)
+        print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark query-encoder backends")
+    parser.add_argument("--backends", default="torch,quantized,onnx", help="Comma-separated backends")
+    parser.add_argument("--queries", type=int, default=1000, help="Synthetic queries for the batch run")
+    parser.add_argument("--single-runs", type=int, default=200, help="Queries encoded one at a time for latency")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--onnx-dir", default=DEFAULT_ONNX_DIR, help="Directory with model.onnx and tokenizer files")
+    parser.add_argument("--output", default=None, help="Optional JSON report path")
+    args = parser.parse_args()
+    main(args.backends.split(","), args.queries, args.single_runs, args.batch_size, args.onnx_dir, args.output)
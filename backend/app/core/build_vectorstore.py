@@ -5,6 +5,10 @@ from langchain.docstore.document import Document
 from pathlib import Path
 import os
 
+# Encode batch size and documents written per Chroma call
+batch_size = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+chunk_size = int(os.getenv("INDEX_BATCH_SIZE", "1000"))
+
 # Paths
 csv_path = Path("pubmed_results.csv")
 vector_dir = Path("vector_store")
@@ -25,10 +29,13 @@ docs = [
 
 # 3. Create embeddings (can use sentence-transformers)
 model_name = "sentence-transformers/all-MiniLM-L6-v2"
-embedder = HuggingFaceEmbeddings(model_name=model_name)
+embedder = HuggingFaceEmbeddings(model_name=model_name, encode_kwargs={"batch_size": batch_size})
 
-# 4. Build Chroma vector store
-vectorstore = Chroma.from_documents(docs, embedder, persist_directory=str(vector_dir))
+# 4. Build Chroma vector store, writing in chunks
+vectorstore = Chroma(persist_directory=str(vector_dir), embedding_function=embedder)
+for start in range(0, len(docs), chunk_size):
+    vectorstore.add_documents(docs[start:start + chunk_size])
+    print(f"Embedded {min(start + chunk_size, len(docs))}/{len(docs)} documents")
 vectorstore.persist()
 
 print("✅ Vector store built and saved to:", vector_dir)
\ No newline at end of file
@@ -0,0 +1,152 @@
+# app/core/corpora.py
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from app.core.rag_pipeline import RAGPipeline
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+DEFAULT_CORPUS = "default"
+CORPORA_DIR = Path(os.getenv("CORPORA_DIR", "corpora"))
+# Estimated index size (MB) of open named corpora before least recently used ones are dropped
+CORPUS_MEMORY_BUDGET_MB = int(os.getenv("CORPUS_MEMORY_BUDGET_MB", "2048"))
+CORPUS_CSV = "pubmed_results.csv"
+CORPUS_INDEX_DIR = "chroma_db"
+CORPUS_NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+
+
+class CorpusNotFound(Exception):
+    """Raised for a corpus name with no directory under CORPORA_DIR."""
+
+
+class CorpusManager:
+    """
+    Named corpora alongside the default one.
+     - "default" is the registry's pipeline (chroma_db + pubmed_results.csv)
+     - any other corpus is a directory <CORPORA_DIR>/<name>/ holding its own
+       pubmed_results.csv and chroma_db/ (BM25 index next to it, as usual)
+     - a corpus pipeline is opened on first use and shares the default pipeline's
+       embedding model, query encoder and query-embedding cache
+     - open corpora are kept in LRU order; when their estimated size (index files
+       on disk) exceeds the memory budget, the least recently used ones are
+       dropped and reopened on their next use. The default corpus and corpora
+       with a running build are never evicted.
+    """
+
+    def __init__(
+        self,
+        default_getter: Callable[[], "RAGPipeline"],
+        root: Path = CORPORA_DIR,
+        memory_budget_bytes: int = CORPUS_MEMORY_BUDGET_MB * 1024 * 1024,
+    ):
+        self._default_getter = default_getter
+        self.root = Path(root)
+        self.memory_budget_bytes = memory_budget_bytes
+        self._open: "OrderedDict[str, RAGPipeline]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        # One lock per corpus being opened: opening one does not hold up another
+        self._open_locks: Dict[str, threading.Lock] = {}
+        self.opens = 0
+        self.evictions = 0
+
+    def names(self) -> List[str]:
+        found = []
+        if self.root.is_dir():
+            found = sorted(p.name for p in self.root.iterdir() if p.is_dir() and CORPUS_NAME_RE.match(p.name))
+        return [DEFAULT_CORPUS] + [name for name in found if name != DEFAULT_CORPUS]
+
+    def _corpus_dir(self, name: str) -> Path:
+        if not CORPUS_NAME_RE.match(name) or not (self.root / name).is_dir():
+            raise CorpusNotFound(f"Unknown corpus {name!r}; available: {', '.join(self.names())}")
+        return self.root / name
+
+    def csv_path(self, name: Optional[str] = None) -> Path:
+        """CSV a corpus is built from."""
+        if not name or name == DEFAULT_CORPUS:
+            return Path(CORPUS_CSV)
+        return self._corpus_dir(name) / CORPUS_CSV
+
+    def get(self, name: Optional[str] = None) -> "RAGPipeline":
+        """
+        Pipeline of a corpus, opening it (and evicting others over budget) if needed.
+        Opening loads an index and measures it on disk, so call this off the event loop.
+        """
+        if not name or name == DEFAULT_CORPUS:
+            return self._default_getter()
+        pipeline = self._lookup(name)
+        if pipeline is not None:
+            return pipeline
+        corpus_dir = self._corpus_dir(name)
+        # Opening loads an index, so it is serialized per corpus, outside the lookup lock
+        with self._lock:
+            open_lock = self._open_locks.setdefault(name, threading.Lock())
+        with open_lock:
+            pipeline = self._lookup(name)
+            if pipeline is not None:
+                return pipeline
+            default = self._default_getter()
+            from app.core.rag_pipeline import RAGPipeline
+
+            logger.info("Opening corpus %s from %s", name, corpus_dir)
+            pipeline = RAGPipeline(chroma_dir=corpus_dir / CORPUS_INDEX_DIR, share_models_with=default)
+            with self._lock:
+                self.opens += 1
+                self._open[name] = pipeline
+            self._evict(keep=name)
+            return pipeline
+
+    def _lookup(self, name: str) -> Optional["RAGPipeline"]:
+        with self._lock:
+            pipeline = self._open.get(name)
+            if pipeline is not None:
+                self._open.move_to_end(name)
+            return pipeline
+
+    def _evict(self, keep: str) -> None:
+        """Drop least recently used corpora until the open ones fit the budget."""
+        # Sizes change with builds; refresh before deciding. Measuring walks the
+        # index files, so it happens outside _lock
+        with self._lock:
+            opened = list(self._open.items())
+        sizes = {name: pipeline.index_bytes() for name, pipeline in opened}
+        with self._lock:
+            self._sizes.update({name: size for name, size in sizes.items() if name in self._open})
+            for name in list(self._open):
+                if sum(self._sizes.get(n, 0) for n in self._open) <= self.memory_budget_bytes:
+                    break
+                if name == keep or self._open[name].is_building():
+                    continue
+                # In-flight requests keep their reference; memory is freed once they finish
+                self._open.pop(name)
+                self._sizes.pop(name, None)
+                self.evictions += 1
+                logger.info("Evicted corpus %s (memory budget %d MB)", name, self.memory_budget_bytes // (1024 * 1024))
+
+    def close(self) -> None:
+        """Close every open named corpus (on shutdown)."""
+        with self._lock:
+            pipelines = list(self._open.values())
+            self._open.clear()
+            self._sizes.clear()
+        for pipeline in pipelines:
+            pipeline.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            open_sizes = {name: self._sizes.get(name, 0) for name in self._open}
+        return {
+            "corpora": self.names(),
+            "open": list(open_sizes),
+            "open_bytes": sum(open_sizes.values()),
+            "memory_budget_bytes": self.memory_budget_bytes,
+            "opens": self.opens,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,95 @@
+# app/core/doc_store.py
+import logging
+import sqlite3
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from app.core.sqlite_conn import ThreadLocalSQLite
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+DOC_STORE_FILE = "documents.sqlite3"
+# SQLite host parameters per IN (...) clause
+SQL_CHUNK = 500
+
+
+class DocumentStore:
+    """
+    PMID-keyed store of title + abstract, kept next to the vector index
+    (<index dir>/documents.sqlite3). Each text is stored once, abstracts
+    zlib-compressed; the vector index only carries ids, PMID and content hash,
+    and retrieval loads text here for the results it actually returns.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._db = ThreadLocalSQLite(self.path)
+        self._init_db()
+
+    @classmethod
+    def exists(cls, directory: Path) -> bool:
+        return (Path(directory) / DOC_STORE_FILE).exists()
+
+    @classmethod
+    def open(cls, directory: Path) -> "DocumentStore":
+        return cls(Path(directory) / DOC_STORE_FILE)
+
+    def _conn(self) -> sqlite3.Connection:
+        return self._db.conn()
+
+    def close(self) -> None:
+        """Close every thread's connection (on shutdown)."""
+        self._db.close()
+
+    def _init_db(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn().execute(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                pmid TEXT PRIMARY KEY,
+                title TEXT NOT NULL,
+                abstract BLOB NOT NULL
+            )
+            """
+        )
+
+    def upsert(self, rows: Iterable[Sequence[str]]) -> None:
+        """Store (pmid, title, abstract, ...) rows, replacing existing PMIDs."""
+        records = [(row[0], row[1], zlib.compress(row[2].encode("utf-8"))) for row in rows]
+        if not records:
+            return
+        conn = self._conn()
+        conn.execute("BEGIN")
+        try:
+            conn.executemany("INSERT OR REPLACE INTO documents(pmid, title, abstract) VALUES (?, ?, ?)", records)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, pmids: List[str]) -> None:
+        conn = self._conn()
+        for start in range(0, len(pmids), SQL_CHUNK):
+            chunk = pmids[start:start + SQL_CHUNK]
+            conn.execute(f"DELETE FROM documents WHERE pmid IN ({','.join('?' * len(chunk))})", chunk)
+
+    def get_many(self, pmids: List[str]) -> Dict[str, Tuple[str, str]]:
+        """{pmid: (title, abstract)} for the PMIDs present in the store."""
+        found: Dict[str, Tuple[str, str]] = {}
+        conn = self._conn()
+        unique = list(dict.fromkeys(pmids))
+        for start in range(0, len(unique), SQL_CHUNK):
+            chunk = unique[start:start + SQL_CHUNK]
+            for pmid, title, abstract in conn.execute(
+                f"SELECT pmid, title, abstract FROM documents WHERE pmid IN ({','.join('?' * len(chunk))})", chunk
+            ):
+                found[pmid] = (title, zlib.decompress(abstract).decode("utf-8"))
+        return found
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def size_bytes(self) -> int:
+        return sum(p.stat().st_size for p in self.path.parent.glob(f"{self.path.name}*") if p.is_file())
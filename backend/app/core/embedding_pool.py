@@ -0,0 +1,69 @@
+# app/core/embedding_pool.py
+import logging
+import os
+from typing import Any, List, Optional
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def default_encode_batch_size() -> int:
+    return int(os.getenv("EMBED_BATCH_SIZE", "64"))
+
+
+def default_encode_workers() -> int:
+    """Encode processes used for index builds (EMBED_WORKERS; 0 = encode in-process)."""
+    return int(os.getenv("EMBED_WORKERS", "0"))
+
+
+class EmbeddingPool:
+    """
+    Document encoder for index builds.
+     - workers <= 1: encodes in-process through the LangChain embeddings object
+     - workers > 1: starts a sentence-transformers multi-process pool with one CPU
+       worker per process, so encoding scales with cores
+    Use as a context manager so the worker processes are stopped after the build.
+    Each worker runs its own torch threads; set OMP_NUM_THREADS (e.g. cores / workers)
+    to avoid oversubscription.
+    """
+
+    def __init__(self, embeddings: Any, workers: Optional[int] = None, batch_size: Optional[int] = None):
+        self.embeddings = embeddings
+        self.workers = default_encode_workers() if workers is None else workers
+        self.batch_size = batch_size or default_encode_batch_size()
+        self._model = None
+        self._pool = None
+
+    def __enter__(self) -> "EmbeddingPool":
+        if self.workers > 1:
+            model = getattr(self.embeddings, "client", None)
+            if model is None or not hasattr(model, "start_multi_process_pool"):
+                logger.warning("Embeddings backend has no multi-process support; encoding in-process.")
+            else:
+                logger.info("Starting %d-process encode pool (batch size %d)", self.workers, self.batch_size)
+                self._model = model
+                self._pool = model.start_multi_process_pool(target_devices=["cpu"] * self.workers)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self._pool is not None:
+            self._model.stop_multi_process_pool(self._pool)
+            self._pool = None
+
+    def encode(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        # Same preprocessing as HuggingFaceEmbeddings, so build-time and query-time vectors match
+        texts = [t.replace("\n", " ") for t in texts]
+        if self._pool is not None:
+            chunk_size = max(self.batch_size, len(texts) // (self.workers * 4) or 1)
+            vectors = self._model.encode_multi_process(
+                texts, self._pool, batch_size=self.batch_size, chunk_size=chunk_size
+            )
+            return vectors.tolist()
+        model = getattr(self.embeddings, "client", None)
+        if model is not None and hasattr(model, "encode"):
+            encode_kwargs = dict(getattr(self.embeddings, "encode_kwargs", {}) or {})
+            encode_kwargs["batch_size"] = self.batch_size
+            return model.encode(texts, **encode_kwargs).tolist()
+        return self.embeddings.embed_documents(texts)
@@ -0,0 +1,68 @@
+# app/core/executors.py
+import asyncio
+import functools
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Default worker count per stage. Override with <STAGE>_POOL_SIZE, e.g. LLM_POOL_SIZE=16.
+# "search" is kept apart from "retrieval" so a burst of /api/hypothesis/generate calls
+# cannot starve /api/retriever/search.
+DEFAULT_POOL_SIZES: Dict[str, int] = {
+    "search": 4,
+    "retrieval": 4,
+    # Per-shard vector searches of one query (sharded index)
+    "shard": 8,
+    "kg": 4,
+    "llm": 8,
+    "index": 1,
+}
+
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_lock = threading.Lock()
+
+
+def pool_size(stage: str) -> int:
+    """Configured worker count for a stage."""
+    default = DEFAULT_POOL_SIZES.get(stage, 4)
+    raw = os.getenv(f"{stage.upper()}_POOL_SIZE")
+    if not raw:
+        return default
+    try:
+        return max(1, int(raw))
+    except ValueError:
+        logger.warning("Invalid %s_POOL_SIZE=%r; using %d", stage.upper(), raw, default)
+        return default
+
+
+def get_executor(stage: str) -> ThreadPoolExecutor:
+    """Return the bounded thread pool for a stage, creating it on first use."""
+    executor = _executors.get(stage)
+    if executor is None:
+        with _lock:
+            executor = _executors.get(stage)
+            if executor is None:
+                size = pool_size(stage)
+                executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix=f"{stage}-pool")
+                _executors[stage] = executor
+                logger.info("Started %s pool with %d workers", stage, size)
+    return executor
+
+
+async def run_in_pool(stage: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a blocking callable on the stage's pool without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(stage), functools.partial(func, *args, **kwargs))
+
+
+def shutdown_executors(wait: bool = False) -> None:
+    """Shut down every stage pool (called on application shutdown)."""
+    with _lock:
+        for executor in _executors.values():
+            executor.shutdown(wait=wait, cancel_futures=True)
+        _executors.clear()
@@ -0,0 +1,345 @@
+# app/core/flat_store.py
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.sqlite_conn import ThreadLocalSQLite
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+META_FILE = "flat_meta.json"
+RAW_FILE = "vectors.f32"
+QUANT_FILE = "vectors.q.npy"
+SCALES_FILE = "scales.npy"
+DOCS_DB = "docs.sqlite3"
+
+QUANTIZATIONS = ("int8", "float16")
+# Rows scored per block during a scan; bounds the float32 working set per query batch
+SCAN_BLOCK = 65536
+# SQLite host parameters per IN (...) clause
+SQL_CHUNK = 500
+
+
+def is_flat_store(directory: Path) -> bool:
+    return (Path(directory) / META_FILE).exists()
+
+
+def _chunks(items: Sequence[Any], size: int = SQL_CHUNK):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class FlatVectorStore:
+    """
+    Exact-search vector store over memory-mapped files (VECTOR_BACKEND=mmap).
+    One directory holds:
+     - vectors.f32: raw float32 rows, append-only (re-scoring and stored-vector lookups)
+     - vectors.q.npy (+ scales.npy): unit-normalized rows as int8 with a per-row
+       scale, or float16, scanned block by block for an exact top-k
+     - docs.sqlite3: id / pmid / metadata / document of every live row
+    All workers mmap the same files, so they share the OS page cache instead of
+    each holding its own float32 index, and opening the store is just an mmap.
+    upsert/delete write the raw file and SQLite; persist() quantizes the new rows
+    and makes them searchable. Replaced or deleted rows stay in the files until
+    the next full rebuild.
+    Implements the subset of the Chroma collection API RAGPipeline uses
+    (get / query / upsert / delete / count).
+    """
+
+    def __init__(self, directory: Path, quantization: str = "int8", rescore: bool = True, rescore_factor: int = 4):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization {quantization!r}; expected one of {QUANTIZATIONS}")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.rescore = rescore
+        self.rescore_factor = max(1, rescore_factor)
+        self._write_lock = threading.Lock()
+
+        meta_path = self.directory / META_FILE
+        if meta_path.exists():
+            meta = json.loads(meta_path.read_text())
+            self.dim: Optional[int] = meta["dim"]
+            self.rows: int = meta["rows"]
+            self.quantization: str = meta["quantization"]
+            if self.quantization != quantization:
+                logger.info("Flat store %s is %s-quantized; ignoring requested %s", self.directory, self.quantization, quantization)
+        else:
+            self.dim, self.rows, self.quantization = None, 0, quantization
+            self._save_meta()
+        self._db = ThreadLocalSQLite(self.directory / DOCS_DB)
+        self._init_db()
+        self._load_matrix()
+
+    # ---------------------------
+    # Files and SQLite plumbing
+    # ---------------------------
+
+    def _conn(self) -> sqlite3.Connection:
+        return self._db.conn()
+
+    def close(self) -> None:
+        """Close every thread's connection (on shutdown)."""
+        self._db.close()
+
+    def _init_db(self) -> None:
+        conn = self._conn()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS docs (
+                row INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                pmid TEXT,
+                metadata TEXT,
+                document TEXT
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_docs_pmid ON docs(pmid)")
+
+    def _save_meta(self) -> None:
+        tmp = self.directory / f"{META_FILE}.tmp"
+        tmp.write_text(json.dumps({"dim": self.dim, "rows": self.rows, "quantization": self.quantization}))
+        os.replace(tmp, self.directory / META_FILE)
+
+    def _raw(self, rows: int) -> Optional[np.memmap]:
+        if not rows or not self.dim:
+            return None
+        return np.memmap(self.directory / RAW_FILE, dtype=np.float32, mode="r", shape=(rows, self.dim))
+
+    def _load_matrix(self) -> None:
+        """(Re)open the quantized matrix and the live-row mask."""
+        matrix = scales = None
+        if (self.directory / QUANT_FILE).exists():
+            matrix = np.load(self.directory / QUANT_FILE, mmap_mode="r")
+            if self.quantization == "int8":
+                scales = np.load(self.directory / SCALES_FILE, mmap_mode="r")
+        searchable = len(matrix) if matrix is not None else 0
+        live = np.zeros(searchable, dtype=bool)
+        rows = [row for (row,) in self._conn().execute("SELECT row FROM docs WHERE row < ?", (searchable,))]
+        live[rows] = True
+        # One assignment, so a concurrent query sees either the old or the new snapshot
+        self._snapshot = (matrix, scales, live, self._raw(searchable))
+
+    def _quantize(self, block: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        unit = block / np.maximum(np.linalg.norm(block, axis=1, keepdims=True), 1e-12)
+        if self.quantization == "float16":
+            return unit.astype(np.float16), None
+        scales = np.maximum(np.abs(unit).max(axis=1), 1e-12) / 127.0
+        return np.round(unit / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    # ---------------------------
+    # Collection API
+    # ---------------------------
+
+    @staticmethod
+    def relevance_score_fn(distance: float) -> float:
+        # Same conversion LangChain uses for Chroma's (squared) L2 distance
+        return 1.0 - distance / math.sqrt(2)
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def upsert(self, ids: List[str], embeddings, metadatas: Optional[List[Dict[str, Any]]] = None, documents: Optional[List[str]] = None) -> None:
+        vectors = np.ascontiguousarray(np.asarray(embeddings, dtype=np.float32))
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError("upsert needs one embedding per id")
+        metadatas = metadatas or [{} for _ in ids]
+        documents = documents or ["" for _ in ids]
+        with self._write_lock:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match store dimension {self.dim}")
+            start = self.rows
+            with open(self.directory / RAW_FILE, "ab") as fh:
+                fh.write(vectors.tobytes())
+            self.rows += len(vectors)
+            self._save_meta()
+            conn = self._conn()
+            conn.execute("BEGIN")
+            try:
+                # REPLACE drops the previous row with the same id; its vector becomes dead space
+                conn.executemany(
+                    "INSERT OR REPLACE INTO docs(row, id, pmid, metadata, document) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (start + i, doc_id, str((meta or {}).get("pmid", "")), json.dumps(meta or {}), text or "")
+                        for i, (doc_id, meta, text) in enumerate(zip(ids, metadatas, documents))
+                    ],
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, ids: List[str]) -> None:
+        if not ids:
+            return
+        _, _, live, _ = self._snapshot
+        conn = self._conn()
+        with self._write_lock:
+            for chunk in _chunks(list(ids)):
+                marks = ",".join("?" * len(chunk))
+                rows = [row for (row,) in conn.execute(f"SELECT row FROM docs WHERE id IN ({marks})", chunk)]
+                conn.execute(f"DELETE FROM docs WHERE id IN ({marks})", chunk)
+                live[[row for row in rows if row < len(live)]] = False
+
+    def persist(self) -> None:
+        """Quantize rows written since the last persist and make them searchable."""
+        with self._write_lock:
+            matrix, scales, _, _ = self._snapshot
+            done = len(matrix) if matrix is not None else 0
+            if done >= self.rows:
+                return
+            raw = self._raw(self.rows)
+            dtype = np.int8 if self.quantization == "int8" else np.float16
+            quant_tmp = self.directory / f"{QUANT_FILE}.tmp.npy"
+            scales_tmp = self.directory / f"{SCALES_FILE}.tmp.npy"
+            out = np.lib.format.open_memmap(quant_tmp, mode="w+", dtype=dtype, shape=(self.rows, self.dim))
+            out_scales = None
+            if self.quantization == "int8":
+                out_scales = np.lib.format.open_memmap(scales_tmp, mode="w+", dtype=np.float32, shape=(self.rows,))
+            if done:
+                out[:done] = matrix
+                if out_scales is not None:
+                    out_scales[:done] = scales
+            for start in range(done, self.rows, SCAN_BLOCK):
+                end = min(start + SCAN_BLOCK, self.rows)
+                quantized, block_scales = self._quantize(np.asarray(raw[start:end]))
+                out[start:end] = quantized
+                if out_scales is not None:
+                    out_scales[start:end] = block_scales
+            out.flush()
+            del out
+            if out_scales is not None:
+                out_scales.flush()
+                del out_scales
+                os.replace(scales_tmp, self.directory / SCALES_FILE)
+            os.replace(quant_tmp, self.directory / QUANT_FILE)
+            self._load_matrix()
+            logger.info("Flat store %s: %d rows searchable (%s)", self.directory, self.rows, self.quantization)
+
+    def _rows_to_docs(self, rows: Sequence[int]) -> Dict[int, Tuple[str, Dict[str, Any], str]]:
+        found: Dict[int, Tuple[str, Dict[str, Any], str]] = {}
+        conn = self._conn()
+        for chunk in _chunks([int(r) for r in rows]):
+            marks = ",".join("?" * len(chunk))
+            for row, doc_id, meta, text in conn.execute(
+                f"SELECT row, id, metadata, document FROM docs WHERE row IN ({marks})", chunk
+            ):
+                found[row] = (doc_id, json.loads(meta or "{}"), text or "")
+        return found
+
+    def _scan(self, queries: np.ndarray, n: int, matrix: np.ndarray, scales, live: np.ndarray):
+        """Exact top-n rows per query by cosine similarity over the quantized matrix."""
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, len(matrix), SCAN_BLOCK):
+            end = min(start + SCAN_BLOCK, len(matrix))
+            scores = queries @ np.asarray(matrix[start:end], dtype=np.float32).T
+            if scales is not None:
+                scores *= np.asarray(scales[start:end])
+            scores[:, ~live[start:end]] = -np.inf
+            scores = np.concatenate([best_scores, scores], axis=1)
+            rows = np.concatenate([best_rows, np.broadcast_to(np.arange(start, end), (len(queries), end - start))], axis=1)
+            if scores.shape[1] > n:
+                keep = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+                scores = np.take_along_axis(scores, keep, axis=1)
+                rows = np.take_along_axis(rows, keep, axis=1)
+            best_scores, best_rows = scores, rows
+        order = np.argsort(-best_scores, axis=1)
+        return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+    def query(self, query_embeddings, n_results: int = 10, include: Sequence[str] = ("metadatas", "documents", "distances")) -> Dict[str, Any]:
+        matrix, scales, live, raw = self._snapshot
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        result: Dict[str, Any] = {"ids": [], "metadatas": [], "documents": [], "distances": []}
+        if "embeddings" in include:
+            result["embeddings"] = []
+        if matrix is None or not len(matrix):
+            for key in result:
+                result[key] = [[] for _ in queries]
+            return result
+
+        candidates = n_results * self.rescore_factor if self.rescore else n_results
+        top_rows, top_scores = self._scan(queries, candidates, matrix, scales, live)
+        for query_vector, rows, scores in zip(queries, top_rows, top_scores):
+            valid = np.isfinite(scores)
+            rows, scores = rows[valid], scores[valid]
+            vectors = None
+            if self.rescore or "embeddings" in include:
+                # Sorted fancy indexing reads only the candidate rows from the mmap
+                order = np.argsort(rows)
+                vectors = np.empty((len(rows), self.dim), dtype=np.float32)
+                vectors[order] = raw[rows[order]]
+            if self.rescore and len(rows):
+                unit = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+                scores = unit @ query_vector
+                keep = np.argsort(-scores)[:n_results]
+            else:
+                keep = np.arange(min(n_results, len(rows)))
+            docs = self._rows_to_docs(rows[keep])
+            ids, metadatas, documents, distances, embeddings = [], [], [], [], []
+            for i in keep:
+                entry = docs.get(int(rows[i]))
+                if entry is None:
+                    # Deleted since the last persist
+                    continue
+                ids.append(entry[0])
+                metadatas.append(entry[1])
+                documents.append(entry[2])
+                # Squared L2 distance between unit vectors
+                distances.append(float(2.0 - 2.0 * scores[i]))
+                if vectors is not None:
+                    embeddings.append(vectors[i].tolist())
+            result["ids"].append(ids)
+            result["metadatas"].append(metadatas)
+            result["documents"].append(documents)
+            result["distances"].append(distances)
+            if "embeddings" in include:
+                result["embeddings"].append(embeddings)
+        return result
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        include: Sequence[str] = ("metadatas", "documents"),
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        clause, params = "", []
+        if ids is not None:
+            clause, params = f"WHERE id IN ({','.join('?' * len(ids))})", list(ids)
+        elif where:
+            value = where.get("pmid")
+            if len(where) != 1 or value is None:
+                raise ValueError(f"Unsupported filter {where!r}; only 'pmid' is indexed")
+            if isinstance(value, dict):
+                values = [str(v) for v in value.get("$in", [])]
+                clause, params = f"WHERE pmid IN ({','.join('?' * len(values))})", values
+            else:
+                clause, params = "WHERE pmid = ?", [str(value)]
+        sql = f"SELECT row, id, metadata, document FROM docs {clause} ORDER BY row"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params += [int(limit), int(offset or 0)]
+        fetched = self._conn().execute(sql, params).fetchall() if params or not clause else []
+
+        result: Dict[str, Any] = {"ids": [doc_id for _, doc_id, _, _ in fetched]}
+        if "metadatas" in include:
+            result["metadatas"] = [json.loads(meta or "{}") for _, _, meta, _ in fetched]
+        if "documents" in include:
+            result["documents"] = [text or "" for _, _, _, text in fetched]
+        if "embeddings" in include:
+            raw = self._raw(self.rows)
+            result["embeddings"] = [raw[row].tolist() for row, _, _, _ in fetched] if raw is not None else []
+        return result
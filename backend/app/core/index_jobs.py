@@ -0,0 +1,145 @@
+# app/core/index_jobs.py
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.executors import get_executor
+from app.core.rag_pipeline import BuildCancelled
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class IndexBuildJob:
+    """State and progress of one background index build."""
+
+    def __init__(self, csv_path: Path, incremental: bool, shard: Optional[int] = None, corpus: Optional[str] = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.csv_path = Path(csv_path)
+        self.corpus = corpus
+        self.incremental = incremental
+        # Only this shard of a sharded index is rebuilt (None = whole index)
+        self.shard = shard
+        self.status = "queued"  # queued -> running -> succeeded | failed | cancelled
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.done = 0
+        self.total = 0
+        self.error: Optional[str] = None
+        self.result: Dict[str, Any] = {}
+        self._cancel = threading.Event()
+
+    def update(self, done: int, total: int) -> None:
+        self.done = done
+        self.total = total
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = None
+        if self.started_at:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        rate = self.done / elapsed if elapsed and self.done else 0.0
+        eta = (self.total - self.done) / rate if rate and self.status == "running" else None
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "mode": "incremental" if self.incremental else "full",
+            "corpus": self.corpus or "default",
+            "shard": self.shard,
+            "csv_path": str(self.csv_path),
+            "docs_embedded": self.done,
+            "docs_total": self.total,
+            "progress": round(self.done / self.total, 4) if self.total else 0.0,
+            "docs_per_sec": round(rate, 2),
+            "eta_seconds": round(eta, 1) if eta is not None else None,
+            "elapsed_seconds": round(elapsed, 1) if elapsed is not None else None,
+            "cancel_requested": self.cancel_requested(),
+            "error": self.error,
+            "result": self.result,
+        }
+
+
+class IndexJobManager:
+    """
+    Runs RAGPipeline.build_index as background jobs on the "index" pool;
+    pipeline_getter(corpus) returns the pipeline of the job's corpus.
+    Jobs are serialized by the pool size (INDEX_POOL_SIZE, default 1); the
+    most recent `max_jobs` are kept for status queries.
+    Job state lives in the memory of the worker process that accepted the build.
+    With several uvicorn workers, a status poll or cancel served by another
+    worker returns 404 (the finished index itself is picked up by every worker);
+    run builds against a single-worker instance to track them reliably.
+    """
+
+    def __init__(self, pipeline_getter: Callable[[], Any], max_jobs: int = 50):
+        self._pipeline_getter = pipeline_getter
+        self._jobs: "OrderedDict[str, IndexBuildJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_jobs = max_jobs
+
+    def submit(self, csv_path: Path, incremental: bool, shard: Optional[int] = None, corpus: Optional[str] = None) -> IndexBuildJob:
+        job = IndexBuildJob(csv_path, incremental, shard, corpus)
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.max_jobs:
+                oldest_id, oldest = next(iter(self._jobs.items()))
+                if oldest.status in {"queued", "running"}:
+                    break
+                self._jobs.pop(oldest_id)
+        get_executor("index").submit(self._run, job)
+        logger.info("Queued index build job %s (%s)", job.id, "incremental" if incremental else "full")
+        return job
+
+    def _run(self, job: IndexBuildJob) -> None:
+        if job.cancel_requested():
+            job.status = "cancelled"
+            job.finished_at = time.time()
+            return
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            pipeline = self._pipeline_getter(job.corpus)
+            success = pipeline.build_index(
+                job.csv_path,
+                incremental=job.incremental,
+                progress=job.update,
+                should_cancel=job.cancel_requested,
+                shard=job.shard,
+            )
+            if success:
+                job.status = "succeeded"
+                job.result = dict(pipeline.last_build_stats)
+            else:
+                job.status = "failed"
+                job.error = "Failed to build index. Check logs for details."
+        except BuildCancelled:
+            job.status = "cancelled"
+        except Exception as e:
+            logger.exception("Index build job %s failed: %s", job.id, e)
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            logger.info("Index build job %s finished: %s", job.id, job.status)
+
+    def get(self, job_id: str) -> Optional[IndexBuildJob]:
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[IndexBuildJob]:
+        return list(reversed(self._jobs.values()))
+
+    def cancel(self, job_id: str) -> Optional[IndexBuildJob]:
+        job = self._jobs.get(job_id)
+        if job is not None and job.status in {"queued", "running"}:
+            job.cancel()
+        return job
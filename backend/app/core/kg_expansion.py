@@ -0,0 +1,152 @@
+# app/core/kg_expansion.py
+import csv
+import io
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.core.sparse_index import tokenize
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+DEFAULT_KG_CSV = Path(os.getenv("KG_CSV", str(Path(__file__).with_name("kg_data.csv"))))
+# Linked query entities, and neighbours per entity, turned into sub-queries
+KG_EXPANSION_ENTITIES = int(os.getenv("KG_EXPANSION_ENTITIES", "3"))
+KG_EXPANSION_NEIGHBOURS = int(os.getenv("KG_EXPANSION_NEIGHBOURS", "3"))
+# Edges read from Neo4j when the adjacency is precomputed
+KG_ADJACENCY_LIMIT = int(os.getenv("KG_ADJACENCY_LIMIT", "200000"))
+
+Triple = Tuple[str, str, str]
+
+
+def _relation_text(relation: str) -> str:
+    # "RISK_FACTOR_FOR" -> "risk factor for"
+    return relation.replace("_", " ").strip().lower()
+
+
+class KGAdjacency:
+    """
+    In-memory 1-hop adjacency of the knowledge graph, for query expansion.
+    Entities are linked by matching the longest run of query tokens against
+    node names (same tokenizer as BM25); each neighbour becomes a sub-query
+    stating the edge, e.g. "Amyloid beta associated with Alzheimer's Disease".
+    Built once from Neo4j (or kg_data.csv), so expansion is pure dict lookups.
+    """
+
+    def __init__(self, triples: Iterable[Triple], source: str = ""):
+        self.source = source
+        self.names: Dict[Tuple[str, ...], str] = {}
+        # entity tokens -> [(neighbour tokens, sub-query text)]
+        self.edges: Dict[Tuple[str, ...], List[Tuple[Tuple[str, ...], str]]] = {}
+        self.max_name_tokens = 1
+        self.num_edges = 0
+        self.built_at = time.time()
+        for subject, relation, obj in triples:
+            subject, obj = subject.strip(), obj.strip()
+            s_key, o_key = tuple(tokenize(subject)), tuple(tokenize(obj))
+            if not s_key or not o_key or s_key == o_key:
+                continue
+            text = f"{subject} {_relation_text(relation)} {obj}".strip()
+            for key, name, other in ((s_key, subject, o_key), (o_key, obj, s_key)):
+                self.names.setdefault(key, name)
+                neighbours = self.edges.setdefault(key, [])
+                if all(existing != other for existing, _ in neighbours):
+                    neighbours.append((other, text))
+                self.max_name_tokens = max(self.max_name_tokens, len(key))
+            self.num_edges += 1
+
+    @classmethod
+    def from_csv(cls, path: Path = DEFAULT_KG_CSV) -> "KGAdjacency":
+        """Load subject,relation,object[,pmids] rows (whole-row-quoted lines, as in kg_data.csv, work too)."""
+        triples: List[Triple] = []
+        with open(path, newline="", encoding="utf-8") as fh:
+            for row in csv.reader(fh):
+                if len(row) == 1 and "," in row[0]:
+                    row = next(csv.reader(io.StringIO(row[0])))
+                if len(row) < 3 or [c.strip().lower() for c in row[:3]] == ["subject", "relation", "object"]:
+                    continue
+                triples.append((row[0], row[1], row[2]))
+        return cls(triples, source=str(path))
+
+    @classmethod
+    def from_kg(cls, kg_pipeline: Any, limit: int = KG_ADJACENCY_LIMIT) -> "KGAdjacency":
+        """Read every edge (up to limit) from Neo4j in one query."""
+        records = kg_pipeline.execute_cypher(
+            """
+            MATCH (s)-[r]->(o)
+            RETURN coalesce(s.name, s.title, '') AS subject,
+                   coalesce(r.type, type(r)) AS relation,
+                   coalesce(o.name, o.title, '') AS object
+            LIMIT $limit
+            """,
+            {"limit": limit},
+        )
+        triples = [(str(r.get("subject") or ""), str(r.get("relation") or ""), str(r.get("object") or "")) for r in records]
+        return cls(triples, source="neo4j")
+
+    @classmethod
+    def load(cls, kg_pipeline: Optional[Any] = None, csv_path: Path = DEFAULT_KG_CSV) -> "KGAdjacency":
+        """From Neo4j when connected, else from the CSV (empty if neither is available)."""
+        start = time.perf_counter()
+        adjacency = None
+        if kg_pipeline is not None and kg_pipeline.is_ready():
+            try:
+                adjacency = cls.from_kg(kg_pipeline)
+            except Exception as e:
+                logger.warning("Could not read KG adjacency from Neo4j, falling back to %s: %s", csv_path, e)
+        if adjacency is None:
+            try:
+                adjacency = cls.from_csv(csv_path)
+            except OSError as e:
+                logger.warning("No KG adjacency available (%s); query expansion is disabled.", e)
+                adjacency = cls([], source="none")
+        logger.info(
+            "KG adjacency from %s: %d entities, %d edges (%.1f ms)",
+            adjacency.source, len(adjacency.edges), adjacency.num_edges, (time.perf_counter() - start) * 1000,
+        )
+        return adjacency
+
+    def link(self, query: str) -> List[Tuple[str, ...]]:
+        """KG entities mentioned in the query, longest match first, in query order."""
+        tokens = tokenize(query)
+        found: List[Tuple[str, ...]] = []
+        i = 0
+        while i < len(tokens):
+            for n in range(min(self.max_name_tokens, len(tokens) - i), 0, -1):
+                key = tuple(tokens[i:i + n])
+                if key in self.edges:
+                    if key not in found:
+                        found.append(key)
+                    i += n
+                    break
+            else:
+                i += 1
+        return found
+
+    def expand(
+        self,
+        query: str,
+        max_entities: int = KG_EXPANSION_ENTITIES,
+        max_neighbours: int = KG_EXPANSION_NEIGHBOURS,
+    ) -> List[str]:
+        """Sub-queries for the 1-hop neighbours of the entities linked in the query."""
+        linked = self.link(query)[:max_entities]
+        mentioned = set(linked)
+        expansions: List[str] = []
+        for key in linked:
+            # Edges between two entities the query already names add nothing
+            for _, text in [edge for edge in self.edges[key] if edge[0] not in mentioned][:max_neighbours]:
+                if text not in expansions:
+                    expansions.append(text)
+        return expansions
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "source": self.source,
+            "entities": len(self.edges),
+            "edges": self.num_edges,
+            "age_seconds": round(time.time() - self.built_at, 1),
+        }
@@ -10,7 +10,8 @@ from app.models.schema import (
     Hypothesis, SuggestedExperiment, SummarySection
 )
 from app.core.summary_generator import SummaryGenerator
-from app.core.prompt_template import HYPOTHESIS_SYSTEM_PROMPT
+from app.core.llm_cache import get_llm_cache
+from app.core.prompt_template import HYPOTHESIS_SYSTEM_PROMPT, COMBINED_SYSTEM_PROMPT
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -19,6 +20,9 @@ class LLMAgent:
     def __init__(self):
         self.llm = None
         self.summary_generator = None
+        self.cache = get_llm_cache()
+        # Single structured call for summary + hypotheses (set LLM_COMBINED_MODE=0 for two calls)
+        self.combined_mode = os.getenv("LLM_COMBINED_MODE", "1").lower() not in {"0", "false", "no"}
         self._initialize_llm()
         self._initialize_summary_generator()
 
@@ -44,7 +48,7 @@ class LLMAgent:
 
     def _initialize_summary_generator(self):
         """Initialize summary generator."""
-        self.summary_generator = SummaryGenerator(self.llm)
+        self.summary_generator = SummaryGenerator(self.llm, cache=self.cache)
 
     def is_ready(self) -> bool:
         """Check if LLM agent is ready."""
@@ -75,10 +79,10 @@ class LLMAgent:
         
         return response_content.strip()
 
-    def generate_summary(self, query: str, evidence: List[EvidenceItem]) -> SummarySection:
+    def generate_summary(self, query: str, evidence: List[EvidenceItem], temperature: float = 0.0) -> SummarySection:
         """Generate research summary from evidence."""
         if self.summary_generator:
-            return self.summary_generator.generate_summary(query, evidence)
+            return self.summary_generator.generate_summary(query, evidence, temperature)
         else:
             return SummarySection(
                 overview=f"Analysis of {len(evidence)} papers on {query}",
@@ -87,9 +91,9 @@ class LLMAgent:
                 implications="Potential for generating novel research hypotheses"
             )
 
-    def _create_fallback_hypothesis(self, query: str, evidence: List[EvidenceItem], summary: SummarySection = None) -> HypothesisResponse:
+    def _create_fallback_hypothesis(self, query: str, evidence: List[EvidenceItem], summary: SummarySection = None, include_summary: bool = True) -> HypothesisResponse:
         """Create a fallback hypothesis when LLM fails."""
-        if summary is None:
+        if summary is None and include_summary:
             summary = self.generate_summary(query, evidence)
             
         supporting_evidence = []
@@ -114,7 +118,7 @@ class LLMAgent:
             limitations="Limited by available literature scope and requires experimental validation."
         )
         
-        return HypothesisResponse(
+        response = HypothesisResponse(
             query=query,
             summary=summary,
             hypotheses=[hypothesis],
@@ -122,28 +126,38 @@ class LLMAgent:
             kg_triples=[],
             note="Generated using fallback method (LLM parsing failed)"
         )
+        response._llm_fallback = True
+        return response
 
-    def generate_hypothesis(
+    def _invoke(self, messages: List, temperature: float):
+        """
+        Invoke the LLM, serving deterministic calls from the response cache.
+        Returns (response content, cache key); the key is None on a cache hit or
+        when the call is not cacheable. Store the content with _remember() once it parses.
+        The temperature is bound per call instead of mutating the shared client,
+        since concurrent requests use the same LLM instance.
+        """
+        key, cached = self.cache.lookup(self.llm, messages, temperature) if self.cache else (None, None)
+        if cached is not None:
+            print("⚡ LLM cache hit")
+            return cached, None
+        llm = self.llm.bind(temperature=temperature) if hasattr(self.llm, 'bind') else self.llm
+        response = llm.invoke(messages)
+        return getattr(response, "content", str(response)), key
+
+    def _remember(self, key: Optional[str], content: str) -> None:
+        """Cache a response that parsed successfully."""
+        if key and self.cache:
+            self.cache.put(key, content, self.cache.model_name(self.llm))
+
+    def _build_prompt_input(
         self,
         request: QueryRequest,
         evidence: List[EvidenceItem],
-        kg_triples: List[KGTriple]
-    ) -> HypothesisResponse:
-        """Generate hypotheses using structured prompt."""
-        # Generate summary first
-        print("📊 Generating research summary...")
-        summary = self.generate_summary(request.query, evidence)
-        
-        if not self.is_ready():
-            print("LLM not ready, using fallback")
-            return self._create_fallback_hypothesis(request.query, evidence, summary)
-
-        # Set temperature based on creative mode
-        temperature = request.temperature if hasattr(request, 'temperature') else 0.0
-        if hasattr(self.llm, 'temperature'):
-            self.llm.temperature = temperature
-
-        # Prepare inputs for the prompt
+        kg_triples: List[KGTriple],
+        max_passages: int = 5
+    ) -> Dict:
+        """Prepare the JSON input shared by the hypothesis and combined prompts."""
         retrieved_passages = [
             {
                 "pmid": item.pmid,
@@ -151,7 +165,7 @@ class LLMAgent:
                 "snippet": item.snippet,
                 "score": item.score
             }
-            for item in evidence[:5]
+            for item in evidence[:max_passages]
         ]
 
         kg_results = [
@@ -164,21 +178,65 @@ class LLMAgent:
             for triple in kg_triples[:3]
         ]
 
+        return {
+            "USER_QUERY": request.query,
+            "RETRIEVED_PASSAGES": retrieved_passages,
+            "KG_RESULTS": kg_results,
+            "OPTIONAL_SEEDED_TEXT": getattr(request, "seeded_input", None)
+        }
+
+    def _parse_hypotheses(self, hypotheses_data: List[Dict]) -> List[Hypothesis]:
+        """Validate raw hypothesis dicts from the LLM, skipping invalid entries."""
+        hypotheses_list = []
+        for i, hyp_data in enumerate(hypotheses_data):
+            try:
+                if "suggested_experiment" not in hyp_data:
+                    hyp_data["suggested_experiment"] = {
+                        "model": "Not specified",
+                        "intervention": "Not specified", 
+                        "primary_outcome": "Not specified",
+                        "design_summary": "Not specified"
+                    }
+                
+                hypothesis = Hypothesis(**hyp_data)
+                hypotheses_list.append(hypothesis)
+            except Exception as e:
+                print(f"⚠️ Failed to parse hypothesis {i}: {e}")
+                continue
+        return hypotheses_list
+
+    def generate_hypothesis(
+        self,
+        request: QueryRequest,
+        evidence: List[EvidenceItem],
+        kg_triples: List[KGTriple],
+        include_summary: bool = True
+    ) -> HypothesisResponse:
+        """
+        Generate hypotheses using structured prompt.
+        With include_summary=False the summary is left to the caller (e.g. run
+        concurrently as its own stage) and the response carries summary=None.
+        """
+        summary = None
+        if include_summary:
+            print("📊 Generating research summary...")
+            summary = self.generate_summary(request.query, evidence, getattr(request, "temperature", 0.0))
+        
+        if not self.is_ready():
+            print("LLM not ready, using fallback")
+            return self._create_fallback_hypothesis(request.query, evidence, summary, include_summary)
+
+        temperature = request.temperature if hasattr(request, 'temperature') else 0.0
+
         # Create messages
         messages = [
             SystemMessage(content=HYPOTHESIS_SYSTEM_PROMPT),
-            HumanMessage(content=json.dumps({
-                "USER_QUERY": request.query,
-                "RETRIEVED_PASSAGES": retrieved_passages,
-                "KG_RESULTS": kg_results,
-                "OPTIONAL_SEEDED_TEXT": getattr(request, "seeded_input", None)
-            }, indent=2))
+            HumanMessage(content=json.dumps(self._build_prompt_input(request, evidence, kg_triples), indent=2))
         ]
 
         try:
             print("🔄 Calling LLM for hypotheses...")
-            response = self.llm.invoke(messages)
-            response_content = getattr(response, "content", str(response))
+            response_content, cache_key = self._invoke(messages, temperature)
             
             print(f"📄 Raw LLM response length: {len(response_content)}")
 
@@ -191,39 +249,75 @@ class LLMAgent:
             print("✅ Successfully parsed LLM response")
 
             # Validate and convert to HypothesisResponse
-            if "hypotheses" in parsed_response:
-                hypotheses_list = []
-                for i, hyp_data in enumerate(parsed_response["hypotheses"]):
-                    try:
-                        if "suggested_experiment" not in hyp_data:
-                            hyp_data["suggested_experiment"] = {
-                                "model": "Not specified",
-                                "intervention": "Not specified", 
-                                "primary_outcome": "Not specified",
-                                "design_summary": "Not specified"
-                            }
-                        
-                        hypothesis = Hypothesis(**hyp_data)
-                        hypotheses_list.append(hypothesis)
-                    except Exception as e:
-                        print(f"⚠️ Failed to parse hypothesis {i}: {e}")
-                        continue
-
+            hypotheses = self._parse_hypotheses(parsed_response.get("hypotheses") or [])
+            if hypotheses:
+                self._remember(cache_key, response_content)
                 return HypothesisResponse(
                     query=parsed_response.get("query", request.query),
                     summary=summary,
-                    hypotheses=hypotheses_list,
+                    hypotheses=hypotheses,
                     evidence=evidence,
                     kg_triples=kg_triples,
                     note=parsed_response.get("note", "Hypotheses generated successfully with research summary")
                 )
             else:
-                print("❌ No 'hypotheses' key in LLM response")
-                return self._create_fallback_hypothesis(request.query, evidence, summary)
+                print("❌ No valid hypotheses in LLM response")
+                return self._create_fallback_hypothesis(request.query, evidence, summary, include_summary)
 
         except json.JSONDecodeError as e:
             print(f"❌ JSON decode error: {e}")
-            return self._create_fallback_hypothesis(request.query, evidence, summary)
+            return self._create_fallback_hypothesis(request.query, evidence, summary, include_summary)
         except Exception as e:
             print(f"❌ Error in LLM generation: {e}")
-            return self._create_fallback_hypothesis(request.query, evidence, summary)
\ No newline at end of file
+            return self._create_fallback_hypothesis(request.query, evidence, summary, include_summary)
+
+    def generate_combined(
+        self,
+        request: QueryRequest,
+        evidence: List[EvidenceItem],
+        kg_triples: List[KGTriple]
+    ) -> HypothesisResponse:
+        """
+        Generate the research summary and the hypotheses with a single LLM call.
+        Falls back to the two-call path (summary + hypotheses) if the combined
+        response cannot be parsed or has no valid hypotheses; a missing or invalid summary alone is
+        regenerated with the summary generator.
+        """
+        if not self.is_ready() or not evidence:
+            return self.generate_hypothesis(request, evidence, kg_triples)
+
+        temperature = request.temperature if hasattr(request, 'temperature') else 0.0
+        messages = [
+            SystemMessage(content=COMBINED_SYSTEM_PROMPT),
+            HumanMessage(content=json.dumps(
+                self._build_prompt_input(request, evidence, kg_triples), indent=2
+            ))
+        ]
+
+        try:
+            print("🔄 Calling LLM for summary + hypotheses (single call)...")
+            response_content, cache_key = self._invoke(messages, temperature)
+            parsed_response = json.loads(self._clean_json_response(response_content))
+            # An answer whose hypotheses all fail validation is no answer
+            hypotheses = self._parse_hypotheses(parsed_response.get("hypotheses") or [])
+            if not hypotheses:
+                raise ValueError("No valid hypotheses in combined LLM response")
+            self._remember(cache_key, response_content)
+        except Exception as e:
+            print(f"⚠️ Combined generation failed ({e}); falling back to separate calls")
+            return self.generate_hypothesis(request, evidence, kg_triples)
+
+        try:
+            summary = SummarySection(**parsed_response["summary"])
+        except Exception as e:
+            print(f"⚠️ Combined response had no valid summary ({e}); generating it separately")
+            summary = self.generate_summary(request.query, evidence, temperature)
+
+        return HypothesisResponse(
+            query=parsed_response.get("query", request.query),
+            summary=summary,
+            hypotheses=hypotheses,
+            evidence=evidence,
+            kg_triples=kg_triples,
+            note=parsed_response.get("note", "Summary and hypotheses generated in a single call")
+        )
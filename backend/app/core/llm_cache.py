@@ -0,0 +1,209 @@
+# app/core/llm_cache.py
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.sqlite_conn import ThreadLocalSQLite
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() not in {"0", "false", "no"}
+
+
+class LLMResponseCache:
+    """
+    Persistent cache of raw LLM responses, shared by all uvicorn workers.
+     - keyed by sha256 of (model, temperature, serialized messages incl. system prompt)
+     - stored in SQLite (WAL mode), so concurrent workers can read and write safely
+     - entries expire after `ttl_seconds`; beyond `max_entries` the least recently used are evicted
+     - by default only temperature-0 calls are cached, since only those are deterministic
+    """
+
+    def __init__(
+        self,
+        path: Path = Path("llm_cache.sqlite3"),
+        max_entries: int = 10000,
+        ttl_seconds: float = 7 * 24 * 3600,
+        cache_all_temperatures: bool = False,
+    ):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.cache_all_temperatures = cache_all_temperatures
+        self._db = ThreadLocalSQLite(self.path)
+        self._init_db()
+
+    @classmethod
+    def from_env(cls) -> "LLMResponseCache":
+        return cls(
+            path=Path(os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite3")),
+            max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000")),
+            ttl_seconds=float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600))),
+            cache_all_temperatures=_env_flag("LLM_CACHE_ALL_TEMPERATURES", "0"),
+        )
+
+    # ---------------------------
+    # SQLite plumbing
+    # ---------------------------
+
+    def _conn(self) -> sqlite3.Connection:
+        return self._db.conn()
+
+    def close(self) -> None:
+        """Close every thread's connection (on shutdown)."""
+        self._db.close()
+
+    def _init_db(self) -> None:
+        if self.path.parent and not self.path.parent.exists():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)")
+        conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def _bump(self, name: str) -> None:
+        self._conn().execute(
+            "INSERT INTO counters(name, value) VALUES(?, 1) ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    # ---------------------------
+    # Public API
+    # ---------------------------
+
+    @staticmethod
+    def model_name(llm: Any) -> str:
+        return str(getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__)
+
+    @staticmethod
+    def make_key(model: str, temperature: float, messages: List[Any]) -> str:
+        serialized = [
+            {"role": getattr(m, "type", type(m).__name__), "content": getattr(m, "content", str(m))}
+            for m in messages
+        ]
+        payload = json.dumps(
+            {"model": model, "temperature": round(float(temperature), 4), "messages": serialized},
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def cacheable(self, temperature: float) -> bool:
+        return self.cache_all_temperatures or float(temperature) == 0.0
+
+    def lookup(self, llm: Any, messages: List[Any], temperature: float) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Return (key, cached response). key is None when the call is not cacheable;
+        the cached response is None on a miss.
+        """
+        if not self.cacheable(temperature):
+            return None, None
+        key = self.make_key(self.model_name(llm), temperature, messages)
+        try:
+            return key, self.get(key)
+        except sqlite3.Error as e:
+            logger.warning("LLM cache lookup failed: %s", e)
+            return key, None
+
+    def get(self, key: str) -> Optional[str]:
+        conn = self._conn()
+        now = time.time()
+        row = conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None or (self.ttl_seconds and now - row[1] > self.ttl_seconds):
+            self._bump("misses")
+            return None
+        conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+        self._bump("hits")
+        return row[0]
+
+    def put(self, key: str, response: str, model: Optional[str] = None) -> None:
+        conn = self._conn()
+        now = time.time()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses(key, model, response, created_at, last_access) VALUES(?, ?, ?, ?, ?)",
+                (key, model, response, now, now),
+            )
+            self.evict(now)
+        except sqlite3.Error as e:
+            logger.warning("LLM cache write failed: %s", e)
+
+    def evict(self, now: Optional[float] = None) -> int:
+        """Drop expired entries, then the least recently used beyond max_entries."""
+        conn = self._conn()
+        now = now or time.time()
+        removed = 0
+        if self.ttl_seconds:
+            removed += conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,)).rowcount
+        if self.max_entries:
+            removed += conn.execute(
+                """
+                DELETE FROM responses WHERE key IN (
+                    SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            ).rowcount
+        return removed
+
+    def purge(self) -> int:
+        """Remove every cached response (e.g. after prompt_template.py changes)."""
+        conn = self._conn()
+        removed = conn.execute("DELETE FROM responses").rowcount
+        conn.execute("DELETE FROM counters")
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._conn()
+        entries, size = conn.execute("SELECT count(*), coalesce(sum(length(response)), 0) FROM responses").fetchone()
+        counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+        hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+        return {
+            "path": str(self.path),
+            "entries": entries,
+            "response_bytes": size,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        }
+
+
+_cache: Optional[LLMResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """Process-wide cache instance, or None when disabled with LLM_CACHE_ENABLED=0."""
+    global _cache
+    if not _env_flag("LLM_CACHE_ENABLED", "1"):
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    _cache = LLMResponseCache.from_env()
+                except Exception as e:
+                    logger.warning("LLM cache disabled (failed to open): %s", e)
+                    return None
+    return _cache
@@ -39,6 +39,52 @@ Generate 1-3 high-quality hypotheses based on the provided evidence and knowledg
 Focus on novel, testable insights that connect the evidence meaningfully.
 """
 
+SUMMARY_SYSTEM_PROMPT = """You are a biomedical research analyst. Create a concise summary of research papers.
+
+Your task is to analyze the retrieved PubMed papers and provide a structured summary.
+
+Return a JSON object with this structure:
+{
+  "overview": "Brief 2-3 sentence overview of the main research theme",
+  "key_findings": [
+    "Finding 1 from the papers",
+    "Finding 2 from the papers", 
+    "Finding 3 from the papers"
+  ],
+  "knowledge_gaps": [
+    "Gap 1 identified in the literature",
+    "Gap 2 identified in the literature"
+  ],
+  "implications": "1-2 sentences about research implications"
+}
+
+Guidelines:
+- Focus on the most important findings across all papers
+- Identify genuine research gaps, not just general statements
+- Keep findings specific and evidence-based
+- Maximum 5 key findings and 3 knowledge gaps
+- Be concise but informative
+"""
+
+# Single-call prompt: summary + hypotheses in one JSON object (see LLMAgent.generate_combined)
+COMBINED_SYSTEM_PROMPT = """You perform two tasks on the same input in a single response.
+The input contains USER_QUERY, RETRIEVED_PASSAGES, KG_RESULTS and OPTIONAL_SEEDED_TEXT.
+
+=== TASK 1: RESEARCH SUMMARY ===
+""" + SUMMARY_SYSTEM_PROMPT + """
+=== TASK 2: HYPOTHESES ===
+""" + HYPOTHESIS_SYSTEM_PROMPT + """
+=== OUTPUT FORMAT ===
+Return ONE JSON object only, with the Task 2 structure plus a "summary" key holding the Task 1 object:
+
+{
+  "query": "original user query",
+  "summary": {"overview": "...", "key_findings": ["..."], "knowledge_gaps": ["..."], "implications": "..."},
+  "hypotheses": [ ... ],
+  "note": "Optional note about the generation"
+}
+"""
+
 # Alternative simpler prompt if you're still having issues:
 SIMPLE_HYPOTHESIS_PROMPT = """You are a biomedical research assistant. Generate ONE testable hypothesis in valid JSON format.
 
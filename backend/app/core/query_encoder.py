@@ -0,0 +1,158 @@
+"""
+query_encoder.py
+
+Query-time encoder backends for RAGPipeline:
+ - "torch": the HuggingFaceEmbeddings model as-is (eager PyTorch)
+ - "quantized": the same SentenceTransformer with its Linear layers dynamically
+   quantized to int8 (torch.quantization.quantize_dynamic)
+ - "onnx": a locally exported ONNX graph run with onnxruntime (mean pooling +
+   L2 normalization, as in all-MiniLM-L6-v2)
+Index builds keep encoding documents with the torch model; a candidate backend is
+only used if its query vectors match the torch ones within a tolerance.
+
+Export the ONNX model once (from backend/):
+    python -m app.core.query_encoder --output models/all-MiniLM-L6-v2-onnx
+"""
+
+import argparse
+import copy
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, List, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+QUERY_ENCODER_BACKENDS = ("torch", "quantized", "onnx")
+DEFAULT_ONNX_DIR = os.getenv("QUERY_ENCODER_ONNX_DIR", "models/all-MiniLM-L6-v2-onnx")
+# Minimum cosine similarity between a candidate backend's vectors and the torch ones
+DEFAULT_TOLERANCE = float(os.getenv("QUERY_ENCODER_MIN_COSINE", "0.99"))
+MAX_SEQ_LENGTH = 256
+
+CHECK_QUERIES = [
+    "APOE4 and amyloid beta clearance in Alzheimer's disease",
+    "NLRP3 inflammasome activation in microglia",
+    "tau hyperphosphorylation kinase inhibitors",
+    "gut microbiome and neurodegeneration",
+    "BRCA1 mutation breast cancer risk",
+    "metformin",
+]
+
+
+class SentenceTransformerEncoder:
+    """embed_query / embed_documents over a (possibly quantized) SentenceTransformer."""
+
+    def __init__(self, model: Any, batch_size: int = 64):
+        self.model = model
+        self.batch_size = batch_size
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        texts = [t.replace("\n", " ") for t in texts]
+        return self.model.encode(texts, batch_size=self.batch_size, show_progress_bar=False).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class OnnxEncoder:
+    """embed_query / embed_documents over an exported ONNX graph with onnxruntime."""
+
+    def __init__(self, model_dir: Path, batch_size: int = 64, threads: int = int(os.getenv("ONNX_THREADS", "0"))):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_dir = Path(model_dir)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(str(model_dir / "model.onnx"), options, providers=["CPUExecutionProvider"])
+        self.tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.batch_size = batch_size
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        tokens = self.tokenizer(texts, padding=True, truncation=True, max_length=MAX_SEQ_LENGTH, return_tensors="np")
+        feeds = {name: tokens[name].astype(np.int64) for name in ("input_ids", "attention_mask", "token_type_ids") if name in self.input_names}
+        hidden = self.session.run(None, feeds)[0]
+        mask = tokens["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        return pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        texts = [t.replace("\n", " ") for t in texts]
+        vectors = [self._encode(texts[i:i + self.batch_size]) for i in range(0, len(texts), self.batch_size)]
+        return np.concatenate(vectors).tolist() if vectors else []
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def build_query_encoder(backend: str, embeddings: Any, onnx_dir: Path = Path(DEFAULT_ONNX_DIR), batch_size: int = 64):
+    """Create the encoder for `backend`; "torch" returns the embeddings object itself."""
+    if backend not in QUERY_ENCODER_BACKENDS:
+        raise ValueError(f"Unknown query encoder {backend!r}; expected one of {QUERY_ENCODER_BACKENDS}")
+    if backend == "torch":
+        return embeddings
+    if backend == "quantized":
+        import torch
+
+        model = copy.deepcopy(embeddings.client).to("cpu")
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return SentenceTransformerEncoder(model, batch_size=batch_size)
+    return OnnxEncoder(onnx_dir, batch_size=batch_size)
+
+
+def check_tolerance(reference: Any, candidate: Any, queries: Sequence[str] = CHECK_QUERIES, min_cosine: float = DEFAULT_TOLERANCE) -> float:
+    """Return the worst cosine similarity between the two encoders' vectors; raise if below min_cosine."""
+    ref = np.asarray(reference.embed_documents(list(queries)), dtype=np.float32)
+    cand = np.asarray(candidate.embed_documents(list(queries)), dtype=np.float32)
+    if ref.shape != cand.shape:
+        raise ValueError(f"Encoder output shape {cand.shape} does not match reference {ref.shape}")
+    ref /= np.linalg.norm(ref, axis=1, keepdims=True)
+    cand /= np.linalg.norm(cand, axis=1, keepdims=True)
+    worst = float((ref * cand).sum(axis=1).min())
+    if worst < min_cosine:
+        raise ValueError(f"Encoder outputs differ from the reference (min cosine {worst:.4f} < {min_cosine})")
+    return worst
+
+
+def export_onnx(model_name: str, output: Path) -> Path:
+    """Export the transformer part of a sentence-transformers model to output/model.onnx (+ tokenizer)."""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    output = Path(output)
+    output.mkdir(parents=True, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+    axes = {n: {0: "batch", 1: "sequence"} for n in names}
+    axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[n] for n in names),
+            str(output / "model.onnx"),
+            input_names=names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=axes,
+            opset_version=14,
+        )
+    tokenizer.save_pretrained(str(output))
+    return output
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the query encoder to ONNX")
+    parser.add_argument("--model", default="sentence-transformers/all-MiniLM-L6-v2")
+    parser.add_argument("--output", default=DEFAULT_ONNX_DIR)
+    args = parser.parse_args()
+    start = time.perf_counter()
+    path = export_onnx(args.model, Path(args.output))
+    print(f"Exported {args.model} to {path} in {time.perf_counter() - start:.1f}s")
@@ -1,165 +1,1346 @@
+import hashlib
 import logging
+import math
+import os
+import re
 import shutil
+import threading
+import time
+import uuid
 from pathlib import Path
-from typing import List
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
-from langchain.docstore.document import Document
 from langchain.embeddings import HuggingFaceEmbeddings
-from langchain.vectorstores import Chroma
+
+from app.core.doc_store import DocumentStore
+from app.core.flat_store import FlatVectorStore, is_flat_store
+from app.core.lru import LRUCache
+from app.core.query_encoder import QUERY_ENCODER_BACKENDS, build_query_encoder, check_tolerance
+from app.core.reranker import CrossEncoderReranker
+from app.core.sharded_store import ShardedVectorStore, is_sharded_store, shard_of
+from app.core.embedding_pool import EmbeddingPool, default_encode_batch_size, default_encode_workers
+from app.core.sparse_index import SparseIndexBuilder, SparseIndexStore, reciprocal_rank_fusion, tokenize
 
 # Configure logger for the module
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# CSV rows read, embedded and written per chunk
+INDEX_BATCH_SIZE = int(os.getenv("INDEX_BATCH_SIZE", "1000"))
+
+REQUIRED_COLUMNS = ["PMID", "Title", "Abstract"]
+
+# (pmid, title, abstract, content_hash) as streamed from the CSV
+Row = Tuple[str, str, str, str]
+
+# Full builds go to chroma_dir/versions/<version>; this file names the live one
+VERSIONS_DIR = "versions"
+CURRENT_POINTER = "CURRENT"
+# Index versions (vector and BM25) kept on disk, the live one included. Other uvicorn
+# workers switch on their next request, so the older ones only serve in-flight requests.
+INDEX_KEEP_VERSIONS = max(2, int(os.getenv("INDEX_KEEP_VERSIONS", "3")))
+
+
+def _pointer_stamp(pointer: Path) -> Optional[Tuple[int, int]]:
+    """(inode, mtime) of a CURRENT pointer; it is replaced by rename, so any publish changes it."""
+    try:
+        st = pointer.stat()
+    except OSError:
+        return None
+    return st.st_ino, st.st_mtime_ns
+
+# "document": one vector per abstract; "sentence": overlapping sentence windows per abstract
+CHUNKING_MODES = ("document", "sentence")
+AGGREGATIONS = ("max", "sum")
+SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9(\[])")
+# Starting over-fetch factor (raw hits per wanted PMID) in sentence mode, where several passages share a PMID
+CHUNK_OVERFETCH = float(os.getenv("CHUNK_OVERFETCH", "4"))
+# Dense over-fetch: the factor follows the observed hits-per-unique-PMID ratio (EMA), and a
+# query is re-issued with twice the hits until k unique PMIDs are found or the cap is reached
+RETRIEVAL_MAX_FETCH = int(os.getenv("RETRIEVAL_MAX_FETCH", "200"))
+MAX_OVERFETCH_FACTOR = 10.0
+OVERFETCH_MARGIN = 1.1
+OVERFETCH_EMA = 0.2
+# MMR: unique candidates per requested result, and relevance/diversity trade-off (1.0 = relevance only)
+MMR_CANDIDATES = int(os.getenv("MMR_CANDIDATES", "3"))
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+# Weight of a seed PMID's stored vector when blended with the query embedding
+SEED_WEIGHT = float(os.getenv("SEED_WEIGHT", "0.5"))
+SNIPPET_CHARS = 300
+PASSAGE_SNIPPET_CHARS = 600
+
+# "chroma": LangChain Chroma (HNSW); "mmap": FlatVectorStore (quantized, memory-mapped, exact search)
+VECTOR_BACKENDS = ("chroma", "mmap")
+# Chroma HNSW settings, fixed when a collection is created (i.e. by a full rebuild).
+# Defaults are Chroma's own; app/core/bench_hnsw.py measures recall/latency per setting.
+HNSW_SPACES = ("l2", "cosine", "ip")
+HNSW_SPACE = os.getenv("HNSW_SPACE", "l2")
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_CONSTRUCTION_EF = int(os.getenv("HNSW_CONSTRUCTION_EF", "100"))
+HNSW_SEARCH_EF = int(os.getenv("HNSW_SEARCH_EF", "10"))
+
+RETRIEVAL_MODES = ("dense", "sparse", "hybrid")
+RRF_K = 60
+# In hybrid mode a BM25 top hit scoring this many times the k-th hit (an exact
+# gene/drug symbol match, typically) only needs k dense candidates instead of 2k
+STRONG_SPARSE_RATIO = float(os.getenv("STRONG_SPARSE_RATIO", "2.0"))
+# RRF weight of each KG expansion sub-query's ranking (the original query counts 1.0)
+KG_EXPANSION_WEIGHT = float(os.getenv("KG_EXPANSION_WEIGHT", "0.5"))
+
+ProgressCallback = Callable[[int, int], None]
+CancelCheck = Callable[[], bool]
+
+
+class BuildCancelled(Exception):
+    """Raised inside build_index when the caller asked to stop."""
+
 
 class RAGPipeline:
     """
     Responsible for:
-     - initializing embeddings & loading a persisted Chroma vector store (if present)
-     - building the vector index from a PubMed CSV
-     - retrieving top-k results for a query
+     - initializing embeddings & loading a persisted vector store (if present): Chroma,
+       or a memory-mapped quantized flat store (backend="mmap"), optionally split
+       into N shards by PMID hash that are searched in parallel
+     - building the vector index from a PubMed CSV into a fresh versioned directory
+       and atomically swapping the live store once it is complete
+     - keeping title/abstract once, in a PMID-keyed DocumentStore next to the
+       vectors (which only carry id, PMID and content hash); text is loaded for
+       the returned results only
+     - optionally indexing sentence-window passages and aggregating them per PMID at query time
+     - building a BM25 index from the same rows (persisted next to chroma_dir)
+     - retrieving top-k results for a query (dense, sparse or hybrid via reciprocal rank fusion),
+       optionally fused with KG expansion sub-queries searched in one batch
+     - optionally re-ranking candidates with a cross-encoder
+     - caching query embeddings and (query, k, index version) results for hot queries
     """
 
     def __init__(
         self,
         chroma_dir: Path = Path("chroma_db"),
         model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+        query_cache_size: int = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024")),
+        result_cache_size: int = int(os.getenv("RETRIEVAL_CACHE_SIZE", "256")),
+        encode_batch_size: Optional[int] = None,
+        encode_workers: Optional[int] = None,
+        chunking: str = os.getenv("INDEX_CHUNKING", "document"),
+        chunk_sentences: int = int(os.getenv("CHUNK_SENTENCES", "3")),
+        chunk_stride: int = int(os.getenv("CHUNK_STRIDE", "2")),
+        aggregation: str = os.getenv("CHUNK_AGGREGATION", "max"),
+        backend: str = os.getenv("VECTOR_BACKEND", "chroma"),
+        mmap_quantization: str = os.getenv("MMAP_QUANTIZATION", "int8"),
+        mmap_rescore: bool = os.getenv("MMAP_RESCORE", "1").lower() not in {"0", "false", "no"},
+        query_encoder: str = os.getenv("QUERY_ENCODER", "torch"),
+        hnsw_space: str = HNSW_SPACE,
+        hnsw_m: int = HNSW_M,
+        hnsw_construction_ef: int = HNSW_CONSTRUCTION_EF,
+        hnsw_search_ef: int = HNSW_SEARCH_EF,
+        num_shards: int = int(os.getenv("INDEX_SHARDS", "1")),
+        share_models_with: Optional["RAGPipeline"] = None,
     ):
+        if backend not in VECTOR_BACKENDS:
+            raise ValueError(f"Unknown vector backend {backend!r}; expected one of {VECTOR_BACKENDS}")
+        if query_encoder not in QUERY_ENCODER_BACKENDS:
+            raise ValueError(f"Unknown query encoder {query_encoder!r}; expected one of {QUERY_ENCODER_BACKENDS}")
+        if chunking not in CHUNKING_MODES:
+            raise ValueError(f"Unknown chunking {chunking!r}; expected one of {CHUNKING_MODES}")
+        if aggregation not in AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation {aggregation!r}; expected one of {AGGREGATIONS}")
+        if hnsw_space not in HNSW_SPACES:
+            raise ValueError(f"Unknown HNSW space {hnsw_space!r}; expected one of {HNSW_SPACES}")
         self.chroma_dir = Path(chroma_dir)
         self.model_name = model_name
+        self.backend = backend
+        # mmap backend: int8 or float16 matrix, and whether candidates are re-scored with the float32 vectors
+        self.mmap_quantization = mmap_quantization
+        self.mmap_rescore = mmap_rescore
+        # chroma backend: HNSW graph settings for newly created collections
+        self.hnsw_space = hnsw_space
+        self.hnsw_m = hnsw_m
+        self.hnsw_construction_ef = hnsw_construction_ef
+        self.hnsw_search_ef = hnsw_search_ef
+        # Shards for newly built indexes; an existing index keeps the layout it was built with
+        self.num_shards = max(1, num_shards)
+        # Index-time passage layout and how passage scores roll up into one score per PMID
+        self.chunking = chunking
+        self.chunk_sentences = max(1, chunk_sentences)
+        self.chunk_stride = max(1, min(chunk_stride, self.chunk_sentences))
+        self.aggregation = aggregation
+        # Learned raw-hits-per-unique-PMID ratio used to size dense queries
+        self.overfetch_factor = CHUNK_OVERFETCH if chunking == "sentence" else 1.0
+        # Index-build encoding: sentence-transformers batch size and number of encode processes
+        self.encode_batch_size = encode_batch_size or default_encode_batch_size()
+        self.encode_workers = default_encode_workers() if encode_workers is None else encode_workers
         self.embeddings = None
+        # Query-time encoder: the torch embeddings, or an ONNX / int8-quantized copy that passed the tolerance check
+        self.query_encoder_backend = query_encoder
+        self.query_encoder = None
         self.vectorstore = None
-        self._initialize_embeddings_and_store()
+        # Title/abstract per PMID for the live index (None for indexes built before it existed)
+        self.doc_store: Optional[DocumentStore] = None
+        # Bumped whenever a (re)built index is loaded; caches keyed on it go stale automatically
+        self.index_version = 0
+        # Same model, same vectors: corpora sharing models share the query-embedding cache too
+        self.query_embedding_cache = (
+            share_models_with.query_embedding_cache if share_models_with is not None else LRUCache(query_cache_size)
+        )
+        self.result_cache = LRUCache(result_cache_size)
+        # (pmid, index_version) -> stored unit vector, for seed-PMID queries
+        self.seed_vector_cache = LRUCache(256)
+        self.last_build_stats: Dict[str, Any] = {}
+        # Directory of the live store, and the one it replaced (kept until the next build)
+        self.active_dir: Optional[Path] = None
+        self._previous_dir: Optional[Path] = None
+        self._build_lock = threading.Lock()
+        self._reranker: Optional[CrossEncoderReranker] = None
+        self._reranker_lock = threading.Lock()
+        # CURRENT pointers as last loaded, to pick up builds published by other worker processes
+        self._reload_lock = threading.Lock()
+        self._vector_stamp: Optional[Tuple[int, int]] = None
+        self.sparse_store = SparseIndexStore(self.chroma_dir.parent / f"{self.chroma_dir.name}_bm25")
+        self._sparse_stamp = _pointer_stamp(self.sparse_store.root / CURRENT_POINTER)
+        self.sparse_index = self.sparse_store.load()
+        self._initialize_embeddings_and_store(share_models_with)
 
-    def _initialize_embeddings_and_store(self) -> None:
-        """Create embedding model and load persisted Chroma store if available."""
+    def _initialize_embeddings_and_store(self, share_models_with: Optional["RAGPipeline"] = None) -> None:
+        """
+        Create embedding model (or reuse another pipeline's, for additional corpora)
+        and load the persisted vector store if available.
+        """
         try:
-            logger.info("Initializing embeddings model: %s", self.model_name)
-            self.embeddings = HuggingFaceEmbeddings(model_name=self.model_name)
-
-            if self.chroma_dir.exists() and any(self.chroma_dir.iterdir()):
-                logger.info("Found existing Chroma directory: %s. Loading.", self.chroma_dir)
-                self.vectorstore = Chroma(
-                    persist_directory=str(self.chroma_dir),
-                    embedding_function=self.embeddings,
+            if share_models_with is not None and share_models_with.embeddings is not None:
+                self.embeddings = share_models_with.embeddings
+                self.query_encoder = share_models_with.query_encoder
+                self.query_encoder_backend = share_models_with.query_encoder_backend
+            else:
+                logger.info("Initializing embeddings model: %s", self.model_name)
+                self.embeddings = HuggingFaceEmbeddings(
+                    model_name=self.model_name,
+                    encode_kwargs={"batch_size": self.encode_batch_size},
                 )
+                self.query_encoder = self._load_query_encoder()
+
+            self._vector_stamp = _pointer_stamp(self.chroma_dir / CURRENT_POINTER)
+            active_dir = self._resolve_active_dir()
+            if active_dir is not None:
+                logger.info("Found existing %s index directory: %s. Loading.", self.backend, active_dir)
+                self.vectorstore = self._open_store(active_dir)
+                self.doc_store = DocumentStore.open(active_dir) if DocumentStore.exists(active_dir) else None
+                self.active_dir = active_dir
+                self.index_version += 1
+                if self.shard_count() != self.num_shards:
+                    logger.info(
+                        "Index has %d shard(s); INDEX_SHARDS=%d applies from the next full rebuild.",
+                        self.shard_count(), self.num_shards,
+                    )
                 logger.info("Vector store loaded successfully.")
             else:
-                logger.info("No existing Chroma store found at: %s", self.chroma_dir)
+                logger.info("No existing vector store found at: %s", self.chroma_dir)
         except Exception as e:
             logger.exception("Error initializing embeddings/vectorstore: %s", e)
             self.vectorstore = None
 
+    def _load_query_encoder(self):
+        """Build the configured query encoder; fall back to torch if it fails to load or drifts from it."""
+        if self.query_encoder_backend == "torch":
+            return self.embeddings
+        try:
+            encoder = build_query_encoder(self.query_encoder_backend, self.embeddings, batch_size=self.encode_batch_size)
+            worst = check_tolerance(self.embeddings, encoder)
+            logger.info("Using %s query encoder (min cosine to torch: %.4f)", self.query_encoder_backend, worst)
+            return encoder
+        except Exception as e:
+            logger.error("Could not use %s query encoder, falling back to torch: %s", self.query_encoder_backend, e)
+            self.query_encoder_backend = "torch"
+            return self.embeddings
+
+    def _resolve_active_dir(self) -> Optional[Path]:
+        """Locate the live store: the version named in CURRENT, else a legacy store in chroma_dir itself."""
+        pointer = self.chroma_dir / CURRENT_POINTER
+        if pointer.exists():
+            version_dir = self.chroma_dir / VERSIONS_DIR / pointer.read_text().strip()
+            if version_dir.exists():
+                return version_dir
+            logger.warning("%s points to missing version %s", pointer, version_dir)
+        if self.chroma_dir.exists() and any(
+            p.name not in {VERSIONS_DIR, CURRENT_POINTER} for p in self.chroma_dir.iterdir()
+        ):
+            return self.chroma_dir
+        return None
+
+    def _open_store(self, directory: Path):
+        """Open the store in directory: sharded if it has a shard manifest, or if it is new and num_shards > 1."""
+        directory = Path(directory)
+        is_new = not directory.exists() or not any(directory.iterdir())
+        if is_sharded_store(directory) or (is_new and self.num_shards > 1):
+            return ShardedVectorStore(directory, self._open_single_store, self._collection, self.num_shards)
+        return self._open_single_store(directory)
+
+    def _open_single_store(self, directory: Path):
+        flat = is_flat_store(directory)
+        if self.backend == "mmap":
+            if not flat and directory.exists() and any(directory.iterdir()):
+                raise ValueError(f"{directory} holds a Chroma index; rebuild the index to use VECTOR_BACKEND=mmap")
+            return FlatVectorStore(directory, quantization=self.mmap_quantization, rescore=self.mmap_rescore)
+        if flat:
+            raise ValueError(f"{directory} holds an mmap index; rebuild the index to use VECTOR_BACKEND=chroma")
+        # Imported here so the mmap backend never loads chromadb
+        from langchain.vectorstores import Chroma
+
+        return Chroma(
+            persist_directory=str(directory),
+            embedding_function=self.embeddings,
+            collection_metadata=self.hnsw_metadata(),
+        )
+
+    def hnsw_metadata(self) -> Dict[str, Any]:
+        """Chroma collection metadata carrying the configured HNSW settings."""
+        return {
+            "hnsw:space": self.hnsw_space,
+            "hnsw:M": self.hnsw_m,
+            "hnsw:construction_ef": self.hnsw_construction_ef,
+            "hnsw:search_ef": self.hnsw_search_ef,
+        }
+
+    def index_params(self) -> Dict[str, Any]:
+        """
+        Settings of the live index. Chroma keeps the HNSW metadata the collection was
+        created with, so after changing HNSW_* the configured and live values differ
+        until the next full rebuild.
+        """
+        if self.backend == "mmap":
+            return {
+                "backend": "mmap",
+                "quantization": self.mmap_quantization,
+                "rescore": self.mmap_rescore,
+                "shards": self.shard_count(),
+            }
+        live = None
+        if self.vectorstore is not None:
+            metadata = getattr(self._collection(), "metadata", None) or {}
+            live = {key.split(":", 1)[1]: value for key, value in metadata.items() if key.startswith("hnsw:")}
+        configured = {key.split(":", 1)[1]: value for key, value in self.hnsw_metadata().items()}
+        return {"backend": "chroma", "configured": configured, "live": live, "shards": self.shard_count()}
+
+    def is_sharded(self) -> bool:
+        return isinstance(self.vectorstore, ShardedVectorStore)
+
+    def shard_count(self) -> int:
+        """Shards of the live index (1 when it is not sharded)."""
+        store = self.vectorstore
+        return store.num_shards if isinstance(store, ShardedVectorStore) else 1
+
+    def _collection(self, vectorstore=None):
+        """Chroma's collection, or the flat/sharded store itself (they implement the same calls)."""
+        vectorstore = vectorstore if vectorstore is not None else self.vectorstore
+        if isinstance(vectorstore, (FlatVectorStore, ShardedVectorStore)):
+            return vectorstore
+        return vectorstore._collection
+
+    def _relevance_fn(self):
+        """Distance -> relevance conversion, as in LangChain's similarity_search_with_relevance_scores."""
+        store = self.vectorstore
+        if isinstance(store, ShardedVectorStore):
+            # All shards share the backend and distance
+            store = store.stores[0]
+        if isinstance(store, FlatVectorStore):
+            return store.relevance_score_fn
+        return store._select_relevance_score_fn()
+
+    def _write_pointer(self, version: str) -> None:
+        """Point CURRENT at a version (atomic rename); other workers reload on their next request."""
+        pointer = self.chroma_dir / CURRENT_POINTER
+        pointer_tmp = self.chroma_dir / f"{CURRENT_POINTER}.tmp"
+        pointer_tmp.write_text(version)
+        os.replace(pointer_tmp, pointer)
+        self._vector_stamp = _pointer_stamp(pointer)
+
+    def _announce_update(self) -> None:
+        """
+        Rewrite CURRENT after an in-place (incremental or shard) build, so other
+        workers reopen the live version. Legacy indexes without CURRENT are only
+        picked up by other workers on restart.
+        """
+        if self.active_dir is not None and self.active_dir.parent == self.chroma_dir / VERSIONS_DIR:
+            self._write_pointer(self.active_dir.name)
+
+    def _check_current(self) -> None:
+        """
+        Follow builds published by other worker processes: when a CURRENT pointer
+        (vector index or BM25) changed since this process loaded it, reopen that
+        index. Costs one stat per pointer.
+        """
+        vector_pointer = self.chroma_dir / CURRENT_POINTER
+        sparse_pointer = self.sparse_store.root / CURRENT_POINTER
+        if _pointer_stamp(vector_pointer) == self._vector_stamp and _pointer_stamp(sparse_pointer) == self._sparse_stamp:
+            return
+        with self._reload_lock:
+            vector_stamp = _pointer_stamp(vector_pointer)
+            if vector_stamp != self._vector_stamp:
+                active_dir = self._resolve_active_dir()
+                if active_dir is not None:
+                    try:
+                        vectorstore = self._open_store(active_dir)
+                        doc_store = DocumentStore.open(active_dir) if DocumentStore.exists(active_dir) else None
+                    except Exception as e:
+                        # Keep serving the loaded version; retried on the next request
+                        logger.warning("Could not reload index version %s: %s", active_dir, e)
+                        return
+                    self._previous_dir = self.active_dir
+                    self.vectorstore, self.doc_store, self.active_dir = vectorstore, doc_store, active_dir
+                    self.index_version += 1
+                    logger.info("Reloaded index version %s (published by another worker)", active_dir.name)
+                self._vector_stamp = vector_stamp
+            sparse_stamp = _pointer_stamp(sparse_pointer)
+            if sparse_stamp != self._sparse_stamp:
+                sparse_index = self.sparse_store.load()
+                if sparse_index is not None:
+                    self.sparse_index = sparse_index
+                    self.index_version += 1
+                self._sparse_stamp = sparse_stamp
+
+    def _swap_to(self, version: str, version_dir: Path, vectorstore, doc_store: DocumentStore) -> None:
+        """Point CURRENT at the new version and replace the live store."""
+        self._write_pointer(version)
+        self._previous_dir = self.active_dir
+        # Single reference assignment: in-flight queries finish on the old store
+        self.vectorstore = vectorstore
+        self.doc_store = doc_store
+        self.active_dir = version_dir
+        self.index_version += 1
+        logger.info("Swapped live vector store to version %s", version)
+
+    def _cleanup_old_versions(self) -> None:
+        """
+        Remove all but the INDEX_KEEP_VERSIONS newest versions (and never the live
+        one or the one it replaced): other workers may still be finishing requests
+        on a version this process already left.
+        """
+        versions_root = self.chroma_dir / VERSIONS_DIR
+        # Version names start with their build time, so they sort oldest to newest
+        versions = sorted((d for d in versions_root.iterdir() if d.is_dir()), key=lambda d: d.name) if versions_root.exists() else []
+        keep = {d.resolve() for d in versions[-INDEX_KEEP_VERSIONS:]}
+        keep |= {d.resolve() for d in (self.active_dir, self._previous_dir) if d is not None}
+        for version_dir in versions:
+            if version_dir.resolve() not in keep:
+                logger.info("Removing old index version: %s", version_dir)
+                shutil.rmtree(version_dir, ignore_errors=True)
+        # Legacy store written directly into chroma_dir, older than any version
+        if self.chroma_dir.resolve() not in keep and len(versions) >= INDEX_KEEP_VERSIONS:
+            for item in self.chroma_dir.iterdir():
+                if item.name in {VERSIONS_DIR, CURRENT_POINTER}:
+                    continue
+                if item.is_dir():
+                    shutil.rmtree(item, ignore_errors=True)
+                else:
+                    item.unlink(missing_ok=True)
+
     def is_ready(self) -> bool:
-        """Return True if vectorstore is available."""
+        """Return True if vectorstore is available (reloading it first if another worker published a build)."""
+        self._check_current()
         return self.vectorstore is not None
 
-    def build_index(self, csv_path: Path) -> bool:
+    def is_building(self) -> bool:
+        return self._build_lock.locked()
+
+    def close(self) -> None:
+        """Release the SQLite connections of the document store and flat/sharded vector store."""
+        for resource in (self.doc_store, self.vectorstore):
+            if resource is not None and hasattr(resource, "close"):
+                resource.close()
+
+    def index_bytes(self) -> int:
+        """On-disk size of the live vector index, document store and BM25 index (used as a memory estimate)."""
+        total = 0
+        for directory in (self.active_dir, self.sparse_index.path if self.sparse_index is not None else None):
+            if directory is not None and directory.exists():
+                total += sum(p.stat().st_size for p in directory.rglob("*") if p.is_file())
+        return total
+
+    @staticmethod
+    def _normalize_query(query: str) -> str:
+        return " ".join((query or "").split())
+
+    def embed_query(self, query: str) -> List[float]:
+        """Encode a query with the pipeline's embedding model (LRU-cached by normalized text)."""
+        key = self._normalize_query(query)
+        vector = self.query_embedding_cache.get(key)
+        if vector is None:
+            vector = self.query_encoder.embed_query(key)
+            self.query_embedding_cache.put(key, vector)
+        return vector
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Encode many queries; the ones not in the embedding cache go through one batched encode call."""
+        keys = [self._normalize_query(q) for q in queries]
+        vectors: Dict[str, List[float]] = {}
+        missing: List[str] = []
+        for key in dict.fromkeys(keys):
+            vector = self.query_embedding_cache.get(key)
+            if vector is None:
+                missing.append(key)
+            else:
+                vectors[key] = vector
+        if missing:
+            # embed_documents and embed_query produce the same vectors for this (instruction-free) model
+            for key, vector in zip(missing, self.query_encoder.embed_documents(missing)):
+                vector = list(vector)
+                self.query_embedding_cache.put(key, vector)
+                vectors[key] = vector
+        return [vectors[key] for key in keys]
+
+    def reranker(self) -> CrossEncoderReranker:
+        """Cross-encoder for the optional re-rank stage (created on first use)."""
+        if self._reranker is None:
+            with self._reranker_lock:
+                if self._reranker is None:
+                    self._reranker = CrossEncoderReranker()
+        return self._reranker
+
+    def rerank(self, query: str, items: List[Dict[str, Any]], k: int) -> List[Dict[str, Any]]:
+        """Re-score retrieve() results with the cross-encoder and keep the top k."""
+        return self.reranker().rerank(self._normalize_query(query), items, k)
+
+    def cache_stats(self) -> dict:
+        return {
+            "query_embeddings": self.query_embedding_cache.stats(),
+            "results": self.result_cache.stats(),
+            "overfetch_factor": round(self.overfetch_factor, 3),
+            "reranker": self._reranker.stats() if self._reranker is not None else None,
+            "index_version": self.index_version,
+        }
+
+    def _content_hash(self, title: str, abstract: str) -> str:
+        # The passage layout is part of the hash, so changing it re-embeds every PMID on the next incremental build
+        layout = "" if self.chunking == "document" else f"\x00{self.chunking}:{self.chunk_sentences}:{self.chunk_stride}"
+        return hashlib.sha1(f"{title}\x00{abstract}{layout}".encode("utf-8")).hexdigest()
+
+    def _passages(self, abstract: str) -> List[str]:
+        """Split an abstract into overlapping windows of chunk_sentences sentences."""
+        sentences = [s.strip() for s in SENTENCE_SPLIT_RE.split(abstract) if s.strip()]
+        if len(sentences) <= self.chunk_sentences:
+            return [" ".join(sentences)] if sentences else [""]
+        passages = []
+        for start in range(0, len(sentences), self.chunk_stride):
+            passages.append(" ".join(sentences[start:start + self.chunk_sentences]))
+            if start + self.chunk_sentences >= len(sentences):
+                break
+        return passages
+
+    def _make_documents(self, pmid: str, title: str, abstract: str, content_hash: str) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """
+        Return [(id, text to embed, metadata)] for one PMID: the whole abstract, or
+        one entry per passage. Text is embedded but not stored in the vector index;
+        passages are re-derived from the DocumentStore abstract via their chunk number.
+        """
+        if self.chunking == "document":
+            text = f"Title: {title}\n\nAbstract: {abstract}"
+            return [(pmid, text, {"pmid": pmid, "content_hash": content_hash})]
+
+        documents = []
+        for i, passage in enumerate(self._passages(abstract)):
+            # The title gives every passage vector the paper's topic
+            text = f"Title: {title}\n\n{passage}"
+            documents.append((f"{pmid}#{i}", text, {"pmid": pmid, "chunk": i, "content_hash": content_hash}))
+        return documents
+
+    def _check_columns(self, csv_path: Path) -> bool:
+        header = pd.read_csv(csv_path, nrows=0)
+        if not all(col in header.columns for col in REQUIRED_COLUMNS):
+            logger.error("CSV missing required columns. Required: %s", REQUIRED_COLUMNS)
+            return False
+        return True
+
+    def _iter_row_chunks(self, csv_path: Path) -> Iterator[List[Row]]:
+        """
+        Stream the CSV in chunks of INDEX_BATCH_SIZE rows, yielding
+        [(pmid, title, abstract, content_hash), ...] per chunk. Only one chunk
+        is held in memory; duplicate PMIDs within a chunk keep the last row.
+        """
+        reader = pd.read_csv(
+            csv_path,
+            usecols=REQUIRED_COLUMNS,
+            dtype=str,
+            keep_default_na=False,
+            chunksize=INDEX_BATCH_SIZE,
+        )
+        for chunk in reader:
+            rows: Dict[str, Row] = {}
+            for pmid, title, abstract in zip(chunk["PMID"], chunk["Title"], chunk["Abstract"]):
+                pmid = str(pmid).strip()
+                if not pmid or pmid.lower() in {"nan", "none", ""}:
+                    continue
+                title = str(title).strip()
+                abstract = str(abstract).strip()
+                rows[pmid] = (pmid, title, abstract, self._content_hash(title, abstract))
+            if rows:
+                yield list(rows.values())
+
+    def _count_rows(self, csv_path: Path) -> int:
+        """Number of rows with a PMID, read one column at a time (used for progress/ETA)."""
+        total = 0
+        for chunk in pd.read_csv(csv_path, usecols=["PMID"], dtype=str, keep_default_na=False, chunksize=50000):
+            total += int((chunk["PMID"].str.strip() != "").sum())
+        return total
+
+    def _indexed_hashes(self, collection=None) -> Dict[str, Dict[str, Any]]:
+        """Return {pmid: {"ids": [...], "hash": content_hash or None}} for the live collection (or one shard's)."""
+        collection = collection if collection is not None else self._collection()
+        indexed: Dict[str, Dict[str, Any]] = {}
+        offset = 0
+        while True:
+            page = collection.get(include=["metadatas"], limit=INDEX_BATCH_SIZE, offset=offset)
+            ids = page.get("ids") or []
+            if not ids:
+                break
+            for doc_id, meta in zip(ids, page.get("metadatas") or []):
+                meta = meta or {}
+                pmid = str(meta.get("pmid", "")).strip()
+                entry = indexed.setdefault(pmid, {"ids": [], "hash": meta.get("content_hash")})
+                entry["ids"].append(doc_id)
+                if entry["hash"] != meta.get("content_hash"):
+                    entry["hash"] = None
+            offset += len(ids)
+        return indexed
+
+    def _write_rows(
+        self,
+        collection,
+        doc_store: DocumentStore,
+        encoder: EmbeddingPool,
+        rows: List[Row],
+        stale_ids: Optional[List[str]] = None,
+    ) -> None:
+        """
+        Encode one chunk of rows and upsert it, using the PMID (or "<pmid>#<n>"
+        per passage) as document id; title/abstract go to the document store. Old ids being replaced (stale_ids) that the
+        upsert does not overwrite are deleted in the same step, so a cancelled
+        build leaves every PMID at either its old or its new version.
         """
-        Build a Chroma index from a CSV file.
+        if not rows:
+            return
+        ids, texts, metadatas = [], [], []
+        for pmid, title, abstract, content_hash in rows:
+            for doc_id, text, metadata in self._make_documents(pmid, title, abstract, content_hash):
+                ids.append(doc_id)
+                texts.append(text)
+                metadatas.append(metadata)
+        vectors = encoder.encode(texts)
+        new_ids = set(ids)
+        stale_ids = [doc_id for doc_id in stale_ids or [] if doc_id not in new_ids]
+        if stale_ids:
+            collection.delete(ids=stale_ids)
+        doc_store.upsert(rows)
+        collection.upsert(ids=ids, embeddings=vectors, metadatas=metadatas)
+
+    def _document_ids(self, row: Row) -> List[str]:
+        return [doc_id for doc_id, _, _ in self._make_documents(*row)]
+
+    def _encoder(self) -> EmbeddingPool:
+        return EmbeddingPool(self.embeddings, workers=self.encode_workers, batch_size=self.encode_batch_size)
+
+    def build_index(
+        self,
+        csv_path: Path,
+        incremental: bool = False,
+        progress: Optional[ProgressCallback] = None,
+        should_cancel: Optional[CancelCheck] = None,
+        shard: Optional[int] = None,
+    ) -> bool:
+        """
+        Build the vector index (Chroma or flat mmap store, per backend) from a CSV file.
         Expected CSV columns (case-sensitive): 'PMID', 'Title', 'Abstract'
-        Returns True on success.
+        The CSV is streamed in chunks of INDEX_BATCH_SIZE rows; each chunk is
+        embedded and written before the next is read, so peak memory is bounded
+        by the chunk size rather than the corpus size. Every row also feeds a
+        fresh BM25 index, published just before the vector index goes live.
+        With incremental=True and an existing index, only new or changed PMIDs
+        (by content hash) are embedded and PMIDs missing from the CSV are deleted,
+        in place. Otherwise a full index is written to a fresh versioned directory
+        and swapped in only when complete; queries keep using the old index until then.
+        A new index is split into num_shards shards by PMID hash. With shard=i on a
+        sharded index, only that shard's PMIDs are embedded: incrementally in place,
+        or (incremental=False) into a fresh shard directory swapped in when complete.
+        progress(done, total) is called after every chunk; should_cancel() is polled
+        between chunks and raises BuildCancelled.
+        Counts are stored in `last_build_stats`. Returns True on success.
         """
         csv_path = Path(csv_path)
-        try:
-            if not csv_path.exists():
-                logger.error("CSV file not found: %s", csv_path)
-                return False
+        with self._build_lock:
+            try:
+                if not csv_path.exists():
+                    logger.error("CSV file not found: %s", csv_path)
+                    return False
 
-            logger.info("Reading CSV: %s", csv_path)
-            df = pd.read_csv(csv_path)
+                logger.info("Reading CSV: %s", csv_path)
+                if not self._check_columns(csv_path):
+                    return False
 
-            required_cols = ["PMID", "Title", "Abstract"]
-            if not all(col in df.columns for col in required_cols):
-                logger.error("CSV missing required columns. Required: %s", required_cols)
-                return False
+                if shard is not None and not self.is_sharded():
+                    logger.error("Cannot build shard %s: the live index is not sharded.", shard)
+                    return False
+                if shard is not None and not 0 <= shard < self.shard_count():
+                    logger.error("Cannot build shard %s: the live index has %d shard(s).", shard, self.shard_count())
+                    return False
 
-            documents: List[str] = []
-            metadatas: List[dict] = []
+                total = self._count_rows(csv_path)
+                if not total:
+                    logger.warning("No valid documents extracted from CSV.")
+                    return False
 
-            for _, row in df.iterrows():
-                pmid = str(row.get("PMID", "")).strip()
-                if not pmid or pmid.lower() in {"nan", "none", ""}:
-                    continue
+                if shard is not None and not incremental:
+                    return self._build_shard(shard, csv_path, total, progress, should_cancel)
 
-                title = str(row.get("Title", "")).strip()
-                abstract = str(row.get("Abstract", "")).strip()
-
-                text = f"Title: {title}\n\nAbstract: {abstract}"
-                documents.append(text)
-                metadatas.append(
-                    {
-                        "pmid": pmid,
-                        "title": title,
-                        "abstract": abstract,
-                        "source": "pubmed",
-                    }
-                )
+                if incremental and self.is_ready():
+                    return self._build_incremental(csv_path, total, progress, should_cancel, shard)
 
-            if not documents:
-                logger.warning("No valid documents extracted from CSV.")
+                return self._build_full(csv_path, total, progress, should_cancel)
+
+            except BuildCancelled:
+                logger.info("Index build cancelled.")
+                raise
+            except Exception as e:
+                logger.exception("Failed to build index: %s", e)
                 return False
 
-            if self.chroma_dir.exists():
-                logger.info("Removing existing Chroma directory: %s", self.chroma_dir)
-                shutil.rmtree(self.chroma_dir)
+    def _build_full(
+        self,
+        csv_path: Path,
+        total: int,
+        progress: Optional[ProgressCallback],
+        should_cancel: Optional[CancelCheck],
+    ) -> bool:
+        """Stream every row into a new version directory, then swap it in."""
+        version = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        version_dir = self.chroma_dir / VERSIONS_DIR / version
+        version_dir.mkdir(parents=True, exist_ok=True)
 
-            logger.info("Creating new Chroma vector store. This may take a while...")
-            vectorstore = Chroma.from_texts(
-                texts=documents,
-                metadatas=metadatas,
-                embedding=self.embeddings,
-                persist_directory=str(self.chroma_dir),
-            )
-            vectorstore.persist()
+        logger.info("Creating new %s vector store at %s. This may take a while...", self.backend, version_dir)
+        done = 0
+        try:
+            vectorstore = self._open_store(version_dir)
+            collection = self._collection(vectorstore)
+            doc_store = DocumentStore.open(version_dir)
+            if progress:
+                progress(0, total)
+            sparse = SparseIndexBuilder()
+            with self._encoder() as encoder:
+                for rows in self._iter_row_chunks(csv_path):
+                    if should_cancel and should_cancel():
+                        raise BuildCancelled()
+                    self._write_rows(collection, doc_store, encoder, rows)
+                    sparse.add(rows)
+                    done += len(rows)
+                    if progress:
+                        progress(done, max(total, done))
+            if hasattr(vectorstore, "persist"):
+                vectorstore.persist()
+            chunks = collection.count()
+            indexed = sparse.num_docs
+        except BaseException:
+            shutil.rmtree(version_dir, ignore_errors=True)
+            raise
 
-            self.vectorstore = Chroma(
-                persist_directory=str(self.chroma_dir),
-                embedding_function=self.embeddings,
-            )
-            logger.info("Chroma index built and persisted at: %s", self.chroma_dir)
-            return True
+        self._publish_sparse(sparse)
+        self._swap_to(version, version_dir, vectorstore, doc_store)
+        self._cleanup_old_versions()
+        self.last_build_stats = {
+            "mode": "full",
+            "version": version,
+            "shards": self.shard_count(),
+            "added": indexed,
+            "updated": 0,
+            "removed": 0,
+            "unchanged": 0,
+            "total": indexed,
+            "chunks": chunks,
+            "doc_store_bytes": doc_store.size_bytes(),
+            "index_params": self.index_params(),
+        }
+        logger.info("%s index built and persisted at: %s", self.backend, version_dir)
+        return True
+
+    def _build_incremental(
+        self,
+        csv_path: Path,
+        total: int,
+        progress: Optional[ProgressCallback],
+        should_cancel: Optional[CancelCheck],
+        shard: Optional[int] = None,
+    ) -> bool:
+        """
+        Stream the CSV, upsert new/changed PMIDs into the live collection and drop
+        vanished ones; with `shard`, only that shard's PMIDs are compared and written.
+        """
+        collection = self.vectorstore.collection(shard) if shard is not None else self._collection()
+        indexed = self._indexed_hashes(collection)
+        if self.doc_store is None:
+            # Index from before the document store: rows written from now on go there,
+            # untouched ones keep serving text from their vector-index metadata
+            self.doc_store = DocumentStore.open(self.active_dir)
+        doc_store = self.doc_store
+
+        seen: set = set()
+        added: set = set()
+        updated: set = set()
+        # BM25 is cheap to rebuild, so it is always rebuilt from the full CSV
+        sparse = SparseIndexBuilder()
+        done = 0
+        if progress:
+            progress(0, total)
+        try:
+            with self._encoder() as encoder:
+                for rows in self._iter_row_chunks(csv_path):
+                    if should_cancel and should_cancel():
+                        raise BuildCancelled()
+                    changed: List[Row] = []
+                    stale_ids: List[str] = []
+                    for row in self._shard_rows(rows, shard):
+                        pmid, content_hash = row[0], row[3]
+                        seen.add(pmid)
+                        entry = indexed.get(pmid)
+                        if entry is None:
+                            added.add(pmid)
+                            changed.append(row)
+                            indexed[pmid] = {"ids": self._document_ids(row), "hash": content_hash}
+                        elif entry["hash"] != content_hash:
+                            updated.add(pmid)
+                            changed.append(row)
+                            # Ids the upsert does not overwrite (legacy ids, surplus passages) would otherwise survive
+                            stale_ids.extend(entry["ids"])
+                            entry["ids"] = self._document_ids(row)
+                            entry["hash"] = content_hash
+                    self._write_rows(collection, doc_store, encoder, changed, stale_ids)
+                    sparse.add(rows)
+                    done += len(rows)
+                    if progress:
+                        progress(done, max(total, done))
+
+            removed = [pmid for pmid in indexed if pmid not in seen]
+            removed_ids = [doc_id for pmid in removed for doc_id in indexed[pmid]["ids"]]
+            for start in range(0, len(removed_ids), INDEX_BATCH_SIZE):
+                collection.delete(ids=removed_ids[start:start + INDEX_BATCH_SIZE])
+            doc_store.delete(removed)
+            self._publish_sparse(sparse)
+        finally:
+            if hasattr(self.vectorstore, "persist"):
+                self.vectorstore.persist()
+            if added or updated or len(seen) != len(indexed):
+                self.index_version += 1
+                self._announce_update()
+
+        # PMIDs first added in this run and repeated later in the CSV count once, as added
+        updated -= added
+        unchanged = len(seen) - len(added) - len(updated)
+        logger.info(
+            "Incremental index update: %d added, %d updated, %d removed, %d unchanged",
+            len(added), len(updated), len(removed), unchanged,
+        )
+        self.last_build_stats = {
+            "mode": "incremental",
+            "shard": shard,
+            "added": len(added),
+            "updated": len(updated),
+            "removed": len(removed),
+            "unchanged": unchanged,
+            "total": len(seen),
+        }
+        return True
 
+    def _shard_rows(self, rows: List[Row], shard: Optional[int]) -> List[Row]:
+        """The rows belonging to `shard` of the live index (all rows when shard is None)."""
+        if shard is None:
+            return rows
+        return [row for row in rows if shard_of(row[0], self.shard_count()) == shard]
+
+    def _build_shard(
+        self,
+        shard: int,
+        csv_path: Path,
+        total: int,
+        progress: Optional[ProgressCallback],
+        should_cancel: Optional[CancelCheck],
+    ) -> bool:
+        """
+        Re-embed one shard of the live (sharded) index into a fresh shard directory
+        and swap it in; the other shards keep serving untouched. Titles/abstracts
+        are upserted into the live document store as the build goes.
+        """
+        store: ShardedVectorStore = self.vectorstore
+        previous = set(self._indexed_hashes(store.collection(shard)))
+        if self.doc_store is None:
+            self.doc_store = DocumentStore.open(self.active_dir)
+        doc_store = self.doc_store
+        shard_dir = store.new_shard_dir(shard)
+        logger.info("Rebuilding shard %d of %d at %s", shard, store.num_shards, shard_dir)
+
+        seen: set = set()
+        done = 0
+        try:
+            shard_store = self._open_single_store(shard_dir)
+            collection = self._collection(shard_store)
+            if progress:
+                progress(0, total)
+            sparse = SparseIndexBuilder()
+            with self._encoder() as encoder:
+                for rows in self._iter_row_chunks(csv_path):
+                    if should_cancel and should_cancel():
+                        raise BuildCancelled()
+                    mine = self._shard_rows(rows, shard)
+                    self._write_rows(collection, doc_store, encoder, mine)
+                    seen.update(row[0] for row in mine)
+                    sparse.add(rows)
+                    done += len(rows)
+                    if progress:
+                        progress(done, max(total, done))
+            if hasattr(shard_store, "persist"):
+                shard_store.persist()
+            chunks = collection.count()
+        except BaseException:
+            shutil.rmtree(shard_dir, ignore_errors=True)
+            raise
+
+        self._publish_sparse(sparse)
+        store.replace_shard(shard, shard_dir, shard_store)
+        removed = sorted(previous - seen)
+        doc_store.delete(removed)
+        self.index_version += 1
+        self._announce_update()
+        self.last_build_stats = {
+            "mode": "full",
+            "shard": shard,
+            "added": len(seen - previous),
+            "updated": 0,
+            "removed": len(removed),
+            "unchanged": 0,
+            "total": len(seen),
+            "chunks": chunks,
+        }
+        logger.info("Shard %d rebuilt at %s", shard, shard_dir)
+        return True
+
+    def _publish_sparse(self, builder: SparseIndexBuilder) -> None:
+        """Write and load the new BM25 index; a failure here leaves the old one (or none) in place."""
+        try:
+            self.sparse_index = self.sparse_store.publish(builder, keep=INDEX_KEEP_VERSIONS)
+            self._sparse_stamp = _pointer_stamp(self.sparse_store.root / CURRENT_POINTER)
+            logger.info("BM25 index published: %d docs, %d terms", self.sparse_index.num_docs, len(self.sparse_index.vocab))
         except Exception as e:
-            logger.exception("Failed to build Chroma index: %s", e)
-            return False
+            logger.exception("Failed to build BM25 index: %s", e)
 
-    def retrieve(self, query: str, k: int = 5):
+    def pmid_vector(self, pmid: str) -> Optional[np.ndarray]:
         """
-        Retrieve top-k similar documents from the vector store.
-        Returns a list of doc-like objects (with metadata and score).
+        Stored embedding of an indexed PMID (mean of its passage vectors with a
+        passage index), unit-normalized. None if the PMID is not indexed.
+        """
+        pmid = str(pmid).strip()
+        key = (pmid, self.index_version)
+        vector = self.seed_vector_cache.get(key)
+        if vector is None:
+            page = self._collection().get(where={"pmid": pmid}, include=["embeddings"])
+            embeddings = page.get("embeddings")
+            if embeddings is None or len(embeddings) == 0:
+                return None
+            vector = np.asarray(embeddings, dtype=np.float32).mean(axis=0)
+            vector /= np.linalg.norm(vector) + 1e-12
+            self.seed_vector_cache.put(key, vector)
+        return vector
+
+    def _query_vector(self, query: str, seed_pmid: Optional[str], seed_weight: float) -> List[float]:
+        """Query embedding, the seed PMID's stored vector, or a weighted blend of both."""
+        seed = self.pmid_vector(seed_pmid) if seed_pmid else None
+        if seed_pmid and seed is None:
+            logger.warning("Seed PMID %s is not indexed; using the text query only.", seed_pmid)
+        if seed is None:
+            return self.embed_query(query)
+        if not self._normalize_query(query) or seed_weight >= 1.0:
+            return seed.tolist()
+        text = np.asarray(self.embed_query(query), dtype=np.float32)
+        text /= np.linalg.norm(text) + 1e-12
+        blended = seed_weight * seed + (1.0 - seed_weight) * text
+        return (blended / (np.linalg.norm(blended) + 1e-12)).tolist()
+
+    def retrieve(
+        self,
+        query: str,
+        k: int = 5,
+        mode: str = "dense",
+        mmr: bool = False,
+        mmr_lambda: float = MMR_LAMBDA,
+        seed_pmid: Optional[str] = None,
+        seed_weight: Optional[float] = None,
+    ):
+        """
+        Retrieve top-k documents for a query.
+        mode="dense" uses embedding similarity, "sparse" uses BM25 and "hybrid"
+        fuses both rankings with reciprocal rank fusion (score = fused RRF score).
+        Sparse/hybrid fall back to dense when no BM25 index has been built yet.
+        Dense hits are over-fetched adaptively so k unique PMIDs come back
+        whenever the index has them. With a passage index, passage hits are
+        aggregated per PMID and the snippet is the best-matching passage.
+        mmr=True re-ranks the dense candidates for diversity (maximal marginal
+        relevance) using the stored embeddings.
+        seed_pmid ("more like this") searches with that PMID's stored vector,
+        blended with the query embedding by seed_weight (SEED_WEIGHT when None; the seed alone when the
+        query is empty); the seed itself is left out of the results.
+        Returns a list of dicts with pmid, title, snippet, score and source.
         """
         if not self.is_ready():
             logger.error("Attempted to retrieve but vectorstore is not ready.")
             return []
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode {mode!r}; expected one of {RETRIEVAL_MODES}")
+        if mode != "dense" and self.sparse_index is None:
+            logger.warning("No BM25 index available; using dense retrieval. Rebuild the index to enable %s mode.", mode)
+            mode = "dense"
+
+        if seed_weight is None:
+            seed_weight = SEED_WEIGHT
+        seed = (str(seed_pmid).strip(), seed_weight) if seed_pmid else None
+        cache_key = (self._normalize_query(query), k, mode, mmr and mmr_lambda, seed, self.index_version)
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            return [dict(item) for item in cached]
 
         try:
-            results = self.vectorstore.similarity_search_with_score(query, k=k)
-            output = []
-            seen_pmids = set()
-            for doc, score in results:
-                meta = getattr(doc, "metadata", {}) or {}
-                pmid = str(meta.get("pmid", "")).strip()
-                if not pmid or pmid.lower() in {"nan", "none", ""}:
-                    continue
-                if pmid in seen_pmids:
-                    continue
-                seen_pmids.add(pmid)
-
-                page_content = getattr(doc, "page_content", "")
-                snippet = page_content[:300] + "..." if len(page_content) > 300 else page_content
-
-                output.append(
-                    {
-                        "pmid": pmid,
-                        "title": meta.get("title", "No title"),
-                        "snippet": snippet,
-                        "score": float(score),
-                        "source": meta.get("source", "pubmed"),
-                    }
-                )
+            if mode == "dense":
+                output = self._dense_hits(query, k, mmr, mmr_lambda, seed)
+            elif mode == "sparse":
+                output = self._hydrate(self.sparse_index.search(query, k), query)
+            else:
+                output = self._hybrid_hits(query, k, mmr, mmr_lambda, seed)
+            self.result_cache.put(cache_key, [dict(item) for item in output])
             return output
         except Exception as e:
             logger.exception("Error during retrieval: %s", e)
-            return []
\ No newline at end of file
+            return []
+
+    def retrieve_batch(self, queries: List[str], k: int = 5, mode: str = "dense", mmr: bool = False) -> List[List[Dict[str, Any]]]:
+        """
+        retrieve() for many queries at once, returning one result list per query.
+        Uncached queries are embedded in one batched encode call; in plain dense
+        mode their vector searches also go to Chroma as a single multi-vector query.
+        """
+        if not self.is_ready():
+            logger.error("Attempted to retrieve but vectorstore is not ready.")
+            return [[] for _ in queries]
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode {mode!r}; expected one of {RETRIEVAL_MODES}")
+        if mode != "dense" and self.sparse_index is None:
+            mode = "dense"
+
+        version = self.index_version
+        outputs: List[Optional[List[Dict[str, Any]]]] = []
+        pending: Dict[str, List[int]] = {}
+        for i, query in enumerate(queries):
+            key = self._normalize_query(query)
+            cached = self.result_cache.get((key, k, mode, mmr and MMR_LAMBDA, None, version))
+            outputs.append([dict(item) for item in cached] if cached is not None else None)
+            if cached is None:
+                pending.setdefault(key, []).append(i)
+        if not pending:
+            return outputs
+
+        keys = list(pending)
+        # Errors propagate: a failed batch is a failed request, not empty results
+        vectors = self.embed_queries(keys)
+        if mode == "dense" and not mmr:
+            fetch_k = self._fetch_size(k)
+            hits = self._vector_hits_batch(vectors, fetch_k)
+            for key, vector, first_round in zip(keys, vectors, hits):
+                ranked = self._unique_hits(vector, k, hits=first_round, fetch_k=fetch_k)
+                result = self._items([(pmid, score, meta, text) for pmid, score, meta, text, _ in ranked[:k]], key)
+                self.result_cache.put((key, k, mode, False, None, version), [dict(item) for item in result])
+                for i in pending[key]:
+                    outputs[i] = [dict(item) for item in result]
+        else:
+            # Embeddings are cached now, so each retrieve() only runs its searches
+            for key in keys:
+                result = self.retrieve(key, k=k, mode=mode, mmr=mmr)
+                for i in pending[key]:
+                    outputs[i] = [dict(item) for item in result]
+        return [output or [] for output in outputs]
+
+    def retrieve_expanded(
+        self,
+        query: str,
+        expansions: List[str],
+        k: int = 5,
+        mode: str = "dense",
+        weight: float = KG_EXPANSION_WEIGHT,
+    ) -> List[Dict[str, Any]]:
+        """
+        retrieve() with query expansion: the query and its sub-queries (e.g. KG
+        neighbours from KGAdjacency.expand) are embedded in one batch and searched
+        with one multi-vector query, and the per-query rankings are fused with
+        weighted reciprocal rank fusion (sub-queries count `weight`). Hybrid mode
+        adds the query's BM25 ranking; sparse mode runs BM25 for every query.
+        Falls back to retrieve() when there is nothing to expand.
+        """
+        key = self._normalize_query(query)
+        expansions = [e for e in dict.fromkeys(self._normalize_query(e) for e in expansions) if e and e != key]
+        if not expansions:
+            return self.retrieve(query, k=k, mode=mode)
+        if not self.is_ready():
+            logger.error("Attempted to retrieve but vectorstore is not ready.")
+            return []
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode {mode!r}; expected one of {RETRIEVAL_MODES}")
+        if mode != "dense" and self.sparse_index is None:
+            mode = "dense"
+
+        cache_key = (key, k, mode, False, None, self.index_version, tuple(expansions), weight)
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            return [dict(item) for item in cached]
+
+        try:
+            queries = [key] + expansions
+            weights = [1.0] + [weight] * len(expansions)
+            # Twice k per query, so PMIDs ranked lower by several queries can still win the fusion
+            want = 2 * k
+            entries: Dict[str, Tuple[Dict[str, Any], str]] = {}
+            if mode == "sparse":
+                rankings = [[pmid for pmid, _ in self.sparse_index.search(q, want)] for q in queries]
+            else:
+                vectors = self.embed_queries(queries)
+                rankings = []
+                fetch_k = self._fetch_size(want)
+                for vector, first_round in zip(vectors, self._vector_hits_batch(vectors, fetch_k)):
+                    ranked = self._unique_hits(vector, want, hits=first_round, fetch_k=fetch_k)[:want]
+                    rankings.append([entry[0] for entry in ranked])
+                    for pmid, _, meta, text, _ in ranked:
+                        # The original query's passage wins, as it is searched first
+                        entries.setdefault(pmid, (meta, text))
+                if mode == "hybrid":
+                    rankings.append([pmid for pmid, _ in self.sparse_index.search(key, want)])
+                    weights.append(1.0)
+            fused = reciprocal_rank_fusion(rankings, k=RRF_K, weights=weights)[:k]
+            output = self._items(
+                [(pmid, score, *entries[pmid]) if pmid in entries else (pmid, score, None, "") for pmid, score in fused],
+                key,
+            )
+            self.result_cache.put(cache_key, [dict(item) for item in output])
+            return output
+        except Exception as e:
+            logger.exception("Error during expanded retrieval: %s", e)
+            return []
+
+    @staticmethod
+    def _make_item(pmid: str, title: str, text: str, limit: int, score: float) -> Dict[str, Any]:
+        snippet = text[:limit] + "..." if len(text) > limit else text
+        return {
+            "pmid": pmid,
+            "title": title or "No title",
+            "snippet": snippet,
+            "score": float(score),
+            "source": "pubmed",
+        }
+
+    def _doc_item(self, pmid: str, doc: Tuple[str, str], meta: Optional[Dict[str, Any]], score: float, terms: set) -> Dict[str, Any]:
+        """Result dict from DocumentStore text: the hit's passage, the passage best matching the query, or the abstract."""
+        title, abstract = doc
+        chunk = (meta or {}).get("chunk")
+        if chunk is None and self.chunking == "document":
+            return self._make_item(pmid, title, f"Title: {title}\n\nAbstract: {abstract}", SNIPPET_CHARS, score)
+        passages = self._passages(abstract)
+        if chunk is not None and int(chunk) < len(passages):
+            passage = passages[int(chunk)]
+        else:
+            passage = max(passages, key=lambda p: len(terms.intersection(tokenize(p))))
+        return self._make_item(pmid, title, passage, PASSAGE_SNIPPET_CHARS, score)
+
+    def _legacy_item(self, pmid: str, meta: Dict[str, Any], page_content: str, score: float) -> Dict[str, Any]:
+        """Result dict from text stored in the vector index itself (indexes built before the document store)."""
+        if meta.get("passage"):
+            return self._make_item(pmid, meta.get("title"), meta["passage"], PASSAGE_SNIPPET_CHARS, score)
+        return self._make_item(pmid, meta.get("title"), page_content, SNIPPET_CHARS, score)
+
+    def _items(self, entries: List[Tuple[str, float, Optional[Dict[str, Any]], str]], query: str) -> List[Dict[str, Any]]:
+        """
+        Hydrate (pmid, score, metadata, text) entries into result dicts, in order,
+        loading text for just these PMIDs. metadata is None for entries with no
+        vector hit (sparse results); their snippet is the passage best matching the query.
+        """
+        pmids = [entry[0] for entry in entries]
+        docs = self.doc_store.get_many(pmids) if self.doc_store is not None else {}
+        legacy = self._legacy_payload([p for p, _, meta, _ in entries if meta is None and p not in docs], query)
+        terms = set(tokenize(query))
+        output = []
+        for pmid, score, meta, text in entries:
+            if pmid in docs:
+                output.append(self._doc_item(pmid, docs[pmid], meta, score, terms))
+            elif meta is not None:
+                output.append(self._legacy_item(pmid, meta, text, score))
+            elif pmid in legacy:
+                output.append(self._legacy_item(pmid, legacy[pmid][0], legacy[pmid][1], score))
+        return output
+
+    def _dense_ranked(
+        self, query: str, k: int, mmr: bool = False, mmr_lambda: float = MMR_LAMBDA, seed: Optional[Tuple[str, float]] = None
+    ) -> List[Tuple[str, float, Dict[str, Any], str]]:
+        """Top-k dense (pmid, score, metadata, text) entries, not yet hydrated."""
+        if seed is None:
+            vector = self.embed_query(query)
+            ranked = self._unique_hits(vector, k * MMR_CANDIDATES if mmr else k, with_embeddings=mmr)
+        else:
+            vector = self._query_vector(query, *seed)
+            # One extra so dropping the seed itself still leaves k
+            ranked = self._unique_hits(vector, (k * MMR_CANDIDATES if mmr else k) + 1, with_embeddings=mmr)
+            ranked = [entry for entry in ranked if entry[0] != seed[0]]
+        if mmr:
+            ranked = self._mmr(vector, ranked, k, mmr_lambda)
+        return [(pmid, score, meta, text) for pmid, score, meta, text, _ in ranked[:k]]
+
+    def _dense_hits(
+        self, query: str, k: int, mmr: bool = False, mmr_lambda: float = MMR_LAMBDA, seed: Optional[Tuple[str, float]] = None
+    ) -> List[Dict[str, Any]]:
+        return self._items(self._dense_ranked(query, k, mmr, mmr_lambda, seed), query)
+
+    def _vector_hits(self, vector: List[float], n: int, with_embeddings: bool = False) -> List[Tuple[Dict[str, Any], str, float, Any]]:
+        """Nearest n documents as (metadata, text, relevance score, embedding or None)."""
+        return self._vector_hits_batch([vector], n, with_embeddings)[0]
+
+    def _vector_hits_batch(self, vectors: List[List[float]], n: int, with_embeddings: bool = False):
+        """_vector_hits for several query vectors in a single collection query."""
+        include = ["metadatas", "documents", "distances"] + (["embeddings"] if with_embeddings else [])
+        result = self._collection().query(query_embeddings=vectors, n_results=n, include=include)
+        relevance = self._relevance_fn()
+        empty = [[] for _ in vectors]
+        all_embeddings = result.get("embeddings") if with_embeddings else None
+        output = []
+        for i, (metadatas, documents, distances) in enumerate(zip(
+            result.get("metadatas") or empty, result.get("documents") or empty, result.get("distances") or empty
+        )):
+            embeddings = all_embeddings[i] if all_embeddings is not None else [None] * len(metadatas)
+            output.append([
+                (meta or {}, text or "", relevance(distance), embedding)
+                for meta, text, distance, embedding in zip(metadatas, documents, distances, embeddings)
+            ])
+        return output
+
+    def _fetch_size(self, want: int) -> int:
+        return min(max(want, RETRIEVAL_MAX_FETCH), max(want, math.ceil(want * self.overfetch_factor)))
+
+    def _unique_hits(self, vector: List[float], want: int, with_embeddings: bool = False, hits=None, fetch_k: Optional[int] = None):
+        """
+        Query until `want` unique valid PMIDs are found, the collection is
+        exhausted or RETRIEVAL_MAX_FETCH hits were requested. The first request
+        is sized by the learned over-fetch factor, so most queries need one round.
+        `hits` may hold an already-fetched first round, requested with `fetch_k`
+        (the factor moves between queries, so it is not recomputed here).
+        """
+        cap = max(want, RETRIEVAL_MAX_FETCH)
+        if fetch_k is None:
+            fetch_k = self._fetch_size(want)
+        rounds = 0
+        while True:
+            rounds += 1
+            if hits is None:
+                hits = self._vector_hits(vector, fetch_k, with_embeddings)
+            ranked = self._aggregate(hits)
+            if len(ranked) >= want or len(hits) < fetch_k or fetch_k >= cap:
+                break
+            fetch_k = min(cap, fetch_k * 2)
+            hits = None
+        if ranked:
+            observed = len(hits) / len(ranked) * OVERFETCH_MARGIN
+            self.overfetch_factor = min(
+                MAX_OVERFETCH_FACTOR,
+                max(1.0, (1 - OVERFETCH_EMA) * self.overfetch_factor + OVERFETCH_EMA * observed),
+            )
+        if rounds > 1:
+            logger.debug("Dense retrieval needed %d rounds (%d hits for %d PMIDs)", rounds, len(hits), len(ranked))
+        return ranked
+
+    def _aggregate(self, hits) -> List[Tuple[str, float, Dict[str, Any], str, Any]]:
+        """
+        Collapse vector hits to one entry per valid PMID, best first:
+        (pmid, score, metadata, text, embedding). Hit scores must be relevance
+        scores (higher is better), not raw distances: _vector_hits_batch converts
+        them with _relevance_fn. The score is the max or sum of its passage scores
+        (self.aggregation); metadata/text/embedding come from its best-scoring passage.
+        """
+        best: Dict[str, Tuple[float, Dict[str, Any], str, Any]] = {}
+        totals: Dict[str, float] = {}
+        for meta, text, score, embedding in hits:
+            pmid = str(meta.get("pmid", "")).strip()
+            if not pmid or pmid.lower() in {"nan", "none", ""}:
+                continue
+            score = float(score)
+            # L2 relevance goes negative for distant passages; they must not lower a sum
+            totals[pmid] = totals.get(pmid, 0.0) + max(score, 0.0)
+            if pmid not in best or score > best[pmid][0]:
+                best[pmid] = (score, meta, text, embedding)
+
+        scores = totals if self.aggregation == "sum" else {pmid: hit[0] for pmid, hit in best.items()}
+        ranked = sorted(best, key=lambda pmid: scores[pmid], reverse=True)
+        return [(pmid, scores[pmid], best[pmid][1], best[pmid][2], best[pmid][3]) for pmid in ranked]
+
+    @staticmethod
+    def _mmr(vector: List[float], ranked, k: int, mmr_lambda: float):
+        """Greedy maximal-marginal-relevance selection of k entries, using their stored embeddings."""
+        ranked = [entry for entry in ranked if entry[4] is not None]
+        if len(ranked) <= 1:
+            return ranked
+        emb = np.asarray([entry[4] for entry in ranked], dtype=np.float32)
+        emb /= np.linalg.norm(emb, axis=1, keepdims=True) + 1e-12
+        query = np.asarray(vector, dtype=np.float32)
+        query /= np.linalg.norm(query) + 1e-12
+        relevance = emb @ query
+        similarity = emb @ emb.T
+
+        selected = [int(np.argmax(relevance))]
+        max_sim = similarity[selected[0]].copy()
+        while len(selected) < min(k, len(ranked)):
+            scores = mmr_lambda * relevance - (1.0 - mmr_lambda) * max_sim
+            scores[selected] = -np.inf
+            chosen = int(np.argmax(scores))
+            selected.append(chosen)
+            max_sim = np.maximum(max_sim, similarity[chosen])
+        return [ranked[i] for i in selected]
+
+    def _hydrate(self, hits: List[Tuple[str, float]], query: str) -> List[Dict[str, Any]]:
+        """Result dicts for (pmid, score) hits without a vector hit (BM25), keeping their order."""
+        return self._items([(pmid, score, None, "") for pmid, score in hits], query)
+
+    def _legacy_payload(self, pmids: List[str], query: str) -> Dict[str, Tuple[Dict[str, Any], str]]:
+        """
+        {pmid: (metadata, text)} read from the vector index, for PMIDs indexed
+        before the document store existed. With passage documents, the passage
+        sharing the most terms with the query is picked.
+        """
+        if not pmids:
+            return {}
+        page = self._collection().get(where={"pmid": {"$in": pmids}}, include=["metadatas", "documents"])
+        terms = set(tokenize(query))
+        found: Dict[str, Tuple[int, Dict[str, Any], str]] = {}
+        for meta, text in zip(page.get("metadatas") or [], page.get("documents") or []):
+            meta = meta or {}
+            pmid = str(meta.get("pmid", "")).strip()
+            overlap = len(terms.intersection(tokenize(meta.get("passage") or ""))) if "passage" in meta else 0
+            if pmid not in found or overlap > found[pmid][0]:
+                found[pmid] = (overlap, meta, text or "")
+        return {pmid: (meta, text) for pmid, (_, meta, text) in found.items()}
+
+    def _hybrid_hits(
+        self, query: str, k: int, mmr: bool = False, mmr_lambda: float = MMR_LAMBDA, seed: Optional[Tuple[str, float]] = None
+    ) -> List[Dict[str, Any]]:
+        sparse = self.sparse_index.search(query, 2 * k)
+        if seed is not None:
+            sparse = [(pmid, score) for pmid, score in sparse if pmid != seed[0]]
+        dense_k = 2 * k
+        if len(sparse) >= k and sparse[k - 1][1] > 0 and sparse[0][1] >= STRONG_SPARSE_RATIO * sparse[k - 1][1]:
+            dense_k = k
+        dense = self._dense_ranked(query, dense_k, mmr, mmr_lambda, seed)
+
+        fused = reciprocal_rank_fusion(
+            [[entry[0] for entry in dense], [pmid for pmid, _ in sparse]], k=RRF_K
+        )[:k]
+        # Only the fused top-k are hydrated; dense entries keep their passage
+        hits = {entry[0]: entry for entry in dense}
+        return self._items(
+            [(pmid, score, *hits[pmid][2:]) if pmid in hits else (pmid, score, None, "") for pmid, score in fused],
+            query,
+        )
@@ -0,0 +1,186 @@
+# app/core/registry.py
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+from app.core.executors import get_executor
+from app.core.startup import startup_profile
+
+# Heavy modules (torch, langchain, Chroma, neo4j, LLM clients) are imported on first use
+if TYPE_CHECKING:
+    from app.core.rag_pipeline import RAGPipeline
+    from app.core.kg_pipeline import KGPipeline
+    from app.core.llm_agent import LLMAgent
+    from app.core.semantic_cache import SemanticQueryCache
+    from app.core.index_jobs import IndexJobManager
+    from app.core.corpora import CorpusManager
+    from app.core.kg_expansion import KGAdjacency
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+VECTOR_DIR = Path("chroma_db")
+# Age (seconds) after which the KG adjacency used for query expansion is refreshed in the background
+KG_ADJACENCY_TTL = int(os.getenv("KG_ADJACENCY_TTL", "600"))
+
+
+class PipelineRegistry:
+    """
+    Process-wide holder for the shared pipelines.
+     - each pipeline is created lazily, exactly once, on first use; its module is
+       imported at that point too, and both steps are timed in the startup profile
+     - every router gets the same instance, so an index rebuild is visible everywhere
+     - each getter has its own lock, so the warm-up thread loading the models
+       (rag) or connecting to Neo4j (kg) does not hold up the other getters;
+       the first call still blocks, so async routes resolve them via run_in_pool
+     - close() releases the Neo4j driver on application shutdown
+    """
+
+    def __init__(self, chroma_dir: Path = VECTOR_DIR):
+        self.chroma_dir = Path(chroma_dir)
+        self._rag_lock = threading.Lock()
+        self._kg_lock = threading.Lock()
+        self._llm_lock = threading.Lock()
+        # Cheap helpers (corpora, semantic cache, index jobs)
+        self._lock = threading.Lock()
+        self._rag: Optional["RAGPipeline"] = None
+        self._kg: Optional["KGPipeline"] = None
+        self._llm: Optional["LLMAgent"] = None
+        self._llm_initialized = False
+        self._semantic_cache: Optional["SemanticQueryCache"] = None
+        self._index_jobs: Optional["IndexJobManager"] = None
+        self._corpora: Optional["CorpusManager"] = None
+        self._kg_adjacency: Optional["KGAdjacency"] = None
+        # Separate from _kg_lock: loading the adjacency calls kg(), which takes _kg_lock
+        self._kg_adjacency_lock = threading.Lock()
+        self._kg_adjacency_refreshing = False
+
+    def rag(self) -> "RAGPipeline":
+        if self._rag is None:
+            with self._rag_lock:
+                if self._rag is None:
+                    with startup_profile.step("import rag_pipeline"):
+                        from app.core.rag_pipeline import RAGPipeline
+                    with startup_profile.step("init RAGPipeline"):
+                        self._rag = RAGPipeline(chroma_dir=self.chroma_dir)
+        return self._rag
+
+    def corpora(self) -> "CorpusManager":
+        """Named corpora; the default one is rag()."""
+        if self._corpora is None:
+            with self._lock:
+                if self._corpora is None:
+                    from app.core.corpora import CorpusManager
+
+                    self._corpora = CorpusManager(self.rag)
+        return self._corpora
+
+    def corpus(self, name: Optional[str] = None) -> "RAGPipeline":
+        """RAG pipeline of a named corpus (rag() for None / "default"); raises CorpusNotFound."""
+        return self.corpora().get(name)
+
+    def kg(self) -> "KGPipeline":
+        if self._kg is None:
+            with self._kg_lock:
+                if self._kg is None:
+                    with startup_profile.step("import kg_pipeline"):
+                        from app.core.kg_pipeline import KGPipeline
+                    with startup_profile.step("init KGPipeline"):
+                        self._kg = KGPipeline()
+        return self._kg
+
+    def kg_adjacency(self) -> "KGAdjacency":
+        """
+        In-memory KG adjacency for query expansion. It is precomputed during the
+        startup warm-up (or on first use without warm-up); once older than
+        KG_ADJACENCY_TTL it is rebuilt on the "kg" pool while requests keep
+        using the current one.
+        """
+        adjacency = self._kg_adjacency
+        if adjacency is None:
+            with self._kg_adjacency_lock:
+                if self._kg_adjacency is None:
+                    from app.core.kg_expansion import KGAdjacency
+
+                    self._kg_adjacency = KGAdjacency.load(self.kg())
+                adjacency = self._kg_adjacency
+        elif time.time() - adjacency.built_at > KG_ADJACENCY_TTL:
+            with self._kg_adjacency_lock:
+                start_refresh = not self._kg_adjacency_refreshing
+                self._kg_adjacency_refreshing = True
+            if start_refresh:
+                get_executor("kg").submit(self._refresh_kg_adjacency)
+        return adjacency
+
+    def _refresh_kg_adjacency(self) -> None:
+        from app.core.kg_expansion import KGAdjacency
+
+        try:
+            adjacency = KGAdjacency.load(self.kg())
+            with self._kg_adjacency_lock:
+                self._kg_adjacency = adjacency
+        except Exception as e:
+            logger.warning("KG adjacency refresh failed; keeping the current one: %s", e)
+        finally:
+            self._kg_adjacency_refreshing = False
+
+    def llm(self) -> Optional["LLMAgent"]:
+        """Return the shared LLMAgent, or None if it failed to initialize."""
+        if not self._llm_initialized:
+            with self._llm_lock:
+                if not self._llm_initialized:
+                    try:
+                        with startup_profile.step("import llm_agent"):
+                            from app.core.llm_agent import LLMAgent
+                        with startup_profile.step("init LLMAgent"):
+                            self._llm = LLMAgent()
+                    except Exception as e:
+                        logger.warning(f"LLM Agent initialization failed: {e}")
+                        self._llm = None
+                    self._llm_initialized = True
+        return self._llm
+
+    def semantic_cache(self) -> Optional["SemanticQueryCache"]:
+        """Shared response cache for /api/hypothesis/generate (None if SEMANTIC_CACHE_ENABLED=0)."""
+        if os.getenv("SEMANTIC_CACHE_ENABLED", "1").lower() in {"0", "false", "no"}:
+            return None
+        if self._semantic_cache is None:
+            with self._lock:
+                if self._semantic_cache is None:
+                    from app.core.semantic_cache import SemanticQueryCache
+
+                    self._semantic_cache = SemanticQueryCache.from_env()
+        return self._semantic_cache
+
+    def index_jobs(self) -> "IndexJobManager":
+        """Background index build jobs for the RAG pipelines of every corpus."""
+        if self._index_jobs is None:
+            with self._lock:
+                if self._index_jobs is None:
+                    from app.core.index_jobs import IndexJobManager
+
+                    self._index_jobs = IndexJobManager(self.corpus)
+        return self._index_jobs
+
+    def close(self) -> None:
+        """Release external connections (Neo4j driver, SQLite connections) held by the pipelines."""
+        with self._kg_lock:
+            if self._kg is not None:
+                self._kg.close()
+            self._kg = None
+        with self._lock:
+            if self._corpora is not None:
+                self._corpora.close()
+        with self._rag_lock:
+            if self._rag is not None:
+                self._rag.close()
+        with self._llm_lock:
+            if self._llm is not None and self._llm.cache is not None:
+                self._llm.cache.close()
+
+
+# Shared instance used by all routers
+pipelines = PipelineRegistry()
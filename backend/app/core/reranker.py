@@ -0,0 +1,114 @@
+# app/core/reranker.py
+import hashlib
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.core.lru import LRUCache
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Locally stored cross-encoder; nothing is downloaded at runtime (fetch it once with
+# `python -m app.core.reranker --download`)
+DEFAULT_RERANKER_MODEL = os.getenv("RERANKER_MODEL", "models/ms-marco-MiniLM-L-6-v2")
+RERANKER_HUB_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+# Candidates fetched from the index before re-ranking down to k
+DEFAULT_RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+
+
+class CrossEncoderReranker:
+    """
+    Second retrieval stage: re-scores (query, passage) pairs with a cross-encoder.
+     - the model is loaded on first use from a local directory (FileNotFoundError if missing)
+     - all uncached pairs of a request go through one batched predict call
+     - scores are cached per (query hash, PMID) along with a hash of the passage,
+       so a PMID whose text changed in a rebuild is scored again
+    """
+
+    def __init__(
+        self,
+        model_name: str = DEFAULT_RERANKER_MODEL,
+        batch_size: int = int(os.getenv("RERANKER_BATCH_SIZE", "64")),
+        cache_size: int = int(os.getenv("RERANKER_CACHE_SIZE", "4096")),
+    ):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.cache = LRUCache(cache_size)
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    if not (Path(self.model_name) / "config.json").exists():
+                        raise FileNotFoundError(
+                            f"Cross-encoder model not found at {self.model_name!r}. Download it once with "
+                            f"`python -m app.core.reranker --download` or point RERANKER_MODEL at a local model directory."
+                        )
+                    from sentence_transformers import CrossEncoder
+
+                    logger.info("Loading cross-encoder: %s", self.model_name)
+                    self._model = CrossEncoder(self.model_name)
+        return self._model
+
+    @staticmethod
+    def _hash(text: str) -> str:
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _passage(item: Dict[str, Any]) -> str:
+        return f"{item.get('title', '')}\n\n{item.get('snippet', '')}"
+
+    def rerank(self, query: str, items: List[Dict[str, Any]], k: int) -> List[Dict[str, Any]]:
+        """Return the top-k items by cross-encoder score (replacing the bi-encoder `score`)."""
+        if not items:
+            return []
+        query_hash = self._hash(query)
+        scores: List[Optional[float]] = []
+        pending = []
+        for i, item in enumerate(items):
+            passage = self._passage(item)
+            passage_hash = self._hash(passage)
+            cached = self.cache.get((query_hash, item["pmid"]))
+            if cached is not None and cached[0] == passage_hash:
+                scores.append(cached[1])
+            else:
+                scores.append(None)
+                pending.append((i, passage, passage_hash))
+
+        if pending:
+            model = self._load()
+            predicted = model.predict(
+                [(query, passage) for _, passage, _ in pending],
+                batch_size=max(1, min(len(pending), self.batch_size)),
+                show_progress_bar=False,
+            )
+            for (i, _, passage_hash), score in zip(pending, predicted):
+                scores[i] = float(score)
+                self.cache.put((query_hash, items[i]["pmid"]), (passage_hash, scores[i]))
+
+        ranked = sorted(zip(items, scores), key=lambda pair: pair[1], reverse=True)[:k]
+        return [dict(item, score=score) for item, score in ranked]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"model": self.model_name, "loaded": self._model is not None, "cache": self.cache.stats()}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Store the re-ranking cross-encoder locally")
+    parser.add_argument("--download", action="store_true", help=f"Fetch {RERANKER_HUB_MODEL} from the Hugging Face hub")
+    parser.add_argument("--model", default=RERANKER_HUB_MODEL, help="Hub id to fetch")
+    parser.add_argument("--output", default=DEFAULT_RERANKER_MODEL, help="Local model directory (RERANKER_MODEL)")
+    args = parser.parse_args()
+    if not args.download:
+        parser.error("nothing to do (pass --download)")
+    from sentence_transformers import CrossEncoder
+
+    CrossEncoder(args.model).save(args.output)
+    print(f"Saved {args.model} to {args.output}")
@@ -0,0 +1,116 @@
+# app/core/semantic_cache.py
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class SemanticQueryCache:
+    """
+    In-memory semantic cache of full responses, keyed by query embedding.
+     - a lookup hits when a stored query with the same request parameters has
+       cosine similarity >= `threshold` to the incoming query
+     - vectors live in a fixed (max_entries x dim) matrix; the LRU entry's slot is reused when full
+     - entries belong to a scope (the corpus) with its own index version; when a
+       scope's version changes, only that scope's entries are dropped
+    """
+
+    def __init__(self, threshold: float = 0.92, max_entries: int = 512):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._matrix: Optional[np.ndarray] = None
+        # slot -> (scope, params_key, query, response), ordered from least to most recently used
+        self._entries: "OrderedDict[int, Tuple[Hashable, Hashable, str, Any]]" = OrderedDict()
+        # scope -> index version its entries were computed against
+        self._index_versions: Dict[Hashable, Any] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> "SemanticQueryCache":
+        return cls(
+            threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92")),
+            max_entries=int(os.getenv("SEMANTIC_CACHE_SIZE", "512")),
+        )
+
+    @staticmethod
+    def _normalize(vector: Sequence[float]) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm > 0 else v
+
+    def _check_version(self, scope: Hashable, index_version: Any) -> None:
+        previous = self._index_versions.get(scope)
+        if scope in self._index_versions and index_version == previous:
+            return
+        stale = [slot for slot, entry in self._entries.items() if entry[0] == scope]
+        if stale:
+            logger.info("Index version of %s changed (%s -> %s); dropping its %d semantic cache entries", scope, previous, index_version, len(stale))
+        for slot in stale:
+            del self._entries[slot]
+        self._index_versions[scope] = index_version
+
+    def lookup(
+        self, vector: Sequence[float], params_key: Hashable, index_version: Any, scope: Hashable = None
+    ) -> Optional[Tuple[Any, str, float]]:
+        """Return (response, original query, similarity) for the best match above threshold, else None."""
+        q = self._normalize(vector)
+        with self._lock:
+            self._check_version(scope, index_version)
+            if not self._entries or self._matrix is None or self._matrix.shape[1] != q.shape[0]:
+                self.misses += 1
+                return None
+            slots = [s for s, entry in self._entries.items() if entry[0] == scope and entry[1] == params_key]
+            if not slots:
+                self.misses += 1
+                return None
+            sims = self._matrix[slots] @ q
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold:
+                self.misses += 1
+                return None
+            slot = slots[best]
+            self._entries.move_to_end(slot)
+            self.hits += 1
+            _, _, original_query, response = self._entries[slot]
+            return response, original_query, float(sims[best])
+
+    def store(
+        self, vector: Sequence[float], params_key: Hashable, index_version: Any, query: str, response: Any, scope: Hashable = None
+    ) -> None:
+        q = self._normalize(vector)
+        with self._lock:
+            self._check_version(scope, index_version)
+            if self._matrix is None or self._matrix.shape[1] != q.shape[0]:
+                self._matrix = np.zeros((self.max_entries, q.shape[0]), dtype=np.float32)
+                self._entries.clear()
+            if len(self._entries) < self.max_entries:
+                used = set(self._entries)
+                slot = next(i for i in range(self.max_entries) if i not in used)
+            else:
+                slot, _ = self._entries.popitem(last=False)
+            self._matrix[slot] = q
+            self._entries[slot] = (scope, params_key, query, response)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
@@ -0,0 +1,236 @@
+# app/core/sharded_store.py
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+import zlib
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from app.core.executors import get_executor
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+SHARD_MANIFEST = "shards.json"
+RESULT_FIELDS = ("metadatas", "documents", "embeddings")
+
+
+def is_sharded_store(directory: Path) -> bool:
+    return (Path(directory) / SHARD_MANIFEST).exists()
+
+
+def shard_of(pmid: str, num_shards: int) -> int:
+    """Shard of a PMID: CRC32 of the PMID, stable across processes (unlike hash())."""
+    return zlib.crc32(str(pmid).strip().encode("utf-8")) % num_shards
+
+
+def _pmid_of(doc_id: str) -> str:
+    # Document ids are "<pmid>" or "<pmid>#<passage>"
+    return str(doc_id).split("#", 1)[0]
+
+
+class ShardedVectorStore:
+    """
+    N independent vector stores (Chroma or flat) under one index directory, with
+    each PMID assigned to shard_of(pmid). shards.json names every shard's current
+    sub-directory, so a single shard can be rebuilt into a fresh sub-directory
+    and swapped in while the others keep serving.
+    Queries fan out to all shards on the "shard" pool and the per-shard top-n
+    are merged by distance; writes and PMID lookups are routed to one shard.
+    Implements the subset of the Chroma collection API RAGPipeline uses
+    (get / query / upsert / delete / count).
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        open_store: Callable[[Path], Any],
+        as_collection: Callable[[Any], Any],
+        num_shards: int = 1,
+    ):
+        self.directory = Path(directory)
+        self._as_collection = as_collection
+        manifest = self.directory / SHARD_MANIFEST
+        if manifest.exists():
+            # An existing index keeps its shard count; num_shards only applies to new ones
+            names = json.loads(manifest.read_text())["shards"]
+        else:
+            names = [f"shard-{i:02d}" for i in range(num_shards)]
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._save_manifest(names)
+        self.names: List[str] = names
+        self.stores: List[Any] = [open_store(self.directory / name) for name in names]
+
+    @property
+    def num_shards(self) -> int:
+        return len(self.names)
+
+    def _save_manifest(self, names: List[str]) -> None:
+        tmp = self.directory / f"{SHARD_MANIFEST}.tmp"
+        tmp.write_text(json.dumps({"shards": names}))
+        os.replace(tmp, self.directory / SHARD_MANIFEST)
+
+    def collection(self, shard: int):
+        return self._as_collection(self.stores[shard])
+
+    def new_shard_dir(self, shard: int) -> Path:
+        return self.directory / f"shard-{shard:02d}-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+    def replace_shard(self, shard: int, directory: Path, store: Any) -> None:
+        """
+        Point the manifest at a rebuilt shard and swap it in. The directory it
+        replaces is kept (in-flight queries may still use it) until the next
+        rebuild of that shard.
+        """
+        previous = self.names[shard]
+        names = list(self.names)
+        names[shard] = Path(directory).name
+        self._save_manifest(names)
+        stores = list(self.stores)
+        stores[shard] = store
+        # Single reference assignments: in-flight queries finish on the old shard
+        self.names, self.stores = names, stores
+        prefix = f"shard-{shard:02d}"
+        for item in self.directory.iterdir():
+            if item.is_dir() and item.name.startswith(prefix) and item.name not in {names[shard], previous}:
+                logger.info("Removing old shard directory: %s", item)
+                shutil.rmtree(item, ignore_errors=True)
+
+    def _group(self, items: Sequence[Any], pmid_fn: Callable[[Any], str]) -> Dict[int, List[int]]:
+        """{shard: [positions in items]}"""
+        groups: Dict[int, List[int]] = {}
+        for i, item in enumerate(items):
+            groups.setdefault(shard_of(pmid_fn(item), self.num_shards), []).append(i)
+        return groups
+
+    def _fan_out(self, fn: Callable[[Any], Any]) -> List[Any]:
+        """Run fn(collection) on every shard in parallel; results in shard order."""
+        collections = [self._as_collection(store) for store in self.stores]
+        if len(collections) == 1:
+            return [fn(collections[0])]
+        executor = get_executor("shard")
+        futures = [executor.submit(fn, collection) for collection in collections]
+        return [future.result() for future in futures]
+
+    @staticmethod
+    def _concat(parts: List[Dict[str, Any]], include: Sequence[str]) -> Dict[str, Any]:
+        result: Dict[str, Any] = {"ids": []}
+        fields = [field for field in RESULT_FIELDS if field in include]
+        for field in fields:
+            result[field] = []
+        for part in parts:
+            result["ids"].extend(part.get("ids") or [])
+            for field in fields:
+                values = part.get(field)
+                if values is not None:
+                    result[field].extend(values)
+        return result
+
+    # ---------------------------
+    # Collection API
+    # ---------------------------
+
+    @property
+    def metadata(self) -> Optional[Dict[str, Any]]:
+        # Every shard is created with the same settings
+        return getattr(self.collection(0), "metadata", None)
+
+    def count(self) -> int:
+        return sum(self._fan_out(lambda collection: collection.count()))
+
+    def persist(self) -> None:
+        for store in self.stores:
+            if hasattr(store, "persist"):
+                store.persist()
+
+    def close(self) -> None:
+        for store in self.stores:
+            if hasattr(store, "close"):
+                store.close()
+
+    def query(self, query_embeddings, n_results: int = 10, include: Sequence[str] = ("metadatas", "documents", "distances")) -> Dict[str, Any]:
+        include = list(include)
+        # Distances drive the merge even when the caller does not want them
+        shard_include = include if "distances" in include else include + ["distances"]
+        results = self._fan_out(
+            lambda collection: collection.query(query_embeddings=query_embeddings, n_results=n_results, include=shard_include)
+        )
+        fields = ["ids"] + [field for field in RESULT_FIELDS if field in include]
+        merged: Dict[str, Any] = {field: [] for field in fields + ["distances"]}
+        for q in range(len(query_embeddings)):
+            hits = []
+            for result in results:
+                distances = result.get("distances") or []
+                if q < len(distances):
+                    hits.extend((float(distance), result, j) for j, distance in enumerate(distances[q]))
+            hits.sort(key=lambda hit: hit[0])
+            hits = hits[:n_results]
+            for field in fields:
+                merged[field].append([result[field][q][j] for _, result, j in hits])
+            merged["distances"].append([distance for distance, _, _ in hits])
+        return merged
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        include: Sequence[str] = ("metadatas", "documents"),
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        include = list(include)
+        parts = []
+        if ids is not None:
+            for shard, positions in self._group(ids, _pmid_of).items():
+                parts.append(self.collection(shard).get(ids=[ids[i] for i in positions], include=include))
+        elif where:
+            value = where.get("pmid")
+            if len(where) != 1 or value is None:
+                raise ValueError(f"Unsupported filter {where!r}; shards are routed by 'pmid'")
+            if isinstance(value, dict):
+                pmids = [str(v) for v in value.get("$in", [])]
+                for shard, positions in self._group(pmids, str).items():
+                    shard_where = {"pmid": {"$in": [pmids[i] for i in positions]}}
+                    parts.append(self.collection(shard).get(where=shard_where, include=include))
+            else:
+                parts.append(self.collection(shard_of(str(value), self.num_shards)).get(where=where, include=include))
+        else:
+            # Paged scan over the shards as one sequence, in shard order
+            skip, remaining = offset or 0, limit
+            for shard in range(self.num_shards):
+                if remaining is not None and remaining <= 0:
+                    break
+                collection = self.collection(shard)
+                size = collection.count()
+                if skip >= size:
+                    skip -= size
+                    continue
+                page = collection.get(
+                    include=include,
+                    limit=remaining if remaining is not None else size - skip,
+                    offset=skip,
+                )
+                skip = 0
+                parts.append(page)
+                if remaining is not None:
+                    remaining -= len(page.get("ids") or [])
+        return self._concat(parts, include)
+
+    def upsert(self, ids: List[str], embeddings, metadatas: Optional[List[Dict[str, Any]]] = None, documents: Optional[List[str]] = None) -> None:
+        for shard, positions in self._group(ids, _pmid_of).items():
+            kwargs: Dict[str, Any] = {
+                "ids": [ids[i] for i in positions],
+                "embeddings": [embeddings[i] for i in positions],
+            }
+            if metadatas is not None:
+                kwargs["metadatas"] = [metadatas[i] for i in positions]
+            if documents is not None:
+                kwargs["documents"] = [documents[i] for i in positions]
+            self.collection(shard).upsert(**kwargs)
+
+    def delete(self, ids: List[str]) -> None:
+        for shard, positions in self._group(ids or [], _pmid_of).items():
+            self.collection(shard).delete(ids=[ids[i] for i in positions])
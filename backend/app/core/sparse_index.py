@@ -0,0 +1,299 @@
+# app/core/sparse_index.py
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+import weakref
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Keeps gene/drug symbols intact: "APOE4" -> "apoe4", "IL-6" -> "il-6", "TNF-alpha" -> "tnf-alpha"
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in into is it its of on or that the their this to was were "
+    "which with we our these those than then there been between during after before via within without".split()
+)
+
+CURRENT_POINTER = "CURRENT"
+# Postings a BM25 build keeps in memory before spilling a sorted run to disk
+SPARSE_SPILL_POSTINGS = int(os.getenv("SPARSE_SPILL_POSTINGS", "5000000"))
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_RE.findall((text or "").lower()) if t not in STOPWORDS]
+
+
+class SparseIndex:
+    """
+    Read-only BM25 index over PMID documents.
+    Postings are stored as flat NumPy arrays (doc ids + term frequencies, grouped
+    by term) and opened with mmap, so workers share the OS page cache.
+    """
+
+    def __init__(self, path: Path, k1: float = 1.2, b: float = 0.75):
+        self.path = Path(path)
+        with open(self.path / "meta.json", encoding="utf-8") as fh:
+            meta = json.load(fh)
+        with open(self.path / "vocab.json", encoding="utf-8") as fh:
+            # term -> [offset, document frequency]
+            self.vocab: Dict[str, List[int]] = json.load(fh)
+        with open(self.path / "pmids.json", encoding="utf-8") as fh:
+            self.pmids: List[str] = json.load(fh)
+        self.doc_ids = np.load(self.path / "postings_docs.npy", mmap_mode="r")
+        self.tfs = np.load(self.path / "postings_tf.npy", mmap_mode="r")
+        self.doc_len = np.load(self.path / "doc_len.npy", mmap_mode="r")
+        self.num_docs = int(meta["num_docs"])
+        self.avgdl = float(meta["avgdl"]) or 1.0
+        self.version = meta.get("version")
+        self.k1 = k1
+        self.b = b
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """Return [(pmid, bm25 score)] for the top-k documents."""
+        terms = set(tokenize(query))
+        doc_chunks, score_chunks = [], []
+        for term in terms:
+            entry = self.vocab.get(term)
+            if not entry:
+                continue
+            offset, df = entry
+            docs = np.asarray(self.doc_ids[offset:offset + df])
+            tf = np.asarray(self.tfs[offset:offset + df], dtype=np.float32)
+            idf = math.log(1.0 + (self.num_docs - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * np.asarray(self.doc_len[docs], dtype=np.float32) / self.avgdl)
+            doc_chunks.append(docs)
+            score_chunks.append(idf * tf * (self.k1 + 1.0) / (tf + norm))
+        if not doc_chunks:
+            return []
+
+        docs = np.concatenate(doc_chunks)
+        scores = np.concatenate(score_chunks)
+        unique_docs, inverse = np.unique(docs, return_inverse=True)
+        totals = np.bincount(inverse, weights=scores)
+        k = min(k, len(unique_docs))
+        top = np.argpartition(-totals, k - 1)[:k]
+        top = top[np.argsort(-totals[top])]
+        return [(self.pmids[int(unique_docs[i])], float(totals[i])) for i in top]
+
+
+class SparseIndexBuilder:
+    """
+    Accumulates BM25 postings from streamed (pmid, title, abstract, ...) rows.
+    Postings are held in memory only up to spill_postings; past that the run is
+    written to a temporary directory, and write() merges the runs term by term,
+    so a build's memory stays bounded by the chunk size, not the corpus.
+    """
+
+    def __init__(self, spill_postings: int = SPARSE_SPILL_POSTINGS):
+        self._doc_index: Dict[str, int] = {}
+        self.pmids: List[str] = []
+        self.doc_len = array("I")
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._pending = 0
+        self.spill_postings = spill_postings
+        self._spill_dir: Optional[Path] = None
+        self._runs: List[Path] = []
+        # Doc ids superseded by a later row with the same PMID (dropped on write)
+        self._dead: set = set()
+
+    @property
+    def num_docs(self) -> int:
+        """Distinct PMIDs added so far."""
+        return len(self._doc_index)
+
+    def add(self, rows: Iterable[Sequence[str]]) -> None:
+        for row in rows:
+            pmid, title, abstract = row[0], row[1], row[2]
+            if pmid in self._doc_index:
+                # Later rows win, as in the vector index
+                self._dead.add(self._doc_index[pmid])
+            doc_id = len(self.pmids)
+            self._doc_index[pmid] = doc_id
+            self.pmids.append(pmid)
+            counts = Counter(tokenize(f"{title} {abstract}"))
+            self.doc_len.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = (array("I"), array("H"))
+                    self._postings[term] = postings
+                postings[0].append(doc_id)
+                postings[1].append(min(tf, 65535))
+            self._pending += len(counts)
+        if self._pending >= self.spill_postings:
+            self._spill()
+
+    def _spill(self) -> None:
+        """Write the in-memory postings as a term-sorted run and start a new one."""
+        if self._spill_dir is None:
+            self._spill_dir = Path(tempfile.mkdtemp(prefix="bm25-build-"))
+            # Cancelled or failed builds never reach write(); remove the runs with the builder
+            weakref.finalize(self, shutil.rmtree, str(self._spill_dir), True)
+        run = self._spill_dir / f"run-{len(self._runs):04d}"
+        run.mkdir()
+        terms = sorted(self._postings)
+        lengths = np.fromiter((len(self._postings[t][0]) for t in terms), dtype=np.int64, count=len(terms))
+        offsets = np.concatenate(([0], np.cumsum(lengths)))
+        with open(run / "docs.bin", "wb") as docs_fh, open(run / "tf.bin", "wb") as tf_fh:
+            for term in terms:
+                self._postings[term][0].tofile(docs_fh)
+                self._postings[term][1].tofile(tf_fh)
+        np.save(run / "offsets.npy", offsets)
+        with open(run / "terms.json", "w", encoding="utf-8") as fh:
+            json.dump(terms, fh)
+        self._runs.append(run)
+        self._postings = {}
+        self._pending = 0
+
+    @staticmethod
+    def _open_run(run: Path):
+        """{term: (start, end)} plus the run's doc id and tf arrays (mmap)."""
+        with open(run / "terms.json", encoding="utf-8") as fh:
+            terms = json.load(fh)
+        offsets = np.load(run / "offsets.npy")
+        index = {term: (int(offsets[i]), int(offsets[i + 1])) for i, term in enumerate(terms)}
+        if not offsets[-1]:
+            return index, np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.uint16)
+        return index, np.memmap(run / "docs.bin", dtype=np.uint32, mode="r"), np.memmap(run / "tf.bin", dtype=np.uint16, mode="r")
+
+    def write(self, path: Path) -> None:
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        if self._runs and self._postings:
+            self._spill()
+        if self._runs:
+            runs = [self._open_run(run) for run in self._runs]
+        else:
+            # Small build: merge straight from memory
+            runs = [(
+                {term: (0, len(p[0])) for term, p in self._postings.items()},
+                None,
+                None,
+            )]
+
+        # Compact doc ids to the live rows: superseded rows leave no trace in the index
+        live = np.ones(len(self.pmids), dtype=bool)
+        if self._dead:
+            live[np.fromiter(self._dead, dtype=np.int64)] = False
+        remap = np.cumsum(live, dtype=np.int64) - 1
+        remap[~live] = -1
+        pmids = [pmid for pmid, alive in zip(self.pmids, live) if alive]
+        doc_len = np.frombuffer(self.doc_len, dtype=np.uint32)[live] if len(self.doc_len) else np.zeros(0, dtype=np.uint32)
+
+        vocab: Dict[str, List[int]] = {}
+        total = 0
+        docs_bin, tf_bin = path / "postings_docs.bin", path / "postings_tf.bin"
+        with open(docs_bin, "wb") as docs_fh, open(tf_bin, "wb") as tf_fh:
+            for term in sorted(set().union(*(index for index, _, _ in runs))):
+                doc_parts, tf_parts = [], []
+                # Runs are in insertion order, so doc ids stay ascending per term
+                for index, run_docs, run_tfs in runs:
+                    span = index.get(term)
+                    if span is None:
+                        continue
+                    if run_docs is None:
+                        doc_parts.append(np.frombuffer(self._postings[term][0], dtype=np.uint32))
+                        tf_parts.append(np.frombuffer(self._postings[term][1], dtype=np.uint16))
+                    else:
+                        doc_parts.append(np.asarray(run_docs[span[0]:span[1]]))
+                        tf_parts.append(np.asarray(run_tfs[span[0]:span[1]]))
+                docs = remap[np.concatenate(doc_parts)]
+                tf = np.concatenate(tf_parts)
+                keep = docs >= 0
+                docs, tf = docs[keep].astype(np.uint32), tf[keep]
+                n = len(docs)
+                if not n:
+                    continue
+                docs.tofile(docs_fh)
+                tf.tofile(tf_fh)
+                vocab[term] = [total, n]
+                total += n
+
+        # .npy files (mmap-loaded by SparseIndex) written from the merged runs without loading them
+        for raw, name, dtype in ((docs_bin, "postings_docs.npy", np.uint32), (tf_bin, "postings_tf.npy", np.uint16)):
+            values = np.memmap(raw, dtype=dtype, mode="r") if total else np.zeros(0, dtype=dtype)
+            np.save(path / name, values)
+            del values
+            raw.unlink()
+        np.save(path / "doc_len.npy", doc_len)
+        with open(path / "vocab.json", "w", encoding="utf-8") as fh:
+            json.dump(vocab, fh)
+        with open(path / "pmids.json", "w", encoding="utf-8") as fh:
+            json.dump(pmids, fh)
+        with open(path / "meta.json", "w", encoding="utf-8") as fh:
+            json.dump({
+                "num_docs": len(pmids),
+                "avgdl": float(doc_len.mean()) if len(doc_len) else 0.0,
+                "num_terms": len(vocab),
+                "num_postings": total,
+                "version": path.name,
+            }, fh)
+        if self._spill_dir is not None:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+
+
+class SparseIndexStore:
+    """
+    Versioned on-disk location of the BM25 index (next to chroma_db):
+    <root>/<version>/... plus a CURRENT pointer swapped with an atomic rename.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def load(self) -> Optional[SparseIndex]:
+        pointer = self.root / CURRENT_POINTER
+        if not pointer.exists():
+            return None
+        path = self.root / pointer.read_text().strip()
+        try:
+            index = SparseIndex(path)
+            logger.info("Loaded BM25 index from %s (%d docs)", path, index.num_docs)
+            return index
+        except Exception as e:
+            logger.warning("Could not load BM25 index from %s: %s", path, e)
+            return None
+
+    def publish(self, builder: SparseIndexBuilder, keep: int = 2) -> SparseIndex:
+        """
+        Write a new version, point CURRENT at it and drop all but the `keep` newest
+        versions (other workers may still be reading the previous ones).
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        pointer = self.root / CURRENT_POINTER
+        previous = pointer.read_text().strip() if pointer.exists() else None
+        version = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        builder.write(self.root / version)
+        pointer_tmp = self.root / f"{CURRENT_POINTER}.tmp"
+        pointer_tmp.write_text(version)
+        os.replace(pointer_tmp, pointer)
+        # Version names start with their build time, so they sort oldest to newest
+        versions = sorted(item.name for item in self.root.iterdir() if item.is_dir())
+        for name in versions[:-max(2, keep)]:
+            if name not in {version, previous}:
+                shutil.rmtree(self.root / name, ignore_errors=True)
+        return SparseIndex(self.root / version)
+
+
+def reciprocal_rank_fusion(
+    rankings: Iterable[Sequence[str]], k: int = 60, weights: Optional[Sequence[float]] = None
+) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists: score(id) = sum over lists of weight / (k + rank) (weight 1 by default)."""
+    scores: Dict[str, float] = {}
+    for i, ranking in enumerate(rankings):
+        weight = weights[i] if weights is not None else 1.0
+        for rank, item_id in enumerate(ranking, start=1):
+            scores[item_id] = scores.get(item_id, 0.0) + weight / (k + rank)
+    return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
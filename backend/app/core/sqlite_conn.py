@@ -0,0 +1,39 @@
+# app/core/sqlite_conn.py
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List
+
+
+class ThreadLocalSQLite:
+    """
+    One sqlite3 connection per thread (a connection is not shareable across
+    threads), opened on first use in WAL mode. Every connection is tracked, so
+    close() releases all of them on shutdown; a thread that uses the database
+    after close() opens a fresh one.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
+
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # check_same_thread=False only so close() may run on another thread
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self) -> None:
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._local = threading.local()
+        for conn in connections:
+            conn.close()
@@ -0,0 +1,76 @@
+# app/core/stage_dag.py
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+StageFunc = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+class StageDAG:
+    """
+    Minimal async stage-DAG executor.
+     - each stage is an async callable receiving the results of the stages before it
+     - a stage starts as soon as all of its dependencies have finished
+     - wall-clock time per stage is recorded in `timings` (milliseconds)
+    A stage that raises cancels the rest of the run and the exception propagates;
+    stages that may fail softly should catch their own errors and return a fallback.
+    """
+
+    def __init__(self):
+        self._stages: Dict[str, StageFunc] = {}
+        self._deps: Dict[str, List[str]] = {}
+        self.timings: Dict[str, float] = {}
+
+    def add(self, name: str, func: StageFunc, deps: Iterable[str] = ()) -> "StageDAG":
+        if name in self._stages:
+            raise ValueError(f"Stage '{name}' already registered")
+        deps = list(deps)
+        for dep in deps:
+            if dep not in self._stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dep}'")
+        self._stages[name] = func
+        self._deps[name] = deps
+        return self
+
+    async def run(self) -> Dict[str, Any]:
+        """Run every stage, overlapping independent ones. Returns {stage name: result}."""
+        results: Dict[str, Any] = {}
+        tasks: Dict[str, asyncio.Task] = {}
+        start = time.perf_counter()
+
+        async def run_stage(name: str) -> Any:
+            deps = self._deps[name]
+            if deps:
+                await asyncio.gather(*(tasks[d] for d in deps))
+            stage_start = time.perf_counter()
+            try:
+                result = await self._stages[name]({d: results[d] for d in results})
+            finally:
+                self.timings[name] = (time.perf_counter() - stage_start) * 1000
+            results[name] = result
+            return result
+
+        # Stages are registered after their dependencies, so creation order is topological
+        for name in self._stages:
+            tasks[name] = asyncio.create_task(run_stage(name))
+
+        try:
+            await asyncio.gather(*tasks.values())
+        except Exception:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        finally:
+            self.timings["total"] = (time.perf_counter() - start) * 1000
+        return results
+
+    def format_timings(self, order: Optional[Iterable[str]] = None) -> str:
+        """Human-readable 'stage=12ms' summary used in response notes."""
+        names = list(order) if order is not None else list(self.timings)
+        parts = [f"{n}={self.timings[n]:.0f}ms" for n in names if n in self.timings]
+        return ", ".join(parts)
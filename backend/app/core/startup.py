@@ -0,0 +1,94 @@
+# app/core/startup.py
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def warmup_enabled() -> bool:
+    return os.getenv("WARMUP_ON_STARTUP", "1").lower() not in {"0", "false", "no"}
+
+
+class StartupProfile:
+    """Wall-clock time of each import/init step of this worker, plus warm-up readiness."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.ready_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self._steps: List[Dict[str, Any]] = []
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    def record(self, name: str, ms: float, status: str = "ok") -> None:
+        with self._lock:
+            self._steps.append({"step": name, "ms": round(ms, 1), "status": status})
+
+    @contextmanager
+    def step(self, name: str):
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            yield
+        except BaseException:
+            status = "failed"
+            raise
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000, status)
+
+    def mark_ready(self) -> None:
+        self.ready_at = time.time()
+        self._ready.set()
+
+    def is_ready(self) -> bool:
+        return self._ready.is_set()
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            steps = list(self._steps)
+        return {
+            "ready": self.is_ready(),
+            "seconds_to_ready": round(self.ready_at - self.started_at, 2) if self.ready_at else None,
+            "error": self.error,
+            "steps": steps,
+        }
+
+
+# Per-process profile; the registry records its lazy imports here too
+startup_profile = StartupProfile()
+
+
+def warm_up(registry: Any) -> None:
+    """
+    Create the shared pipelines, run a dummy encode/search and precompute the KG
+    adjacency, so the first real request does not pay for imports, model loading,
+    tokenizer warm-up or the KG scan.
+    The worker reports ready once this finishes (also when a step failed: the
+    pipelines then initialize lazily on first use, as without warm-up).
+    """
+    try:
+        rag = registry.rag()
+        with startup_profile.step("warm-up query encode"):
+            rag.query_encoder.embed_query("warm-up query")
+        if rag.is_ready():
+            with startup_profile.step("warm-up vector search"):
+                rag.retrieve("warm-up query", k=1)
+        registry.llm()
+        registry.kg()
+        with startup_profile.step("load KG adjacency"):
+            registry.kg_adjacency()
+    except Exception as e:
+        logger.exception("Warm-up failed: %s", e)
+        startup_profile.error = str(e)
+    finally:
+        startup_profile.mark_ready()
+        logger.info(
+            "Worker ready after %.1fs: %s",
+            startup_profile.ready_at - startup_profile.started_at,
+            ", ".join(f"{s['step']}={s['ms']:.0f}ms" for s in startup_profile.to_dict()["steps"]),
+        )
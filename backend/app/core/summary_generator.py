@@ -3,42 +3,18 @@ import logging
 from typing import List
 from langchain.schema import HumanMessage, SystemMessage
 from app.models.schema import EvidenceItem, SummarySection
+from app.core.prompt_template import SUMMARY_SYSTEM_PROMPT
 
 logger = logging.getLogger(__name__)
 
-SUMMARY_SYSTEM_PROMPT = """You are a biomedical research analyst. Create a concise summary of research papers.
-
-Your task is to analyze the retrieved PubMed papers and provide a structured summary.
-
-Return a JSON object with this structure:
-{
-  "overview": "Brief 2-3 sentence overview of the main research theme",
-  "key_findings": [
-    "Finding 1 from the papers",
-    "Finding 2 from the papers", 
-    "Finding 3 from the papers"
-  ],
-  "knowledge_gaps": [
-    "Gap 1 identified in the literature",
-    "Gap 2 identified in the literature"
-  ],
-  "implications": "1-2 sentences about research implications"
-}
-
-Guidelines:
-- Focus on the most important findings across all papers
-- Identify genuine research gaps, not just general statements
-- Keep findings specific and evidence-based
-- Maximum 5 key findings and 3 knowledge gaps
-- Be concise but informative
-"""
 
 class SummaryGenerator:
-    def __init__(self, llm):
+    def __init__(self, llm, cache=None):
         self.llm = llm
+        self.cache = cache
     
-    def generate_summary(self, query: str, evidence: List[EvidenceItem]) -> SummarySection:
-        """Generate research summary from retrieved evidence."""
+    def generate_summary(self, query: str, evidence: List[EvidenceItem], temperature: float = 0.0) -> SummarySection:
+        """Generate research summary from retrieved evidence, at the request's temperature."""
         if not evidence:
             return self._create_empty_summary(query)
         
@@ -67,8 +43,15 @@ class SummaryGenerator:
             ]
             
             if self.llm and hasattr(self.llm, 'invoke'):
-                response = self.llm.invoke(messages)
-                response_content = getattr(response, "content", str(response))
+                cache_key, response_content = self.cache.lookup(self.llm, messages, temperature) if self.cache else (None, None)
+                if response_content is None:
+                    # Bound per call, like LLMAgent._invoke: the client is shared by concurrent requests
+                    llm = self.llm.bind(temperature=temperature) if hasattr(self.llm, "bind") else self.llm
+                    response = llm.invoke(messages)
+                    response_content = getattr(response, "content", str(response))
+                else:
+                    cache_key = None
+                raw_content = response_content
                 
                 # Extract JSON from response
                 import json
@@ -82,7 +65,10 @@ class SummaryGenerator:
                 
                 # Parse JSON
                 summary_data = json.loads(response_content)
-                return SummarySection(**summary_data)
+                summary = SummarySection(**summary_data)
+                if cache_key:
+                    self.cache.put(cache_key, raw_content, self.cache.model_name(self.llm))
+                return summary
                 
             else:
                 return self._create_fallback_summary(query, evidence)
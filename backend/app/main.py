@@ -1,11 +1,43 @@
+import asyncio
+import time
+
+_import_start = time.perf_counter()
+
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from .routers import hypothesis, retriever, kg
+from fastapi.responses import JSONResponse
+from .routers import hypothesis, retriever, kg, admin
+from app.core.registry import pipelines
+from app.core.executors import shutdown_executors
+from app.core.startup import startup_profile, warm_up, warmup_enabled
 from fastapi.templating import Jinja2Templates
+
+startup_profile.record("import app.main (routers)", (time.perf_counter() - _import_start) * 1000)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One set of pipelines per process, shared by every router
+    app.state.pipelines = pipelines
+    # Warm up in the background: /health answers at once, /ready only after warm-up
+    warmup_task = None
+    if warmup_enabled():
+        warmup_task = asyncio.create_task(asyncio.to_thread(warm_up, pipelines))
+    else:
+        startup_profile.mark_ready()
+    yield
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    shutdown_executors()
+    pipelines.close()
+
+
 app = FastAPI(
     title="AI Research Assistant API",
     description="Autonomous hypothesis generation system for biomedical research",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 template = Jinja2Templates("E:/autonomus ai agent/frontend")
 # CORS middleware
@@ -27,6 +59,7 @@ app.add_middleware(
 app.include_router(hypothesis.router)
 app.include_router(retriever.router)
 app.include_router(kg.router)
+app.include_router(admin.router)
 
 @app.get("/")
 async def root(request:Request):
@@ -36,3 +69,9 @@ async def root(request:Request):
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 503 until the startup warm-up (model load + dummy encode) has finished."""
+    profile = startup_profile.to_dict()
+    return JSONResponse(status_code=200 if profile["ready"] else 503, content=profile)
+
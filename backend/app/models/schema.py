@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, PrivateAttr
+from typing import List, Literal, Optional, Dict, Any
 from enum import Enum
 
 class HypothesisType(str, Enum):
@@ -52,9 +52,17 @@ class Hypothesis(BaseModel):
 class QueryRequest(BaseModel):
     query: str = Field(..., description="Research query")
     seeded_input: Optional[str] = Field(None, description="Optional seed PMID or text")
+    seed_weight: Optional[float] = Field(None, ge=0.0, le=1.0, description="When seeded_input is an indexed PMID, weight of its vector blended with the query embedding (SEED_WEIGHT setting, 0.5 by default, if omitted)")
     top_k: int = Field(5, ge=1, le=20, description="Number of papers to retrieve")
     creative_mode: bool = Field(False, description="Enable creative/analogy mode")
     temperature: float = Field(0.0, ge=0.0, le=1.0, description="LLM temperature")
+    kg_title_pass: bool = Field(True, description="Run a second KG lookup on tokens from the top evidence titles")
+    retrieval_mode: Literal["dense", "sparse", "hybrid"] = Field("dense", description="dense (embeddings), sparse (BM25) or hybrid (rank fusion of both)")
+    diversify: bool = Field(False, description="Re-rank retrieved papers for diversity (MMR) instead of pure similarity")
+    rerank: bool = Field(False, description="Re-score retrieved candidates with a cross-encoder and keep the top_k best")
+    rerank_candidates: int = Field(20, ge=1, le=100, description="Candidates retrieved before cross-encoder re-ranking")
+    corpus: Optional[str] = Field(None, description="Named corpus to retrieve from (default corpus if omitted)")
+    kg_expand: bool = Field(False, description="Also search 1-hop KG neighbours of entities in the query and fuse the results (diversify and seeded_input do not apply)")
 
 class HypothesisResponse(BaseModel):
     query: str = Field(..., description="Original query")
@@ -63,6 +71,12 @@ class HypothesisResponse(BaseModel):
     evidence: List[EvidenceItem] = Field(default_factory=list, description="Retrieved evidence")
     kg_triples: List[KGTriple] = Field(default_factory=list, description="Knowledge graph triples")
     note: Optional[str] = Field(None, description="Optional note")
+    # Set by LLMAgent when the hypotheses come from the template fallback, not the LLM (not serialized)
+    _llm_fallback: bool = PrivateAttr(default=False)
+
+    @property
+    def llm_fallback(self) -> bool:
+        return self._llm_fallback
 
 class StatusResponse(BaseModel):
     pubmed_loaded: bool = Field(..., description="PubMed data status")
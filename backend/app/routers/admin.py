@@ -0,0 +1,70 @@
+# app/routers/admin.py
+import logging
+
+from fastapi import APIRouter, HTTPException
+
+from app.core.executors import run_in_pool
+from app.core.llm_cache import get_llm_cache
+from app.core.registry import pipelines
+from app.core.startup import startup_profile
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+router = APIRouter(prefix="/api/admin", tags=["admin"])
+
+
+@router.get("/llm-cache")
+async def llm_cache_stats():
+    """Hit/miss counters and size of the persistent LLM response cache."""
+    cache = get_llm_cache()
+    if cache is None:
+        return {"enabled": False}
+    try:
+        stats = await run_in_pool("llm", cache.stats)
+        return {"enabled": True, **stats}
+    except Exception as e:
+        logger.exception("Failed to read LLM cache stats: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.delete("/llm-cache")
+async def purge_llm_cache():
+    """
+    Drop every cached LLM response.
+    Call this after editing the prompts in app/core/prompt_template.py.
+    """
+    cache = get_llm_cache()
+    if cache is None:
+        raise HTTPException(status_code=404, detail="LLM cache is disabled (LLM_CACHE_ENABLED=0)")
+    try:
+        removed = await run_in_pool("llm", cache.purge)
+        return {"message": "LLM cache purged", "removed": removed}
+    except Exception as e:
+        logger.exception("Failed to purge LLM cache: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/semantic-cache")
+async def semantic_cache_stats():
+    """Stats of the in-memory semantic cache in front of /api/hypothesis/generate (this worker only)."""
+    cache = pipelines.semantic_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+
+@router.delete("/semantic-cache")
+async def clear_semantic_cache():
+    """Drop every cached HypothesisResponse in this worker."""
+    cache = pipelines.semantic_cache()
+    if cache is None:
+        raise HTTPException(status_code=404, detail="Semantic cache is disabled (SEMANTIC_CACHE_ENABLED=0)")
+    cache.clear()
+    return {"message": "Semantic cache cleared"}
+
+
+@router.get("/startup-profile")
+async def startup_profile_report():
+    """Time per import/init/warm-up step of this worker (track cold-start regressions)."""
+    return startup_profile.to_dict()
@@ -1,15 +1,15 @@
 # app/routers/hypothesis.py
+import json
 import logging
-from typing import List, Optional, Any, Dict
-from pathlib import Path
+from typing import List, Optional, Any, Dict, Tuple
 
 from fastapi import APIRouter, HTTPException
 
-# Import your existing pipelines
-from app.core.rag_pipeline import RAGPipeline
-from app.core.kg_pipeline import KGPipeline
-from app.core.llm_agent import LLMAgent
-from app.core.summary_generator import SummaryGenerator
+# Shared pipelines (created lazily, once per process)
+from app.core.corpora import DEFAULT_CORPUS, CorpusNotFound
+from app.core.registry import pipelines
+from app.core.executors import run_in_pool
+from app.core.stage_dag import StageDAG
 from app.models.schema import (
     QueryRequest, HypothesisResponse, EvidenceItem, KGTriple, 
     Hypothesis, SuggestedExperiment, HypothesisType, Plausibility,
@@ -21,25 +21,6 @@ logger.setLevel(logging.INFO)
 
 router = APIRouter(prefix="/api/hypothesis", tags=["hypothesis"])
 
-# Initialize pipelines
-VECTOR_DIR = Path("chroma_db")
-try:
-    rag_pipeline = RAGPipeline(chroma_dir=VECTOR_DIR)
-except Exception:
-    rag_pipeline = RAGPipeline(chroma_dir=VECTOR_DIR)
-
-try:
-    kg_pipeline = KGPipeline()
-except Exception:
-    kg_pipeline = KGPipeline()
-
-# Initialize LLM Agent
-try:
-    llm_agent = LLMAgent()
-except Exception as e:
-    logger.warning(f"LLM Agent initialization failed: {e}")
-    llm_agent = None
-
 # -------------------------
 # Helper utilities
 # -------------------------
@@ -51,6 +32,92 @@ def get_field(item: Any, field: str, default: Any = None) -> Any:
         return item.get(field, default)
     return getattr(item, field, default)
 
+def to_evidence_items(raw_results: Any) -> Tuple[List[EvidenceItem], int]:
+    """Convert raw retriever hits into EvidenceItem; returns (items, skipped count)."""
+    evidence_out: List[EvidenceItem] = []
+    missing_pmid_count = 0
+
+    for item in raw_results or []:
+        pmid = get_field(item, "pmid")
+        title = get_field(item, "title", "")
+        snippet = get_field(item, "snippet", "")
+        score = get_field(item, "score", None)
+        source = get_field(item, "source", "pubmed")
+
+        if not pmid or str(pmid).strip() == "":
+            missing_pmid_count += 1
+            continue
+
+        pmid = str(pmid)
+        try:
+            evidence_out.append(EvidenceItem(
+                pmid=pmid, 
+                title=title or "No title", 
+                snippet=snippet or "No snippet", 
+                score=score, 
+                source=source
+            ))
+        except Exception as e:
+            logger.debug("Failed to append evidence item: %s", e)
+            missing_pmid_count += 1
+            continue
+
+    return evidence_out, missing_pmid_count
+
+def dedupe_entities(entities: List[str]) -> List[str]:
+    """Case-insensitive de-duplication preserving order."""
+    seen = set()
+    entities_unique = []
+    for e in entities:
+        key = e.lower()
+        if key not in seen:
+            seen.add(key)
+            entities_unique.append(e)
+    return entities_unique
+
+def to_kg_triples(raw_triples: Any) -> List[KGTriple]:
+    """Convert raw KG rows (dicts or objects) into KGTriple, skipping invalid ones."""
+    kg_triples_out: List[KGTriple] = []
+    for t in raw_triples or []:
+        subj = get_field(t, "subject", "") or ""
+        rel = get_field(t, "relation", "") or ""
+        obj = get_field(t, "object", "") or ""
+        pmids = get_field(t, "supporting_pmids", []) or []
+
+        pmids_list = [str(x) for x in pmids if x]
+        try:
+            kg_triples_out.append(KGTriple(
+                subject=subj, 
+                relation=rel, 
+                object=obj, 
+                supporting_pmids=pmids_list
+            ))
+        except Exception:
+            logger.debug("Invalid KG triple skipped: %r", t)
+    return kg_triples_out
+
+async def query_kg_triples(kg_pipeline: Any, query: str, entities: List[str], limit: int = 10) -> List[KGTriple]:
+    """Run a KG lookup on the kg pool; errors degrade to an empty list."""
+    try:
+        raw_triples = await run_in_pool("kg", kg_pipeline.query_kg, query=query, limit=limit, entities=entities or None)
+        return to_kg_triples(raw_triples)
+    except Exception as e:
+        logger.exception("Error querying KG: %s", e)
+        return []
+
+def merge_kg_triples(*groups: List[KGTriple], limit: int = 10) -> List[KGTriple]:
+    """Merge KG passes, dropping duplicate (subject, relation, object) triples."""
+    merged: List[KGTriple] = []
+    seen = set()
+    for group in groups:
+        for t in group or []:
+            key = (t.subject.lower(), t.relation.lower(), t.object.lower())
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append(t)
+    return merged[:limit]
+
 def create_fallback_hypothesis(query: str, evidence: List[EvidenceItem], kg_triples: List[KGTriple]) -> List[Hypothesis]:
     """Create basic hypothesis structure from available evidence."""
     hypotheses = []
@@ -104,9 +171,15 @@ def create_fallback_summary(query: str, evidence: List[EvidenceItem]) -> Summary
 async def hypothesis_status():
     """Status/health for hypothesis pipeline."""
     try:
+        # The first resolution loads models / connects to Neo4j, and is_ready() may
+        # reload a newer published index: keep both off the event loop
+        rag_pipeline = await run_in_pool("retrieval", pipelines.rag)
+        kg_pipeline = await run_in_pool("kg", pipelines.kg)
+        llm_agent = await run_in_pool("llm", pipelines.llm)
+
         vs_ready = False
         try:
-            vs_ready = bool(getattr(rag_pipeline, "is_ready", lambda: False)())
+            vs_ready = bool(await run_in_pool("retrieval", getattr(rag_pipeline, "is_ready", lambda: False)))
         except Exception as e:
             logger.debug("Vector store status check failed: %s", e)
             vs_ready = False
@@ -145,9 +218,17 @@ async def generate_hypothesis(payload: QueryRequest):
     if not query:
         raise HTTPException(status_code=400, detail="Query must not be empty.")
 
-    # Ensure vector store is ready
+    # Resolved on the pools: the first use loads models, opens the corpus or connects to Neo4j
+    try:
+        rag_pipeline = await run_in_pool("retrieval", pipelines.corpus, payload.corpus)
+    except CorpusNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    kg_pipeline = await run_in_pool("kg", pipelines.kg)
+    llm_agent = await run_in_pool("llm", pipelines.llm)
+
+    # Ensure vector store is ready (may reload a build published by another worker)
     try:
-        if not getattr(rag_pipeline, "is_ready", lambda: False)():
+        if not await run_in_pool("retrieval", getattr(rag_pipeline, "is_ready", lambda: False)):
             logger.error("Vector store is not ready")
             raise HTTPException(status_code=503, detail="Vector store not ready. Build the index first.")
     except HTTPException:
@@ -156,127 +237,165 @@ async def generate_hypothesis(payload: QueryRequest):
         logger.exception("Error checking vector store readiness: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error checking vector store")
 
-    # 1) Retrieve evidence
-    try:
-        raw_results = rag_pipeline.retrieve(query=query, k=payload.top_k)
-    except Exception as e:
-        logger.exception("Error during vector retrieval: %s", e)
-        raise HTTPException(status_code=500, detail=f"Retrieval error: {str(e)}")
+    # Semantic cache: a paraphrase of an earlier query (same request options, same
+    # index version) returns the stored response without retrieval, KG or LLM calls.
+    # Only deterministic (temperature 0) responses are cached.
+    semantic_cache = pipelines.semantic_cache() if payload.temperature == 0.0 else None
+    params_key = json.dumps(payload.model_dump(exclude={"query"}), sort_keys=True, default=str)
+    # Each corpus has its own index version; a rebuild of one keeps the others' entries
+    cache_scope = payload.corpus or DEFAULT_CORPUS
+    query_vector = None
+    if semantic_cache is not None:
+        try:
+            query_vector = await run_in_pool("retrieval", rag_pipeline.embed_query, query)
+            hit = semantic_cache.lookup(query_vector, params_key, rag_pipeline.index_version, scope=cache_scope)
+            if hit is not None:
+                cached_response, cached_query, similarity = hit
+                return cached_response.model_copy(update={
+                    "query": query,
+                    "note": f"Semantic cache hit (similarity {similarity:.3f} to earlier query '{cached_query}'). {cached_response.note or ''}".strip()
+                })
+        except Exception as e:
+            logger.warning("Semantic cache lookup failed: %s", e)
+            query_vector = None
 
-    evidence_out: List[EvidenceItem] = []
-    missing_pmid_count = 0
+    # Stage DAG:
+    #   retrieve [--> rerank] --+--> kg_titles (optional) --+
+    #   kg_query ----|---------------------------+--> hypotheses
+    #                +--> summary (two-call mode only)
+    # The query-token KG lookup overlaps retrieval. In combined mode one LLM call
+    # returns both summary and hypotheses; otherwise the summary LLM call
+    # overlaps the hypothesis LLM call.
+    dag = StageDAG()
+    kg_ready = bool(getattr(kg_pipeline, "is_ready", lambda: False)())
+    combined = bool(llm_agent and llm_agent.is_ready() and getattr(llm_agent, "combined_mode", False))
+    q_tokens = dedupe_entities([t.strip() for t in query.split() if len(t) > 2][:6])
 
-    # Convert results into EvidenceItem
-    for item in raw_results or []:
-        pmid = get_field(item, "pmid")
-        title = get_field(item, "title", "")
-        snippet = get_field(item, "snippet", "")
-        score = get_field(item, "score", None)
-        source = get_field(item, "source", "pubmed")
+    # A numeric seed is treated as a PMID: its stored vector steers dense retrieval
+    seed = (payload.seeded_input or "").strip()
+    seed_pmid = seed if seed.isdigit() else None
 
-        if not pmid or str(pmid).strip() == "":
-            missing_pmid_count += 1
-            continue
+    # Later stages read the evidence from the last retrieval stage
+    evidence_stage = "rerank" if payload.rerank else "retrieve"
 
-        pmid = str(pmid)
+    # 1) Retrieve evidence (rerank_candidates of them when a re-rank stage follows)
+    async def retrieve_stage(results: Dict[str, Any]):
+        k = max(payload.top_k, payload.rerank_candidates) if payload.rerank else payload.top_k
         try:
-            evidence_out.append(EvidenceItem(
-                pmid=pmid, 
-                title=title or "No title", 
-                snippet=snippet or "No snippet", 
-                score=score, 
-                source=source
-            ))
+            if payload.kg_expand and not seed_pmid:
+                # 1-hop KG neighbours of the query's entities, searched alongside the query
+                adjacency = await run_in_pool("kg", pipelines.kg_adjacency)
+                expansions = adjacency.expand(query)
+                raw_results = await run_in_pool(
+                    "retrieval", rag_pipeline.retrieve_expanded,
+                    query=query, expansions=expansions, k=k, mode=payload.retrieval_mode
+                )
+            else:
+                raw_results = await run_in_pool(
+                    "retrieval", rag_pipeline.retrieve,
+                    query=query, k=k, mode=payload.retrieval_mode, mmr=payload.diversify,
+                    seed_pmid=seed_pmid, seed_weight=payload.seed_weight
+                )
         except Exception as e:
-            logger.debug("Failed to append evidence item: %s", e)
-            missing_pmid_count += 1
-            continue
+            logger.exception("Error during vector retrieval: %s", e)
+            raise HTTPException(status_code=500, detail=f"Retrieval error: {str(e)}")
+        return to_evidence_items(raw_results)
 
-    # 2) Query KG for related triples
-    kg_triples_out: List[KGTriple] = []
-    try:
+    # 1b) Optional cross-encoder re-rank of the candidates down to top_k
+    async def rerank_stage(results: Dict[str, Any]):
+        candidates, missing = results["retrieve"]
+        try:
+            reranked = await run_in_pool(
+                "retrieval", rag_pipeline.rerank, query, [ev.model_dump() for ev in candidates], payload.top_k
+            )
+            return to_evidence_items(reranked)[0], missing
+        except Exception as e:
+            logger.exception("Re-ranking failed; keeping retriever order: %s", e)
+            return candidates[:payload.top_k], missing
+
+    # 2a) Query KG on the query tokens (does not wait for retrieval)
+    async def kg_query_stage(results: Dict[str, Any]) -> List[KGTriple]:
+        if not kg_ready:
+            logger.info("KG pipeline not ready; skipping KG lookup.")
+            return []
+        return await query_kg_triples(kg_pipeline, query, q_tokens)
+
+    # 2b) Optional second KG pass on tokens from the top evidence titles
+    async def kg_titles_stage(results: Dict[str, Any]) -> List[KGTriple]:
+        evidence_out, _ = results[evidence_stage]
+        seen = {t.lower() for t in q_tokens}
         entities = []
-        q_tokens = [t.strip() for t in query.split() if len(t) > 2]
-        entities.extend(q_tokens[:6])
-        
         for ev in evidence_out[:3]:
             if ev.title:
                 title_tokens = [t.strip() for t in ev.title.split() if len(t) > 2]
-                entities.extend(title_tokens[:3])
-
-        # Dedupe entities
-        seen = set()
-        entities_unique = []
-        for e in entities:
-            key = e.lower()
-            if key not in seen:
-                seen.add(key)
-                entities_unique.append(e)
-
-        if getattr(kg_pipeline, "is_ready", lambda: False)():
-            raw_triples = kg_pipeline.query_kg(query=query, limit=10, entities=entities_unique or None)
-            for t in raw_triples or []:
-                if isinstance(t, dict):
-                    subj = t.get("subject", "") or ""
-                    rel = t.get("relation", "") or ""
-                    obj = t.get("object", "") or ""
-                    pmids = t.get("supporting_pmids", []) or []
-                else:
-                    subj = getattr(t, "subject", "") or ""
-                    rel = getattr(t, "relation", "") or ""
-                    obj = getattr(t, "object", "") or ""
-                    pmids = getattr(t, "supporting_pmids", []) or []
-
-                pmids_list = [str(x) for x in pmids if x]
-                try:
-                    kg_triples_out.append(KGTriple(
-                        subject=subj, 
-                        relation=rel, 
-                        object=obj, 
-                        supporting_pmids=pmids_list
-                    ))
-                except Exception:
-                    logger.debug("Invalid KG triple skipped: %r", t)
-        else:
-            logger.info("KG pipeline not ready; skipping KG lookup.")
-    except Exception as e:
-        logger.exception("Error querying KG: %s", e)
-        kg_triples_out = []
+                entities.extend(t for t in title_tokens[:3] if t.lower() not in seen)
+        entities = dedupe_entities(entities)
+        if not kg_ready or not entities:
+            return []
+        return await query_kg_triples(kg_pipeline, query, entities)
 
     # 3) Generate summary
-    summary_out = None
-    try:
-        if llm_agent:
-            summary_out = llm_agent.generate_summary(query, evidence_out)
-        else:
-            summary_out = create_fallback_summary(query, evidence_out)
-    except Exception as e:
-        logger.exception("Error generating summary: %s", e)
-        summary_out = create_fallback_summary(query, evidence_out)
+    async def summary_stage(results: Dict[str, Any]) -> SummarySection:
+        evidence_out, _ = results[evidence_stage]
+        try:
+            if llm_agent:
+                return await run_in_pool("llm", llm_agent.generate_summary, query, evidence_out, payload.temperature)
+            return create_fallback_summary(query, evidence_out)
+        except Exception as e:
+            logger.exception("Error generating summary: %s", e)
+            return create_fallback_summary(query, evidence_out)
 
     # 4) Generate hypotheses using LLM or fallback
-    hypotheses_out = []
-    note = f"Retrieved {len(evidence_out)} evidence items. {missing_pmid_count} items skipped due to missing pmid."
-
-    try:
-        if llm_agent and llm_agent.is_ready():
-            # Use LLM for hypothesis generation
-            llm_response = llm_agent.generate_hypothesis(payload, evidence_out, kg_triples_out)
-            hypotheses_out = llm_response.hypotheses
-            # Use the summary from LLM agent (it already generates one)
-            summary_out = llm_response.summary or summary_out
-            note = llm_response.note or note
-        else:
+    # Returns (hypotheses, kg triples, note, summary or None, whether the LLM produced the hypotheses)
+    async def hypotheses_stage(results: Dict[str, Any]):
+        evidence_out, _ = results[evidence_stage]
+        kg_triples_out = merge_kg_triples(results.get("kg_query", []), results.get("kg_titles", []))
+        note = None
+        try:
+            if combined:
+                # Single LLM call for summary + hypotheses (falls back to two calls internally)
+                llm_response = await run_in_pool("llm", llm_agent.generate_combined, payload, evidence_out, kg_triples_out)
+                return llm_response.hypotheses, kg_triples_out, llm_response.note, llm_response.summary, not llm_response.llm_fallback
+            if llm_agent and llm_agent.is_ready():
+                # The summary runs as its own concurrent stage
+                llm_response = await run_in_pool(
+                    "llm", llm_agent.generate_hypothesis, payload, evidence_out, kg_triples_out, include_summary=False
+                )
+                return llm_response.hypotheses, kg_triples_out, llm_response.note, None, not llm_response.llm_fallback
             # Fallback to basic hypothesis generation
-            hypotheses_out = create_fallback_hypothesis(query, evidence_out, kg_triples_out)
-            note += " Used fallback hypothesis generation (LLM not available)."
-            
-    except Exception as e:
-        logger.exception("Error in hypothesis generation: %s", e)
-        hypotheses_out = create_fallback_hypothesis(query, evidence_out, kg_triples_out)
-        note += f" Error in LLM generation: {str(e)}. Used fallback."
+            note = "Used fallback hypothesis generation (LLM not available)."
+        except Exception as e:
+            logger.exception("Error in hypothesis generation: %s", e)
+            note = f"Error in LLM generation: {str(e)}. Used fallback."
+        return create_fallback_hypothesis(query, evidence_out, kg_triples_out), kg_triples_out, note, None, False
 
-    return HypothesisResponse(
+    dag.add("retrieve", retrieve_stage)
+    if payload.rerank:
+        dag.add("rerank", rerank_stage, deps=["retrieve"])
+    dag.add("kg_query", kg_query_stage)
+    hypothesis_deps = [evidence_stage, "kg_query"]
+    if payload.kg_title_pass:
+        dag.add("kg_titles", kg_titles_stage, deps=[evidence_stage])
+        hypothesis_deps.append("kg_titles")
+    if not combined:
+        dag.add("summary", summary_stage, deps=[evidence_stage])
+    dag.add("hypotheses", hypotheses_stage, deps=hypothesis_deps)
+
+    results = await dag.run()
+
+    evidence_out, missing_pmid_count = results[evidence_stage]
+    hypotheses_out, kg_triples_out, llm_note, combined_summary, llm_succeeded = results["hypotheses"]
+    summary_out = combined_summary or results.get("summary") or create_fallback_summary(query, evidence_out)
+
+    note = f"Retrieved {len(evidence_out)} evidence items. {missing_pmid_count} items skipped due to missing pmid."
+    # The LLM's own note replaces the retrieval note; fallback notes are appended to it
+    if llm_note and llm_succeeded:
+        note = llm_note
+    elif llm_note:
+        note += f" {llm_note}"
+    note += f" Stage timings: {dag.format_timings(['retrieve', 'rerank', 'kg_query', 'kg_titles', 'summary', 'hypotheses', 'total'])}."
+
+    response = HypothesisResponse(
         query=query,
         summary=summary_out,
         hypotheses=hypotheses_out,
@@ -284,3 +403,8 @@ async def generate_hypothesis(payload: QueryRequest):
         kg_triples=kg_triples_out,
         note=note
     )
+
+    # Fallback answers (LLM unavailable or failed) are not worth serving again
+    if semantic_cache is not None and query_vector is not None and llm_succeeded:
+        semantic_cache.store(query_vector, params_key, rag_pipeline.index_version, query, response, scope=cache_scope)
+    return response
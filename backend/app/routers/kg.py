@@ -5,15 +5,18 @@ import logging
 import os
 
 from app.models.schema import KGTriple, KGQueryResponse  # ensure these pydantic models exist
-from app.core.kg_pipeline import KGPipeline
+from app.core.registry import pipelines
+from app.core.executors import run_in_pool
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 router = APIRouter(prefix="/api/kg", tags=["knowledge-graph"])
 
-# initialize pipeline (reads env vars)
-kg_pipeline = KGPipeline()
+
+async def get_kg_pipeline():
+    """Return the process-wide KG pipeline shared with the other routers (resolved on the "kg" pool: the first use connects to Neo4j)."""
+    return await run_in_pool("kg", pipelines.kg)
 
 
 @router.get("/query", response_model=KGQueryResponse)
@@ -23,11 +26,12 @@ async def query_kg(
     relation_type: Optional[str] = Query(None, description="Filter by relation type"),
     limit: int = Query(10, ge=1, le=100, description="Maximum number of triples to return")
 ):
+    kg_pipeline = await get_kg_pipeline()
     if not kg_pipeline.is_ready():
         raise HTTPException(status_code=503, detail="Knowledge Graph pipeline not ready. Please check Neo4j connection.")
     try:
         logger.info("KG Query: %s", query)
-        triples = kg_pipeline.query_kg(query=query, limit=limit)
+        triples = await run_in_pool("kg", kg_pipeline.query_kg, query=query, limit=limit)
         # apply optional filters
         if entity_type:
             triples = [t for t in triples if entity_type.lower() in (t.get("subject","").lower() or "") or entity_type.lower() in (t.get("object","").lower() or "")]
@@ -50,10 +54,11 @@ async def get_entities(
     search_term: Optional[str] = Query(None),
     limit: int = Query(20, ge=1, le=200)
 ):
+    kg_pipeline = await get_kg_pipeline()
     if not kg_pipeline.is_ready():
         raise HTTPException(status_code=503, detail="Knowledge Graph not available")
     try:
-        entities = kg_pipeline.get_entities(entity_type=entity_type, search_term=search_term, limit=limit)
+        entities = await run_in_pool("kg", kg_pipeline.get_entities, entity_type=entity_type, search_term=search_term, limit=limit)
         return {"entities": entities, "total_count": len(entities)}
     except Exception as e:
         logger.exception("Error retrieving entities: %s", e)
@@ -62,10 +67,11 @@ async def get_entities(
 
 @router.get("/relations", response_model=Dict[str, Any])
 async def get_relations(limit: int = Query(20, ge=1, le=200)):
+    kg_pipeline = await get_kg_pipeline()
     if not kg_pipeline.is_ready():
         raise HTTPException(status_code=503, detail="Knowledge Graph not available")
     try:
-        relations = kg_pipeline.get_relations(limit=limit)
+        relations = await run_in_pool("kg", kg_pipeline.get_relations, limit=limit)
         return {"relations": relations, "total_count": len(relations)}
     except Exception as e:
         logger.exception("Error retrieving relations: %s", e)
@@ -74,10 +80,11 @@ async def get_relations(limit: int = Query(20, ge=1, le=200)):
 
 @router.get("/neighborhood/{entity}", response_model=Dict[str, Any])
 async def get_entity_neighborhood(entity: str, hops: int = Query(1, ge=1, le=3), limit: int = Query(50)):
+    kg_pipeline = await get_kg_pipeline()
     if not kg_pipeline.is_ready():
         raise HTTPException(status_code=503, detail="Knowledge Graph not available")
     try:
-        nb = kg_pipeline.get_entity_neighborhood(entity=entity, hops=hops, limit=limit)
+        nb = await run_in_pool("kg", kg_pipeline.get_entity_neighborhood, entity=entity, hops=hops, limit=limit)
         return {"central_entity": entity, "hops": hops, "neighborhood": nb}
     except Exception as e:
         logger.exception("Error retrieving neighborhood: %s", e)
@@ -86,10 +93,11 @@ async def get_entity_neighborhood(entity: str, hops: int = Query(1, ge=1, le=3),
 
 @router.get("/path/{entity1}/{entity2}", response_model=Dict[str, Any])
 async def find_path_between_entities(entity1: str, entity2: str, max_path_length: int = Query(3, ge=1, le=5), limit: int = Query(5, ge=1, le=50)):
+    kg_pipeline = await get_kg_pipeline()
     if not kg_pipeline.is_ready():
         raise HTTPException(status_code=503, detail="Knowledge Graph not available")
     try:
-        paths = kg_pipeline.find_paths_between_entities(entity1=entity1, entity2=entity2, max_path_length=max_path_length, limit=limit)
+        paths = await run_in_pool("kg", kg_pipeline.find_paths_between_entities, entity1=entity1, entity2=entity2, max_path_length=max_path_length, limit=limit)
         return {"entity1": entity1, "entity2": entity2, "paths": paths}
     except Exception as e:
         logger.exception("Error finding paths: %s", e)
@@ -98,10 +106,11 @@ async def find_path_between_entities(entity1: str, entity2: str, max_path_length
 
 @router.get("/stats", response_model=Dict[str, Any])
 async def get_kg_statistics():
+    kg_pipeline = await get_kg_pipeline()
     if not kg_pipeline.is_ready():
         raise HTTPException(status_code=503, detail="Knowledge Graph not available")
     try:
-        stats = kg_pipeline.get_statistics()
+        stats = await run_in_pool("kg", kg_pipeline.get_statistics)
         return stats
     except Exception as e:
         logger.exception("Error retrieving KG statistics: %s", e)
@@ -110,8 +119,9 @@ async def get_kg_statistics():
 
 @router.get("/health")
 async def kg_health_check():
+    kg_pipeline = await get_kg_pipeline()
     try:
-        is_healthy = kg_pipeline.health_check()
+        is_healthy = await run_in_pool("kg", kg_pipeline.health_check)
         return {"status": "healthy" if is_healthy else "unhealthy", "neo4j_available": kg_pipeline.is_ready()}
     except Exception as e:
         logger.exception("Health check failed: %s", e)
@@ -126,6 +136,7 @@ async def execute_cypher_query(
     """
     Execute a custom read-only Cypher query. Basic check prevents destructive keywords.
     """
+    kg_pipeline = await get_kg_pipeline()
     if not kg_pipeline.is_ready():
         raise HTTPException(status_code=503, detail="Knowledge Graph not available")
 
@@ -135,7 +146,7 @@ async def execute_cypher_query(
         raise HTTPException(status_code=400, detail="Query appears to contain write/destructive operations. Only read queries allowed.")
 
     try:
-        results = kg_pipeline.execute_cypher(cypher_query, parameters or {})
+        results = await run_in_pool("kg", kg_pipeline.execute_cypher, cypher_query, parameters or {})
         return {"query": cypher_query, "parameters": parameters or {}, "results": results, "result_count": len(results)}
     except Exception as e:
         logger.exception("Error executing cypher query: %s", e)
@@ -144,6 +155,7 @@ async def execute_cypher_query(
 @router.get("/test-connection")
 async def test_kg_connection():
     """Test KG connection and basic functionality."""
+    kg_pipeline = await get_kg_pipeline()
     try:
         if not kg_pipeline.is_ready():
             return {
@@ -155,7 +167,7 @@ async def test_kg_connection():
             }
         
         # Test a simple query
-        test_triples = kg_pipeline.query_kg("alzheimer", limit=5)
+        test_triples = await run_in_pool("kg", kg_pipeline.query_kg, "alzheimer", limit=5)
         
         return {
             "status": "success",
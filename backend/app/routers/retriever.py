@@ -1,19 +1,30 @@
 import logging
+import time
 from pathlib import Path
-from typing import List
+from typing import List, Literal, Optional
 
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Query, Response
+from pydantic import BaseModel, Field
 
-from app.core.rag_pipeline import RAGPipeline
+from app.core.corpora import CorpusNotFound
+from app.core.registry import pipelines
+from app.core.executors import run_in_pool
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 router = APIRouter(prefix="/api/retriever", tags=["retriever"])
 
-# Initialize RAG pipeline (will try to load persisted Chroma if exists)
-rag_pipeline = RAGPipeline(chroma_dir=Path("chroma_db"))
+
+async def get_rag_pipeline(corpus: Optional[str] = None):
+    """
+    Return the process-wide RAG pipeline of a corpus, shared with the hypothesis router.
+    Resolved on the "search" pool: the first use loads the models or opens the corpus.
+    """
+    try:
+        return await run_in_pool("search", pipelines.corpus, corpus)
+    except CorpusNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
 
 # Lightweight Pydantic response model to match frontend expectation
 class EvidenceItem(BaseModel):
@@ -23,44 +34,128 @@ class EvidenceItem(BaseModel):
     score: float
     source: str = "pubmed"
 
+class BatchSearchRequest(BaseModel):
+    queries: List[str] = Field(..., min_length=1, max_length=2000, description="Queries to search")
+    k: int = Field(5, ge=1, le=100, description="Results per query")
+    mode: Literal["dense", "sparse", "hybrid"] = Field("dense", description="dense (embeddings), sparse (BM25) or hybrid (rank fusion of both)")
+    corpus: Optional[str] = Field(None, description="Named corpus (default corpus if omitted)")
+
+class BatchSearchResult(BaseModel):
+    query: str
+    results: List[EvidenceItem]
+
+@router.get("/corpora")
+async def list_corpora():
+    """Named corpora, the ones currently open and the memory budget they share."""
+    return await run_in_pool("search", pipelines.corpora().stats)
+
 @router.get("/status")
-async def vectorstore_status():
+async def vectorstore_status(corpus: Optional[str] = Query(None, description="Named corpus (default corpus if omitted)")):
     """Check if vector store is ready."""
-    return {"ready": rag_pipeline.is_ready()}
+    rag_pipeline = await get_rag_pipeline(corpus)
+    return {
+        "corpus": corpus or "default",
+        "ready": await run_in_pool("search", rag_pipeline.is_ready),
+        "active_dir": str(rag_pipeline.active_dir) if rag_pipeline.active_dir else None,
+        "index_version": rag_pipeline.index_version,
+        "bm25_ready": rag_pipeline.sparse_index is not None,
+        "doc_store_bytes": rag_pipeline.doc_store.size_bytes() if rag_pipeline.doc_store is not None else None,
+        "query_encoder": rag_pipeline.query_encoder_backend,
+        "index_params": rag_pipeline.index_params(),
+        "cache": rag_pipeline.cache_stats()
+    }
 
-@router.post("/build-index")
-async def build_index():
+@router.post("/build-index", status_code=202)
+async def build_index(
+    incremental: bool = Query(True, description="Only embed new/changed PMIDs and drop removed ones (full rebuild if no index exists)"),
+    shard: Optional[int] = Query(None, ge=0, description="Only (re)build this shard of a sharded index"),
+    corpus: Optional[str] = Query(None, description="Named corpus (default corpus if omitted)")
+):
     """
-    Build the vector store index from the CSV file.
-    Expects 'pubmed_results.csv' to be at project root.
+    Start a background build of the vector store index from the CSV file.
+    Expects 'pubmed_results.csv' to be at project root, or in
+    <CORPORA_DIR>/<corpus>/ for a named corpus.
+    Searches keep using the current index until the new one is swapped in.
+    With `shard`, only that shard's PMIDs are re-embedded and the other shards
+    keep serving as they are.
+    Poll GET /api/retriever/build-jobs/{job_id} for progress and the
+    added/updated/removed/unchanged counts. Jobs are tracked per worker process:
+    with several uvicorn workers a poll may land on another worker and get 404.
     """
-    csv_path = Path("pubmed_results.csv")
+    try:
+        csv_path = await run_in_pool("search", pipelines.corpora().csv_path, corpus)
+    except CorpusNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
     if not csv_path.exists():
         logger.error("pubmed_results.csv not found at %s", csv_path.resolve())
         raise HTTPException(
             status_code=404,
-            detail="PubMed CSV not found. Place pubmed_results.csv at project root."
+            detail=f"PubMed CSV not found. Place pubmed_results.csv at {csv_path.parent.resolve()}."
         )
 
-    success = rag_pipeline.build_index(csv_path)
-    if not success:
-        logger.error("Failed to build vector store from CSV.")
-        raise HTTPException(
-            status_code=500,
-            detail="Failed to build index. Check logs for details."
-        )
+    rag_pipeline = await get_rag_pipeline(corpus)
+    if shard is not None:
+        if not rag_pipeline.is_sharded():
+            raise HTTPException(status_code=400, detail="shard only applies to a sharded index (set INDEX_SHARDS and rebuild)")
+        shards = rag_pipeline.shard_count()
+        if shard >= shards:
+            raise HTTPException(status_code=400, detail=f"Index has {shards} shard(s); shard {shard} does not exist")
+
+    job = pipelines.index_jobs().submit(csv_path, incremental=incremental, shard=shard, corpus=corpus)
     return {
-        "message": "Index built successfully",
-        "vector_dir": str(rag_pipeline.chroma_dir)
+        "message": "Index build started",
+        "vector_dir": str(rag_pipeline.chroma_dir),
+        "status_url": f"/api/retriever/build-jobs/{job.id}",
+        **job.to_dict()
     }
 
+@router.get("/build-jobs")
+async def list_build_jobs():
+    """Recent index build jobs, newest first."""
+    return {"jobs": [job.to_dict() for job in pipelines.index_jobs().list()]}
+
+@router.get("/build-jobs/{job_id}")
+async def get_build_job(job_id: str):
+    """Status, progress (docs/sec, ETA) and result of an index build job."""
+    job = pipelines.index_jobs().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Build job {job_id} not found (jobs are tracked by the worker that started them)")
+    return job.to_dict()
+
+@router.post("/build-jobs/{job_id}/cancel")
+async def cancel_build_job(job_id: str):
+    """
+    Request cancellation; the build stops at the next batch.
+    A cancelled full build leaves the live index untouched; a cancelled
+    incremental build keeps the batches it already applied.
+    """
+    job = pipelines.index_jobs().cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Build job {job_id} not found (jobs are tracked by the worker that started them)")
+    return job.to_dict()
+
 @router.get("/search", response_model=List[EvidenceItem])
-async def search_papers(query: str, k: int = 5):
+async def search_papers(
+    response: Response,
+    query: str,
+    k: int = 5,
+    mode: Literal["dense", "sparse", "hybrid"] = Query("dense", description="dense (embeddings), sparse (BM25) or hybrid (rank fusion of both)"),
+    mmr: bool = Query(False, description="Re-rank dense candidates for diversity (maximal marginal relevance)"),
+    rerank: bool = Query(False, description="Re-score candidates with a cross-encoder and keep the top k"),
+    candidates: int = Query(20, ge=1, le=100, description="Candidates retrieved before cross-encoder re-ranking"),
+    corpus: Optional[str] = Query(None, description="Named corpus (default corpus if omitted)"),
+    expand: bool = Query(False, description="Also search 1-hop KG neighbours of entities in the query and fuse the results (mmr does not apply)")
+):
     """
-    Search for relevant papers using the vector store.
-    Example: GET /api/retriever/search?query=alzheimer&k=5
+    Search for relevant papers using the vector store and/or the BM25 index.
+    Example: GET /api/retriever/search?query=APOE4&k=5&mode=hybrid
+    With rerank=true the top `candidates` hits are re-scored by a cross-encoder;
+    with expand=true the query's KG neighbours are searched in the same batch
+    (X-KG-Expansions holds their count). Stage timings are returned in the
+    X-KG-Expand-Ms / X-Retrieve-Ms / X-Rerank-Ms headers.
     """
-    if not rag_pipeline.is_ready():
+    rag_pipeline = await get_rag_pipeline(corpus)
+    if not await run_in_pool("search", rag_pipeline.is_ready):
         logger.warning("Search requested but vector store not ready.")
         raise HTTPException(
             status_code=503,
@@ -68,8 +163,86 @@ async def search_papers(query: str, k: int = 5):
         )
 
     try:
-        results = rag_pipeline.retrieve(query=query, k=k)
+        fetch_k = max(k, candidates) if rerank else k
+        if expand:
+            start = time.perf_counter()
+            adjacency = await run_in_pool("kg", pipelines.kg_adjacency)
+            expansions = adjacency.expand(query)
+            response.headers["X-KG-Expand-Ms"] = f"{(time.perf_counter() - start) * 1000:.2f}"
+            response.headers["X-KG-Expansions"] = str(len(expansions))
+            start = time.perf_counter()
+            results = await run_in_pool(
+                "search", rag_pipeline.retrieve_expanded, query=query, expansions=expansions, k=fetch_k, mode=mode
+            )
+        else:
+            start = time.perf_counter()
+            results = await run_in_pool("search", rag_pipeline.retrieve, query=query, k=fetch_k, mode=mode, mmr=mmr)
+        response.headers["X-Retrieve-Ms"] = f"{(time.perf_counter() - start) * 1000:.1f}"
+        if rerank:
+            start = time.perf_counter()
+            results = await run_in_pool("search", rag_pipeline.rerank, query, results, k)
+            response.headers["X-Rerank-Ms"] = f"{(time.perf_counter() - start) * 1000:.1f}"
         return [EvidenceItem(**r) for r in results]
     except Exception as e:
         logger.exception("Search error: %s", e)
-        raise HTTPException(status_code=500, detail=f"Search error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Search error: {str(e)}")
+
+@router.post("/search-batch", response_model=List[BatchSearchResult])
+async def search_papers_batch(payload: BatchSearchRequest):
+    """
+    Search many queries in one call (bulk scoring jobs).
+    Queries are embedded in one batched forward pass and, in dense mode, searched
+    with a single multi-vector index query. Results come back in request order.
+    """
+    rag_pipeline = await get_rag_pipeline(payload.corpus)
+    if not await run_in_pool("search", rag_pipeline.is_ready):
+        logger.warning("Batch search requested but vector store not ready.")
+        raise HTTPException(
+            status_code=503,
+            detail="Vector store not ready. Build index first via POST /api/retriever/build-index"
+        )
+
+    try:
+        results = await run_in_pool(
+            "search", rag_pipeline.retrieve_batch, payload.queries, k=payload.k, mode=payload.mode
+        )
+        return [
+            BatchSearchResult(query=query, results=[EvidenceItem(**r) for r in hits])
+            for query, hits in zip(payload.queries, results)
+        ]
+    except Exception as e:
+        logger.exception("Batch search error: %s", e)
+        raise HTTPException(status_code=500, detail=f"Batch search error: {str(e)}")
+
+
+@router.get("/similar/{pmid}", response_model=List[EvidenceItem])
+async def similar_papers(
+    pmid: str,
+    k: int = 5,
+    query: str = Query("", description="Optional text query blended with the seed paper's vector"),
+    weight: Optional[float] = Query(None, ge=0.0, le=1.0, description="Weight of the seed vector when a query is given (SEED_WEIGHT setting if omitted)"),
+    corpus: Optional[str] = Query(None, description="Named corpus (default corpus if omitted)")
+):
+    """
+    "More like this": papers nearest to an indexed PMID, using its stored
+    vector (no re-encoding). The seed paper itself is not returned.
+    Example: GET /api/retriever/similar/31234567?k=5
+    """
+    rag_pipeline = await get_rag_pipeline(corpus)
+    if not await run_in_pool("search", rag_pipeline.is_ready):
+        logger.warning("Similar-papers search requested but vector store not ready.")
+        raise HTTPException(
+            status_code=503,
+            detail="Vector store not ready. Build index first via POST /api/retriever/build-index"
+        )
+    if await run_in_pool("search", rag_pipeline.pmid_vector, pmid) is None:
+        raise HTTPException(status_code=404, detail=f"PMID {pmid} is not in the index")
+
+    try:
+        results = await run_in_pool(
+            "search", rag_pipeline.retrieve, query=query, k=k, seed_pmid=pmid, seed_weight=weight if query.strip() else 1.0
+        )
+        return [EvidenceItem(**r) for r in results]
+    except Exception as e:
+        logger.exception("Similar-papers search error: %s", e)
+        raise HTTPException(status_code=500, detail=f"Search error: {str(e)}")